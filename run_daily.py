@@ -6,11 +6,13 @@ Zenn自動投稿システム - 日次実行スクリプト
 1. Claude Code履歴を分析
 2. ネタストックを確認・補充
 3. 記事を生成
-4. Zennに投稿（git push）
-5. Xに告知
+4. Zenn（git push）・note・Xに並行して公開
 """
-import subprocess
+import json
 import sys
+import threading
+import time
+from contextlib import contextmanager
 from datetime import datetime
 from pathlib import Path
 
@@ -18,15 +20,39 @@ from pathlib import Path
 SCRIPT_DIR = Path(__file__).parent / "scripts"
 sys.path.insert(0, str(SCRIPT_DIR))
 
-from config import BASE_DIR, ARTICLES_DIR, DATA_DIR
+from config import (
+    LIVE_INGEST_ENABLED,
+    PIPELINE_DEADLINE,
+    STAGE_MIN_SECONDS,
+)
 from topic_manager import (
     get_next_topic,
     mark_as_posted,
     ensure_minimum_stock,
     get_stock_status,
+    refresh_topics,
 )
 from generate_article import generate_and_save
-from post_to_x import post_article_announcement, analyze_tweet_performance
+from backfill import publish_backfill_draft
+from post_to_x import analyze_tweet_performance
+from publishers import Publication, enabled_publishers, get_zenn_article_url, publish_all
+from run_journal import (
+    RunJournal,
+    abandon_stale_runs,
+    abandon_ungenerated_runs,
+    claimed_titles,
+    unfinished_runs,
+)
+from daemon import Daemon, build_jobs, query_daemon_status
+from history_watcher import start_watcher
+from memprofile import profiler, profile_section
+from deadline import (
+    Deadline,
+    DeadlineExceeded,
+    configured_deadline,
+    deadline_scope,
+    has_time_for,
+)
 
 
 def log(message: str) -> None:
@@ -35,128 +61,313 @@ def log(message: str) -> None:
     print(f"[{timestamp}] {message}")
 
 
-def git_push_article(filepath: Path, title: str) -> bool:
-    """記事をgit pushしてZennに公開"""
+@contextmanager
+def stage_timer(result: dict, stage: str):
+    """ステージの所要時間を result["timings"] に記録する（--memprofile 時はメモリも計測）"""
+    start = time.perf_counter()
     try:
-        # git add
-        subprocess.run(
-            ["git", "add", str(filepath)],
-            cwd=BASE_DIR,
-            check=True,
-            capture_output=True,
-        )
-
-        # git commit
-        commit_message = f"📝 新記事: {title}"
-        subprocess.run(
-            ["git", "commit", "-m", commit_message],
-            cwd=BASE_DIR,
-            check=True,
-            capture_output=True,
-        )
-
-        # git push
-        subprocess.run(
-            ["git", "push", "origin", "main"],
-            cwd=BASE_DIR,
-            check=True,
-            capture_output=True,
-        )
-
-        log(f"✅ Git push完了: {filepath.name}")
+        with profile_section(stage):
+            yield
+    except DeadlineExceeded:
+        result["cut_stages"].append(stage)
+        raise
+    finally:
+        result["timings"][stage] = round(time.perf_counter() - start, 4)
+
+
+def stage_allowed(result: dict, stage: str) -> bool:
+    """期限までにステージを終えられる見込みがあるか（なければ打ち切りとして記録）"""
+    if has_time_for(STAGE_MIN_SECONDS.get(stage, 0)):
         return True
-
-    except subprocess.CalledProcessError as e:
-        log(f"❌ Git操作失敗: {e}")
-        return False
-
-
-def get_zenn_article_url(slug: str) -> str:
-    """Zenn記事のURLを生成"""
-    # GitHubリポジトリからユーザー名を取得
-    username = "michey0495"  # TODO: git remote から動的に取得
-    return f"https://zenn.dev/{username}/articles/{slug}"
+    log(f"⏰ 実行期限が近いため {stage} を打ち切ります")
+    result["cut_stages"].append(stage)
+    return False
+
+
+def stored_outcome(journal: RunJournal, stage: str, target: str) -> dict:
+    """ジャーナルに記録済みの公開結果（記録がなければ空）"""
+    record = journal.stage(stage) or {}
+    if "publish" in record:
+        return record["publish"]
+    if not record:
+        return {}
+    # 公開先ごとの結果を持つ前の形式（commit / push / tweet ステージ）
+    return {
+        "target": target,
+        "status": "unknown" if record.get("unknown") else "published",
+        "url": record.get("tweet_url"),
+        "id": record.get("tweet_id") or (journal.stage("commit") or {}).get("sha"),
+    }
 
 
-def run_daily_pipeline() -> dict:
-    """日次パイプラインを実行"""
-    log("🚀 日次パイプライン開始")
+def run_daily_pipeline(run_id: str | None = None, deadline: Deadline | None = None) -> dict:
+    """日次パイプラインを実行
+
+    各ステージの完了を実行ジャーナルに記録し、失敗後の再実行では
+    未完了のステージから再開する。
+    run_id を省略すると、前の日の未完了の実行のうち記事を生成済みのもの
+    （保留したXの投稿など）を先に片付けてから、今日の実行を行う。
+    生成前に止まった前の日の実行は打ち切り、ネタは今日の実行が選び直す。
+    deadline を渡すと各ステージ・各API呼び出しに残り時間が伝わり、
+    間に合わないステージは打ち切って result["cut_stages"] に記録する。
+    """
+    with deadline_scope(deadline):
+        if run_id is not None:
+            return _run_daily_pipeline(run_id, deadline)
+
+        today = datetime.now().strftime("%Y-%m-%d")
+        for stale in abandon_stale_runs():
+            log(f"🗑️ 実行 {stale} は古いか試行回数を超えたため再開しません")
+        for ungenerated in abandon_ungenerated_runs(exclude=today):
+            log(f"🗑️ 実行 {ungenerated} は記事の生成前に止まったため再開しません（今日の実行で選び直します）")
+        caught_up = []
+        for previous in unfinished_runs(exclude=today):
+            log(f"⏯️ 前回の実行 {previous} の残りを先に片付けます")
+            previous_result = _run_daily_pipeline(previous, deadline)
+            caught_up.append({
+                "run_id": previous,
+                "success": previous_result["success"],
+                "errors": previous_result["errors"],
+            })
+        result = _run_daily_pipeline(today, deadline)
+        result["caught_up"] = caught_up
+        return result
+
+
+def _run_daily_pipeline(run_id: str, deadline: Deadline | None) -> dict:
+    journal = RunJournal(run_id)
 
     result = {
         "success": False,
+        "run_id": run_id,
         "article_title": None,
         "article_path": None,
+        "commit_sha": None,
         "tweet_url": None,
         "errors": [],
+        "timings": {},
+        "deadline": deadline.at.isoformat() if deadline else None,
+        "cut_stages": [],
     }
 
-    try:
-        # 1. ネタストックを確認・補充
-        log("📦 ネタストック確認中...")
-        ensure_minimum_stock()
-        status = get_stock_status()
-        log(f"   利用可能ネタ: {status['available']}件")
+    if journal.status == "complete":
+        log(f"✅ 実行 {run_id} は完了済みです")
+        generated = journal.stage("generate") or {}
+        result.update(
+            success=True,
+            article_title=generated.get("article_title"),
+            article_path=generated.get("article_path"),
+            commit_sha=stored_outcome(journal, "push", "zenn").get("id"),
+            tweet_url=stored_outcome(journal, "tweet", "x").get("url"),
+        )
+        return result
 
-        # 2. 次のネタを取得
-        topic = get_next_topic()
-        if not topic:
-            log("⚠️ 投稿するネタがありません")
-            result["errors"].append("ネタなし")
-            return result
+    if journal.status == "abandoned":
+        log(f"🗑️ 実行 {run_id} は打ち切り済みです")
+        result["errors"].append("打ち切り済みの実行")
+        return result
 
-        log(f"📝 今日のネタ: {topic['title']}")
+    if journal.resumed:
+        log(f"⏯️ 実行 {run_id} を再開します（{journal.attempts + 1}回目）")
+    else:
+        log("🚀 日次パイプライン開始")
+    journal.start_attempt()
 
-        # 3. 記事を生成
-        log("✍️ 記事生成中...")
-        article, filepath = generate_and_save(topic, published=True)
-        result["article_title"] = article["title"]
-        result["article_path"] = str(filepath)
+    try:
+        # 1. ネタストックを確認・補充 / 2. 次のネタを取得
+        if journal.is_done("select"):
+            topic = journal.stage("select")["topic"]
+        else:
+            if not stage_allowed(result, "stock"):
+                result["errors"].append("実行期限切れ")
+                journal.finish("failed")
+                return result
+            log("📦 ネタストック確認中...")
+            with stage_timer(result, "stock"):
+                ensure_minimum_stock()
+                status = get_stock_status()
+                log(f"   利用可能ネタ: {status['available']}件")
+
+                # 再開待ちの実行が選んだネタは、その実行が公開するので選ばない
+                topic = get_next_topic(exclude=claimed_titles(exclude=run_id))
+            if not topic:
+                log("⚠️ 投稿するネタがありません")
+                result["errors"].append("ネタなし")
+                journal.finish("skipped")
+                return result
+            journal.complete("select", topic=topic)
 
-        # 4. Git push
-        log("📤 Zennに投稿中...")
-        if git_push_article(filepath, article["title"]):
-            mark_as_posted(topic["title"])
+        log(f"📝 今日のネタ: {topic['title']}")
+
+        # 3. 記事を生成（生成済みの記事が残っていれば再生成しない）
+        generated = journal.stage("generate")
+        if journal.is_done("generate") and Path(generated["article_path"]).exists():
+            filepath = Path(generated["article_path"])
+            title = generated["article_title"]
+            summary = generated.get("summary", "")
+            tweet_hook = generated.get("tweet_hook", "")
+            log(f"♻️ 生成済みの記事を使用: {filepath.name}")
         else:
-            result["errors"].append("Git push失敗")
-            return result
+            if not stage_allowed(result, "generate"):
+                result["errors"].append("実行期限切れ")
+                journal.finish("failed")
+                return result
+            with stage_timer(result, "generate"):
+                # --backfill で作っておいた下書きがあれば、生成し直さずに公開に切り替える
+                drafted = publish_backfill_draft(topic)
+                if drafted:
+                    article, filepath = drafted
+                    log(f"📦 バックフィル済みの下書きを使用: {filepath.name}")
+                else:
+                    log("✍️ 記事生成中...")
+                    article, filepath = generate_and_save(topic, published=True)
+            title = article["title"]
+            summary = article["summary"]
+            tweet_hook = article["tweet_hook"]
+            journal.complete(
+                "generate",
+                article_title=title,
+                article_path=str(filepath),
+                summary=summary,
+                tweet_hook=tweet_hook,
+            )
+        result["article_title"] = title
+        result["article_path"] = str(filepath)
 
-        # 5. Zenn URLを生成
+        # 4. 各プラットフォームに公開（Zenn と note は並行、X は Zenn の公開後）
         slug = filepath.stem
-        article_url = get_zenn_article_url(slug)
-
-        # 6. Xに投稿
-        log("📢 Xに告知中...")
-        try:
-            tweet_result = post_article_announcement(
-                title=article["title"],
-                url=article_url,
-            )
-            result["tweet_url"] = tweet_result.get("tweet_url")
-        except Exception as e:
-            log(f"⚠️ X投稿失敗: {e}")
-            result["errors"].append(f"X投稿失敗: {e}")
+        item = Publication(
+            title=title,
+            path=filepath,
+            slug=slug,
+            url=get_zenn_article_url(slug),
+            summary=summary,
+            tweet_hook=tweet_hook,
+        )
+        publishers = enabled_publishers()
+        labels = {p.name: p.label for p in publishers}
+        outcomes = {
+            p.name: stored_outcome(journal, p.stage, p.name)
+            for p in publishers if journal.is_done(p.stage)
+        }
+        todo = [p for p in publishers if p.name not in outcomes]
+        if todo:
+            log(f"📤 公開中: {', '.join(p.label for p in todo)}")
+            journal_lock = threading.Lock()
+
+            def record_outcome(publisher, outcome: dict) -> None:
+                # 公開先ごとのスレッドから呼ばれる
+                with journal_lock:
+                    result["timings"][publisher.stage] = outcome.get("seconds", 0.0)
+                    if outcome["status"] == "deferred":
+                        result["cut_stages"].append(publisher.stage)
+                    # 設定が原因の skipped（final）は再開しても変わらないので送り直さない。
+                    # 依存先の失敗による skipped は、依存先と一緒に再開時にやり直す
+                    if outcome["status"] in ("published", "unknown") or outcome.get("final"):
+                        journal.complete(publisher.stage, publish=outcome)
+                    else:
+                        # 公開されていないので、再開時はやり直す
+                        journal.discard(publisher.stage)
+
+            with stage_timer(result, "publish"):
+                outcomes.update(publish_all(item, todo, on_result=record_outcome))
+        result["publish"] = outcomes
+
+        zenn = outcomes.get("zenn")
+        if zenn is not None and zenn["status"] != "published":
+            result["errors"].append("Git push失敗" if zenn["status"] == "failed" else "実行期限切れ")
+            journal.finish("failed")
+            return result
+        result["commit_sha"] = (zenn or {}).get("id")
+        result["tweet_url"] = (outcomes.get("x") or {}).get("url")
+        for name, outcome in outcomes.items():
+            if outcome["status"] == "failed":
+                result["errors"].append(f"{labels[name]}投稿失敗: {outcome['error']}")
+            elif outcome["status"] == "unknown":
+                result["errors"].append(outcome["error"])
+            elif outcome["status"] == "skipped":
+                result["errors"].append(f"{labels[name]}未送信: {outcome['error']}")
+
+        if not journal.is_done("mark_posted"):
+            mark_as_posted(topic["title"])
+            journal.complete("mark_posted")
 
         # 7. パフォーマンス分析（過去の投稿）
-        log("📊 過去投稿のパフォーマンス分析...")
-        try:
-            performance = analyze_tweet_performance()
-            if performance:
-                top = performance[0]
-                log(f"   最も反応の良い記事: {top.get('article_title')}")
-                log(f"   いいね: {top.get('likes')}, RT: {top.get('retweets')}")
-        except Exception as e:
-            log(f"   分析スキップ: {e}")
+        if stage_allowed(result, "performance"):
+            log("📊 過去投稿のパフォーマンス分析...")
+            try:
+                with stage_timer(result, "performance"):
+                    performance = analyze_tweet_performance()
+                if performance:
+                    top = performance[0]
+                    log(f"   最も反応の良い記事: {top.get('article_title')}")
+                    log(f"   いいね: {top.get('likes')}, RT: {top.get('retweets')}")
+            except Exception as e:
+                log(f"   分析スキップ: {e}")
 
         result["success"] = True
-        log("🎉 日次パイプライン完了!")
+        deferred = [labels[n] for n, o in outcomes.items() if o["status"] == "deferred"]
+        if deferred:
+            # Zennの公開は済んでいるので、次回の実行の最初に残りの公開先だけを送ってから今日の分に進む
+            journal.finish("deferred")
+            log(f"🎉 日次パイプライン完了（{', '.join(deferred)}は保留）")
+        else:
+            journal.finish("complete")
+            log("🎉 日次パイプライン完了!")
 
     except Exception as e:
         log(f"❌ エラー発生: {e}")
         result["errors"].append(str(e))
+        journal.finish("failed")
 
     return result
 
 
+def print_stock_status(status: dict) -> None:
+    """ネタストック状況を表示"""
+    print("📦 ネタストック状況")
+    print(f"  - 利用可能: {status['available']}件")
+    print(f"  - 投稿済み: {status['posted_count']}件")
+    print("\n📝 次の候補:")
+    for i, t in enumerate(status["topics"], 1):
+        print(f"  {i}. {t.get('title')}")
+
+
+def run_daemon() -> None:
+    """常駐モードで各ジョブをスケジュール実行"""
+
+    def publish_job() -> dict:
+        # 期限は実行のたびに設定から求め直す
+        return run_daily_pipeline(deadline=configured_deadline())
+
+    def refresh_job() -> dict:
+        ensure_minimum_stock()
+        return get_stock_status()
+
+    def metrics_job() -> list:
+        performance = analyze_tweet_performance()
+        return performance[:5]
+
+    jobs = build_jobs({
+        "publish": publish_job,
+        "refresh": refresh_job,
+        "metrics": metrics_job,
+    })
+    daemon = Daemon(jobs, status_provider=get_stock_status)
+    # 2つ目のデーモンならウォッチャーを起動する前に止める
+    daemon.acquire_lock()
+
+    if LIVE_INGEST_ENABLED:
+        def on_change(analysis: dict) -> None:
+            # 候補が変わるたびにストックへ反映し、--status の応答も更新する
+            refresh_topics(analysis)
+            daemon.refresh_snapshot()
+
+        start_watcher(on_change=on_change)
+
+    daemon.run()
+
+
 def main():
     """エントリーポイント"""
     import argparse
@@ -177,22 +388,94 @@ def main():
         action="store_true",
         help="ネタストックを更新"
     )
+    parser.add_argument(
+        "--daemon",
+        action="store_true",
+        help="常駐モードで投稿・ネタ補充・反応取得をスケジュール実行"
+    )
+    parser.add_argument(
+        "--tenants",
+        type=Path,
+        help="テナント設定ファイル（複数アカウントを並列実行）"
+    )
+    parser.add_argument(
+        "--deadline",
+        default=PIPELINE_DEADLINE,
+        help="公開の期限（\"00:15\" のような時刻、または \"15m\"）。間に合わないステージは打ち切る"
+    )
+    parser.add_argument(
+        "--backfill",
+        type=int,
+        metavar="N",
+        help="次のN件のネタをバッチでまとめて生成し、未公開の下書きとして保存"
+    )
+    parser.add_argument(
+        "--usage",
+        action="store_true",
+        help="モデル呼び出しのトークン数・所要時間（p50/p95）・タグ別の集計と予算の状況を表示"
+    )
+    parser.add_argument(
+        "--memprofile",
+        action="store_true",
+        help="ステージごとのメモリ使用量（tracemalloc）を計測して表示"
+    )
+    parser.add_argument(
+        "--result-file",
+        type=Path,
+        help="実行結果をJSONで書き出すパス"
+    )
 
     args = parser.parse_args()
 
+    if args.memprofile:
+        profiler.enable()
+
     if args.status:
-        status = get_stock_status()
-        print("📦 ネタストック状況")
-        print(f"  - 利用可能: {status['available']}件")
-        print(f"  - 投稿済み: {status['posted_count']}件")
-        print("\n📝 次の候補:")
-        for i, t in enumerate(status["topics"], 1):
-            print(f"  {i}. {t.get('title')}")
+        # デーモン起動中ならメモリ上の状態を問い合わせる
+        daemon_status = query_daemon_status()
+        if daemon_status and "available" in daemon_status.get("stock", {}):
+            print_stock_status(daemon_status["stock"])
+            print(f"\n🟢 デーモン稼働中 (pid={daemon_status['pid']})")
+            for job in daemon_status["jobs"]:
+                print(f"  - {job['name']}: 前回 {job['last_run']} / 次回 {job['next_run']}")
+        else:
+            print_stock_status(get_stock_status())
+        return
+
+    if args.usage:
+        from usage_ledger import print_usage_report
+
+        print_usage_report()
+        return
+
+    if args.daemon:
+        run_daemon()
+        return
+
+    if args.tenants:
+        from multi_tenant import run_tenants
+
+        results = run_tenants(args.tenants, deadline=configured_deadline(args.deadline))
+        if not all(r.get("success") for r in results):
+            sys.exit(1)
+        return
+
+    if args.backfill:
+        from backfill import run_backfill
+
+        log(f"📦 {args.backfill}件の下書きをまとめて生成")
+        summary = run_backfill(args.backfill)
+        print(
+            f"\n保存 {summary['saved']}件 / 失敗 {summary['failed']}件"
+            f" / 受け取り待ち {summary['pending']}件"
+        )
         return
 
     if args.refresh:
         log("🔄 ネタストック更新中...")
-        ensure_minimum_stock()
+        with profile_section("refresh"):
+            ensure_minimum_stock()
+        profiler.report()
         return
 
     if args.dry_run:
@@ -204,8 +487,20 @@ def main():
         return
 
     # 本番実行
-    result = run_daily_pipeline()
-
+    result = run_daily_pipeline(deadline=configured_deadline(args.deadline))
+    if profiler.enabled:
+        result["memory"] = profiler.results()
+        profiler.report()
+
+    if args.result_file:
+        with open(args.result_file, 'w', encoding='utf-8') as f:
+            json.dump(result, f, ensure_ascii=False, indent=2)
+
+    for previous in result.get("caught_up", []):
+        mark = "✅" if previous["success"] else "❌"
+        print(f"\n{mark} 前回の実行 {previous['run_id']} の残り: {previous['errors'] or '完了'}")
+    if result["cut_stages"]:
+        print(f"\n⏰ 期限のため打ち切ったステージ: {', '.join(result['cut_stages'])}")
     if result["success"]:
         print(f"\n✅ 投稿完了: {result['article_title']}")
         if result["tweet_url"]:
@@ -0,0 +1,195 @@
+"""
+利用アクティビティの分析（NumPy）
+
+履歴のタイムスタンプと stats-cache.json の dailyActivity から、
+曜日×時間帯のヒートマップ、連続利用日数、集中セッション、
+前週比の変化をまとめてベクトル演算で求める。
+何年分のデータでも1回の走査で済む。
+"""
+from datetime import date, datetime, timedelta
+from typing import Any
+
+import numpy as np
+
+
+MS_PER_DAY = 86_400_000
+LATE_NIGHT_HOURS = (0, 5)  # 0時〜4時台を深夜とみなす
+SESSION_GAP_MINUTES = 30  # これ以上間が空いたら別セッション
+
+# ネタにする閾値
+LATE_NIGHT_SHARE_MIN = 0.2
+LATE_NIGHT_COUNT_MIN = 30
+STREAK_DAYS_MIN = 7
+BURST_PROMPTS_MIN = 30
+WOW_CHANGE_MIN = 0.5
+WOW_COUNT_MIN = 50
+
+WEEKDAYS = ["月", "火", "水", "木", "金", "土", "日"]
+
+
+def _local_offset_ms() -> float:
+    offset = datetime.now().astimezone().utcoffset()
+    return offset.total_seconds() * 1000 if offset else 0.0
+
+
+def _day_to_date(day: int) -> str:
+    return (date(1970, 1, 1) + timedelta(days=int(day))).isoformat()
+
+
+def _daily_activity_days(stats: dict[str, Any]) -> tuple[np.ndarray, np.ndarray]:
+    """dailyActivity を（エポックからの日数, メッセージ数）の配列にする"""
+    daily = stats.get("dailyActivity", [])
+    if not daily:
+        return np.empty(0, dtype=np.int64), np.empty(0, dtype=np.int64)
+    dates = np.array([d.get("date", "1970-01-01") for d in daily], dtype="datetime64[D]")
+    counts = np.array([d.get("messageCount", 0) for d in daily], dtype=np.int64)
+    return dates.astype(np.int64), counts
+
+
+def longest_streak(active_days: np.ndarray) -> tuple[int, int, int]:
+    """ソート済み・重複なしの日番号から最長連続日数と開始・終了日を返す"""
+    if active_days.size == 0:
+        return 0, 0, 0
+    # 連続が途切れる位置で区切り、区間の長さを一括で求める
+    breaks = np.flatnonzero(np.diff(active_days) != 1)
+    starts = np.concatenate(([0], breaks + 1))
+    ends = np.concatenate((breaks, [active_days.size - 1]))
+    lengths = ends - starts + 1
+    best = int(np.argmax(lengths))
+    return int(lengths[best]), int(active_days[starts[best]]), int(active_days[ends[best]])
+
+
+def analyze_activity(timestamps: np.ndarray, stats: dict[str, Any]) -> dict[str, Any]:
+    """タイムスタンプ（ミリ秒）と使用統計からアクティビティ指標を求める"""
+    ts = np.sort(np.asarray(timestamps, dtype=np.float64))
+    local = ts + _local_offset_ms()
+    days = np.floor_divide(local, MS_PER_DAY).astype(np.int64)
+    hours = (np.mod(local, MS_PER_DAY) // 3_600_000).astype(np.int64)
+    weekdays = (days + 3) % 7  # 1970-01-01は木曜、月曜を0にする
+
+    # 曜日×時間帯ヒートマップ
+    heatmap = np.bincount(weekdays * 24 + hours, minlength=7 * 24).reshape(7, 24)
+    hour_totals = heatmap.sum(axis=0)
+    late = hour_totals[LATE_NIGHT_HOURS[0]:LATE_NIGHT_HOURS[1]].sum()
+
+    # 日別件数（履歴とdailyActivityの大きい方を採用）
+    stat_days, stat_counts = _daily_activity_days(stats)
+    all_days = np.concatenate((days, stat_days))
+    if all_days.size:
+        first = int(all_days.min())
+        span = int(all_days.max()) - first + 1
+        from_history = np.bincount(days - first, minlength=span)
+        from_stats = np.zeros(span, dtype=np.int64)
+        np.add.at(from_stats, stat_days - first, stat_counts)
+        daily = np.maximum(from_history, from_stats)
+    else:
+        first, daily = 0, np.zeros(0, dtype=np.int64)
+
+    active_days = np.flatnonzero(daily > 0) + first
+    streak, streak_start, streak_end = longest_streak(active_days)
+
+    # 前週比（データの最終日を基準にした直近7日と、その前の7日）
+    this_week = int(daily[-7:].sum())
+    last_week = int(daily[-14:-7].sum())
+    change = (this_week - last_week) / last_week if last_week else None
+
+    # 集中セッション: 間隔がSESSION_GAP_MINUTES以上空いたところで区切る
+    burst = None
+    if ts.size:
+        gaps = np.diff(ts) > SESSION_GAP_MINUTES * 60_000
+        starts = np.concatenate(([0], np.flatnonzero(gaps) + 1))
+        ends = np.concatenate((starts[1:], [ts.size])) - 1
+        prompts = ends - starts + 1
+        best = int(np.argmax(prompts))
+        burst = {
+            "prompts": int(prompts[best]),
+            "minutes": round(float(ts[ends[best]] - ts[starts[best]]) / 60_000, 1),
+            "start": datetime.fromtimestamp(ts[starts[best]] / 1000).isoformat(),
+            "sessions": int(prompts.size),
+        }
+
+    peak_weekday, peak_hour = (
+        np.unravel_index(int(np.argmax(heatmap)), heatmap.shape) if ts.size else (0, 0)
+    )
+
+    return {
+        "heatmap": heatmap.tolist(),
+        "prompt_count": int(ts.size),
+        "peak_weekday": WEEKDAYS[int(peak_weekday)],
+        "peak_hour": int(peak_hour),
+        "late_night_count": int(late),
+        "late_night_share": round(float(late) / ts.size, 3) if ts.size else 0.0,
+        "longest_streak": {
+            "days": streak,
+            "start": _day_to_date(streak_start) if streak else None,
+            "end": _day_to_date(streak_end) if streak else None,
+        },
+        "burst": burst,
+        "week_over_week": {
+            "this_week": this_week,
+            "last_week": last_week,
+            "change": round(change, 3) if change is not None else None,
+        },
+    }
+
+
+def activity_candidates(activity: dict[str, Any]) -> list[dict[str, Any]]:
+    """目立った指標を記事ネタ候補にする
+
+    タイトルには変わる数値を入れない（数値は source に書く）。
+    実行のたびに別のネタとしてストックに積まれたり、
+    投稿済みの重複判定をすり抜けたりしないようにするため。
+    """
+    candidates = []
+
+    if (
+        activity["late_night_share"] >= LATE_NIGHT_SHARE_MIN
+        and activity["late_night_count"] >= LATE_NIGHT_COUNT_MIN
+    ):
+        share = round(activity["late_night_share"] * 100)
+        candidates.append({
+            "type": "late_night",
+            "title": "深夜0〜5時のClaude Codeと夜更かし開発の記録",
+            "source": f"深夜の指示: {activity['late_night_count']}件（全体の{share}%）",
+            "priority": 7,
+            "tags": ["claudecode", "productivity", "workflow"],
+        })
+
+    streak = activity["longest_streak"]
+    if streak["days"] >= STREAK_DAYS_MIN:
+        candidates.append({
+            "type": "streak",
+            "title": "Claude Codeを毎日使い続けてわかったこと",
+            "source": f"{streak['days']}日連続（期間: {streak['start']}〜{streak['end']}）",
+            "priority": 7,
+            "tags": ["claudecode", "experiment", "productivity"],
+        })
+
+    burst = activity["burst"]
+    if burst and burst["prompts"] >= BURST_PROMPTS_MIN:
+        candidates.append({
+            "type": "burst",
+            "title": "短時間に指示を出し続けた集中セッションの中身",
+            "source": f"{burst['minutes']:.0f}分で{burst['prompts']}回（開始: {burst['start']}）",
+            "priority": 6,
+            "tags": ["claudecode", "workflow", "experiment"],
+        })
+
+    wow = activity["week_over_week"]
+    if (
+        wow["change"] is not None
+        and wow["change"] >= WOW_CHANGE_MIN
+        and wow["this_week"] >= WOW_COUNT_MIN
+    ):
+        candidates.append({
+            "type": "trend",
+            "title": "利用が急に増えた1週間、Claude Codeの使い方はどう変わったか",
+            "source": (
+                f"先週比{round(wow['change'] * 100)}%増"
+                f"（今週 {wow['this_week']}件 / 先週 {wow['last_week']}件）"
+            ),
+            "priority": 6,
+            "tags": ["claudecode", "productivity", "tips"],
+        })
+
+    return candidates
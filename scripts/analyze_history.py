@@ -4,11 +4,15 @@ Claude Code履歴分析スクリプト
 履歴データから記事ネタを抽出する。
 機密情報は自動的にフィルタリングされる。
 """
+import hashlib
 import json
+import os
 import re
+import threading
+from array import array
 from datetime import datetime, timedelta
 from pathlib import Path
-from typing import Any
+from typing import Any, Iterator
 from collections import Counter
 
 from config import (
@@ -19,7 +23,22 @@ from config import (
     SENSITIVE_KEYWORDS,
     EXCLUDED_PATH_PATTERNS,
     DAYS_TO_ANALYZE,
+    SHARED_ANALYSIS_FILE,
+    ANALYSIS_CACHE_FILE,
+    HISTORY_CACHE_ENABLED,
+    HISTORY_MEMORY_FACTOR,
+    HISTORY_SOURCES,
 )
+from history_columns import HistoryColumns
+from memprofile import fits_budget, profile_section
+from window_counters import WindowCounters, update_window_counters
+
+try:
+    import numpy as np
+    from activity_analytics import analyze_activity, activity_candidates
+    from prompt_clusters import cluster_candidates, update_cluster_candidates
+except ImportError:
+    np = None  # NumPyがなければアクティビティ分析・クラスタリングは行わない
 
 
 def sanitize_text(text: str) -> str:
@@ -49,32 +68,101 @@ def sanitize_text(text: str) -> str:
     return result
 
 
-def load_claude_history(days: int = DAYS_TO_ANALYZE) -> list[dict[str, Any]]:
-    """Claude Code履歴を読み込む"""
-    if not CLAUDE_HISTORY.exists():
-        return []
+def parse_history_line(line: str, cutoff_ts: float = 0) -> dict[str, Any] | None:
+    """履歴1行をパースしてサニタイズする（対象期間外・不正行はNone）"""
+    try:
+        entry = json.loads(line.strip())
+    except json.JSONDecodeError:
+        return None
+    if not isinstance(entry, dict) or entry.get('timestamp', 0) < cutoff_ts:
+        return None
 
+    # 機密情報をサニタイズ
+    entry['display'] = sanitize_text(entry.get('display', ''))
+    entry['project'] = sanitize_text(entry.get('project', ''))
+    return entry
+
+
+def history_cutoff_ts(days: int = DAYS_TO_ANALYZE) -> float:
+    """分析対象期間の開始時刻（ミリ秒）"""
     cutoff = datetime.now() - timedelta(days=days)
-    cutoff_ts = cutoff.timestamp() * 1000  # ミリ秒
+    return cutoff.timestamp() * 1000
+
+
+def iter_history_rows(days: int = DAYS_TO_ANALYZE) -> Iterator[tuple[float, str, str]]:
+    """Claude Code履歴を (timestamp, project, display) として1件ずつ読む"""
+    if HISTORY_SOURCES:
+        # 複数マシンの履歴を timestamp 順にマージする
+        from history_sources import iter_merged_rows
+
+        yield from iter_merged_rows(history_cutoff_ts(days))
+        return
+
+    if not CLAUDE_HISTORY.exists():
+        return
+
+    cutoff_ts = history_cutoff_ts(days)
+
+    if HISTORY_CACHE_ENABLED:
+        # 新しく追記された行だけサニタイズし、対象日のシャードだけを読む
+        from history_cache import HistoryCache
+
+        cache = HistoryCache()
+        cache.update()
+        yield from cache.iter_rows(cutoff_ts)
+        return
 
-    entries = []
     with open(CLAUDE_HISTORY, 'r', encoding='utf-8') as f:
         for line in f:
-            try:
-                entry = json.loads(line.strip())
-                if entry.get('timestamp', 0) >= cutoff_ts:
-                    # 機密情報をサニタイズ
-                    entry['display'] = sanitize_text(entry.get('display', ''))
-                    entry['project'] = sanitize_text(entry.get('project', ''))
-                    entries.append(entry)
-            except json.JSONDecodeError:
-                continue
-
+            entry = parse_history_line(line, cutoff_ts)
+            if entry is not None:
+                yield (
+                    float(entry.get('timestamp', 0)),
+                    entry.get('project', ''),
+                    entry.get('display', ''),
+                )
+
+
+def iter_display_rows(days: float = DAYS_TO_ANALYZE) -> Iterator[tuple[float, str]]:
+    """履歴を (timestamp, display) として1件ずつ読む"""
+    for ts, _project, display in iter_history_rows(days):
+        yield ts, display
+
+
+def load_claude_history(days: int = DAYS_TO_ANALYZE) -> HistoryColumns:
+    """Claude Code履歴を読み込む（使う3列だけを保持）"""
+    entries = HistoryColumns()
+    for row in iter_history_rows(days):
+        entries.append(*row)
     return entries
 
 
+def estimate_history_bytes(days: int = DAYS_TO_ANALYZE) -> int:
+    """履歴を全件保持したときのメモリ量の見積もり"""
+    if HISTORY_SOURCES:
+        from history_sources import history_sources
+
+        return sum(source.size() for source in history_sources()) * HISTORY_MEMORY_FACTOR
+    if not CLAUDE_HISTORY.exists():
+        return 0
+    if HISTORY_CACHE_ENABLED:
+        from history_cache import HistoryCache
+
+        cache = HistoryCache()
+        cache.update()
+        size = cache.window_bytes(history_cutoff_ts(days))
+    else:
+        size = CLAUDE_HISTORY.stat().st_size
+    return size * HISTORY_MEMORY_FACTOR
+
+
 def load_stats_cache() -> dict[str, Any]:
     """使用統計を読み込む"""
+    if HISTORY_SOURCES:
+        from history_sources import history_sources, merge_stats
+
+        return merge_stats([source.load_stats() for source in history_sources()])
+
     if not CLAUDE_STATS.exists():
         return {}
 
@@ -82,82 +170,163 @@ def load_stats_cache() -> dict[str, Any]:
         return json.load(f)
 
 
-def load_zsh_history(days: int = DAYS_TO_ANALYZE) -> list[str]:
-    """zsh履歴を読み込む（Claude Code関連のみ）"""
+def _zsh_lines():
+    if HISTORY_SOURCES:
+        from history_sources import history_sources
+
+        for source in history_sources():
+            yield from source.zsh_lines()
+        return
+
     if not ZSH_HISTORY.exists():
-        return []
+        return
+    with open(ZSH_HISTORY, 'r', encoding='utf-8', errors='ignore') as f:
+        yield from f
+
 
+def load_zsh_history(days: int = DAYS_TO_ANALYZE) -> list[str]:
+    """zsh履歴を読み込む（Claude Code関連のみ）"""
     # Claude Code関連のキーワード
     keywords = ['claude', 'npx', 'mcp', 'anthropic', 'zenn', 'git push']
 
     commands = []
-    with open(ZSH_HISTORY, 'r', encoding='utf-8', errors='ignore') as f:
-        for line in f:
-            # zsh履歴形式: : timestamp:0;command
-            if ';' in line:
-                cmd = line.split(';', 1)[1].strip()
-            else:
-                cmd = line.strip()
-
-            # フィルタリング
-            if any(kw in cmd.lower() for kw in keywords):
-                sanitized = sanitize_text(cmd)
-                if sanitized not in commands:
-                    commands.append(sanitized)
+    for line in _zsh_lines():
+        # zsh履歴形式: : timestamp:0;command
+        if ';' in line:
+            cmd = line.split(';', 1)[1].strip()
+        else:
+            cmd = line.strip()
+
+        # フィルタリング
+        if any(kw in cmd.lower() for kw in keywords):
+            sanitized = sanitize_text(cmd)
+            if sanitized not in commands:
+                commands.append(sanitized)
 
     return commands[-100:]  # 直近100件
 
 
-def extract_features_from_history(entries: list[dict]) -> dict[str, Any]:
+def extract_entry_features(display: str) -> tuple[list[str], list[str]]:
+    """1件の入力からスラッシュコマンドと検出パターンを抽出する"""
+    # スラッシュコマンドの抽出
+    commands = re.findall(r'/(\w+)', display)
+
+    # スキル/ワークフローの検出
+    patterns = []
+    lowered = display.lower()
+    if 'agent team' in lowered:
+        patterns.append("Agent Teams使用")
+    if 'tmux' in lowered:
+        patterns.append("tmux分割")
+    if 'スライド' in display or 'slide' in lowered:
+        patterns.append("スライド生成")
+    if 'mcp' in lowered:
+        patterns.append("MCP連携")
+
+    return commands, patterns
+
+
+def extract_features_from_history(entries: HistoryColumns | list[dict]) -> dict[str, Any]:
     """履歴から特徴を抽出する"""
     features = {
         "commands_used": Counter(),
         "skills_used": Counter(),
+        "tools_used": Counter(),
         "patterns": [],
         "heavy_usage_days": [],
         "unique_workflows": [],
     }
 
-    for entry in entries:
-        display = entry.get('display', '')
+    if isinstance(entries, HistoryColumns):
+        displays = entries.displays
+    else:
+        displays = [entry.get('display', '') for entry in entries]
 
-        # スラッシュコマンドの抽出
-        commands = re.findall(r'/(\w+)', display)
-        for cmd in commands:
-            features["commands_used"][cmd] += 1
-
-        # スキル/ワークフローの検出
-        if 'agent team' in display.lower():
-            features["patterns"].append("Agent Teams使用")
-        if 'tmux' in display.lower():
-            features["patterns"].append("tmux分割")
-        if 'スライド' in display or 'slide' in display.lower():
-            features["patterns"].append("スライド生成")
-        if 'mcp' in display.lower():
-            features["patterns"].append("MCP連携")
+    for display in displays:
+        commands, patterns = extract_entry_features(display)
+        features["commands_used"].update(commands)
+        features["patterns"].extend(patterns)
 
     return features
 
 
 def extract_topic_candidates(
-    history: list[dict],
+    history: HistoryColumns | list[dict],
     stats: dict,
-    zsh_commands: list[str]
+    zsh_commands: list[str],
+    windows: WindowCounters | None = None,
 ) -> list[dict[str, Any]]:
     """記事ネタ候補を抽出する"""
-    candidates = []
     features = extract_features_from_history(history)
+    activity = None
+    if np is not None:
+        if isinstance(history, HistoryColumns):
+            timestamps = history.timestamps_array()
+        else:
+            timestamps = np.array([e.get('timestamp', 0) for e in history], dtype=np.float64)
+        activity = analyze_activity(timestamps, stats)
+    return extract_topic_candidates_from_features(features, stats, zsh_commands, activity, windows)
+
+
+def stream_topic_candidates(
+    days: int,
+    stats: dict,
+    zsh_commands: list[str],
+    windows: WindowCounters | None = None,
+) -> tuple[list[dict[str, Any]], int]:
+    """履歴を保持せずに1件ずつ特徴を集計してネタ候補を抽出する（候補, 件数）
+
+    残すのはタイムスタンプの配列（1件8バイト）と集計値だけなので、
+    extract_topic_candidates と同じ候補をメモリ一定で求められる。
+    """
+    features = extract_features_from_history([])
+    timestamps = array('d')
+    for ts, _project, display in iter_history_rows(days):
+        commands, patterns = extract_entry_features(display)
+        features["commands_used"].update(commands)
+        features["patterns"].extend(patterns)
+        timestamps.append(ts)
+
+    activity = None
+    if np is not None:
+        activity = analyze_activity(np.frombuffer(timestamps, dtype=np.float64), stats)
+    candidates = extract_topic_candidates_from_features(features, stats, zsh_commands, activity, windows)
+    return candidates, len(timestamps)
+
+
+def extract_topic_candidates_from_features(
+    features: dict[str, Any],
+    stats: dict,
+    zsh_commands: list[str],
+    activity: dict[str, Any] | None = None,
+    windows: WindowCounters | None = None,
+) -> list[dict[str, Any]]:
+    """抽出済みの特徴から記事ネタ候補を組み立てる
+
+    windows（滑動窓カウンタ）があれば、回数の多さより使用が増えているものを優先する。
+    """
+    candidates = []
 
     # 1. よく使うコマンドからネタを生成
-    for cmd, count in features["commands_used"].most_common(5):
-        if count >= 2:
+    if windows is not None:
+        for key in windows.ranked("command", 5):
             candidates.append({
                 "type": "command_usage",
-                "title": f"/{cmd}コマンドを使い倒してみた",
-                "source": f"使用回数: {count}回",
-                "priority": min(count, 10),
+                "title": f"/{key.split(':', 1)[1]}コマンドを使い倒してみた",
+                "source": f"使用回数: {windows.describe(key)}",
+                "priority": windows.trend_priority(key, 5),
                 "tags": ["claudecode", "cli", "tips"],
             })
+    else:
+        for cmd, count in features["commands_used"].most_common(5):
+            if count >= 2:
+                candidates.append({
+                    "type": "command_usage",
+                    "title": f"/{cmd}コマンドを使い倒してみた",
+                    "source": f"使用回数: {count}回",
+                    "priority": min(count, 10),
+                    "tags": ["claudecode", "cli", "tips"],
+                })
 
     # 2. 使用統計からネタを生成
     daily_activity = stats.get("dailyActivity", [])
@@ -195,14 +364,19 @@ def extract_topic_candidates(
     for pattern in unique_patterns:
         if pattern in pattern_topics:
             topic = pattern_topics[pattern]
+            key = WindowCounters.key("pattern", pattern)
             candidates.append({
                 "type": "pattern",
                 "title": topic["title"],
                 "source": f"検出パターン: {pattern}",
-                "priority": 7,
+                "priority": windows.trend_priority(key, 7) if windows is not None else 7,
                 "tags": topic["tags"],
             })
 
+    # 3b. 直近で急に増えたキーワード
+    if windows is not None:
+        candidates.extend(windows.keyword_candidates())
+
     # 4. zshコマンドからネタを生成
     if any('skill' in cmd.lower() for cmd in zsh_commands):
         candidates.append({
@@ -213,7 +387,49 @@ def extract_topic_candidates(
             "tags": ["claudecode", "skill", "customization"],
         })
 
-    # 重複除去と優先度ソート
+    # 5. セッション記録のツール利用からネタを生成（ライブ取り込み時のみ）
+    for tool, count in features.get("tools_used", Counter()).most_common(3):
+        if count >= 20:
+            candidates.append({
+                "type": "tool_usage",
+                "title": f"Claude Codeの{tool}ツールを使い込んで見えたこと",
+                "source": f"ツール使用回数: 直近{DAYS_TO_ANALYZE}日で{count}回",
+                "priority": min(count // 20 + 4, 8),
+                "tags": ["claudecode", "workflow", "tips"],
+            })
+
+    # 6. 利用アクティビティ（深夜作業・連続利用・集中セッション・前週比）
+    if activity is not None:
+        candidates.extend(activity_candidates(activity))
+
+    return dedupe_candidates(candidates)
+
+
+# 履歴キャッシュ・滑動窓・クラスタの保存済み状態を読み書きする処理を直列化する
+# （ウォッチャーのスレッドとデーモンのジョブが同時に分析しても状態が交錯しないように）
+_state_lock = threading.RLock()
+
+
+def extract_live_candidates(
+    features: dict[str, Any],
+    stats: dict,
+    zsh_commands: list[str],
+    activity: dict[str, Any] | None = None,
+) -> list[dict[str, Any]]:
+    """ライブ取り込みの集計から analyze() と同じ手順でネタ候補を組み立てる
+
+    滑動窓とクラスタは保存済みの状態に前回以降の履歴だけを足すので、全件は読み直さない。
+    """
+    with _state_lock:
+        windows = update_window_counters(iter_display_rows)
+        candidates = extract_topic_candidates_from_features(features, stats, zsh_commands, activity, windows)
+        if np is not None:
+            candidates = dedupe_candidates(candidates + update_cluster_candidates(iter_display_rows))
+    return candidates
+
+
+def dedupe_candidates(candidates: list[dict[str, Any]]) -> list[dict[str, Any]]:
+    """重複除去と優先度ソート"""
     seen_titles = set()
     unique_candidates = []
     for c in sorted(candidates, key=lambda x: -x["priority"]):
@@ -224,35 +440,167 @@ def extract_topic_candidates(
     return unique_candidates
 
 
-def analyze() -> dict[str, Any]:
+# 抽出ロジックを変えたら上げる（古いキャッシュを無効にするため）
+ANALYSIS_VERSION = 6
+
+
+def _file_signature(path: Path) -> list[int] | None:
+    """ファイルのサイズと更新時刻（なければNone）"""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    return [st.st_size, st.st_mtime_ns]
+
+
+def _source_signatures() -> list[Any]:
+    """追加の履歴ソースの状態（未設定なら空）"""
+    if not HISTORY_SOURCES:
+        return []
+    from history_sources import history_sources
+
+    return [[str(source.root), source.signature()] for source in history_sources()[1:]]
+
+
+def analysis_inputs() -> dict[str, Any]:
+    """analyze() の結果を左右する入力の一覧"""
+    redaction = json.dumps([SENSITIVE_KEYWORDS, EXCLUDED_PATH_PATTERNS], ensure_ascii=False)
+    return {
+        "version": ANALYSIS_VERSION,
+        "history": _file_signature(CLAUDE_HISTORY),
+        "stats": _file_signature(CLAUDE_STATS),
+        "zsh": _file_signature(ZSH_HISTORY),
+        "sources": _source_signatures(),
+        "days": DAYS_TO_ANALYZE,
+        # 対象期間は日付とともにずれるので、日が変われば再分析する
+        "date": datetime.now().date().isoformat(),
+        "sanitizer": hashlib.sha256(redaction.encode("utf-8")).hexdigest(),
+    }
+
+
+def fingerprint(inputs: dict[str, Any]) -> str:
+    return hashlib.sha256(json.dumps(inputs, sort_keys=True).encode("utf-8")).hexdigest()
+
+
+def load_cached_analysis(inputs: dict[str, Any]) -> dict[str, Any] | None:
+    """入力が前回と同じならキャッシュ済みの結果を返す"""
+    if not ANALYSIS_CACHE_FILE.exists():
+        return None
+    try:
+        with open(ANALYSIS_CACHE_FILE, 'r', encoding='utf-8') as f:
+            cache = json.load(f)
+    except (OSError, json.JSONDecodeError):
+        return None
+
+    if cache.get("fingerprint") == fingerprint(inputs):
+        return cache["result"]
+
+    changed = [k for k in inputs if cache.get("inputs", {}).get(k) != inputs[k]]
+    print(f"  - キャッシュ無効化: {', '.join(changed)}が変更されました")
+    return None
+
+
+def save_cached_analysis(inputs: dict[str, Any], result: dict[str, Any]) -> None:
+    ANALYSIS_CACHE_FILE.parent.mkdir(parents=True, exist_ok=True)
+    tmp = ANALYSIS_CACHE_FILE.with_suffix(".tmp")
+    with open(tmp, 'w', encoding='utf-8') as f:
+        json.dump(
+            {"fingerprint": fingerprint(inputs), "inputs": inputs, "result": result},
+            f, ensure_ascii=False,
+        )
+    os.replace(tmp, ANALYSIS_CACHE_FILE)
+
+
+def analyze(use_cache: bool = True) -> dict[str, Any]:
     """メイン分析関数"""
-    print("📊 履歴分析を開始...")
+    with _state_lock:
+        return _analyze(use_cache)
 
-    # データ読み込み
-    history = load_claude_history()
-    print(f"  - Claude Code履歴: {len(history)}件")
 
-    stats = load_stats_cache()
+def _analyze(use_cache: bool) -> dict[str, Any]:
+    print("📊 履歴分析を開始...")
+
+    inputs = analysis_inputs()
+    if use_cache:
+        cached = load_cached_analysis(inputs)
+        if cached is not None:
+            print(f"  - ♻️ 入力に変更なし、前回の結果を再利用（ネタ候補: {len(cached['candidates'])}件）")
+            return cached
+
+    # データ読み込み（メモリ予算を超えそうなら履歴は保持せずに集計する）
+    with profile_section("estimate_history"):
+        streaming = not fits_budget(estimate_history_bytes())
+    history = None
+    if streaming:
+        print("  - ⚠️ メモリ予算を超えそうなので履歴をストリーミングで集計します")
+    else:
+        with profile_section("load_claude_history"):
+            history = load_claude_history()
+        print(f"  - Claude Code履歴: {len(history)}件")
+
+    with profile_section("load_stats_cache"):
+        stats = load_stats_cache()
     daily_count = len(stats.get("dailyActivity", []))
     print(f"  - 使用統計: {daily_count}日分")
 
-    zsh_commands = load_zsh_history()
+    with profile_section("load_zsh_history"):
+        zsh_commands = load_zsh_history()
     print(f"  - zsh履歴: {len(zsh_commands)}件")
 
+    # 日別バケットの滑動窓（前回以降の履歴だけ足す）
+    with profile_section("window_counters"):
+        windows = update_window_counters(iter_display_rows)
+    print(f"  - 滑動窓: {len(windows.buckets)}日分のバケット")
+
     # ネタ抽出
-    candidates = extract_topic_candidates(history, stats, zsh_commands)
+    if streaming:
+        with profile_section("stream_topic_candidates"):
+            candidates, history_count = stream_topic_candidates(DAYS_TO_ANALYZE, stats, zsh_commands, windows)
+        print(f"  - Claude Code履歴: {history_count}件")
+    else:
+        with profile_section("extract_topic_candidates"):
+            candidates = extract_topic_candidates(history, stats, zsh_commands, windows)
+        history_count = len(history)
+
+    # 指示文のクラスタから見つかったテーマ（前回より新しい指示だけ学習する）
+    if np is not None:
+        with profile_section("prompt_clusters"):
+            if streaming:
+                rows = iter_display_rows()
+            else:
+                rows = zip(history.timestamps, history.displays)
+            themes = cluster_candidates(rows)
+        print(f"  - テーマのネタ候補: {len(themes)}件")
+        candidates = dedupe_candidates(candidates + themes)
     print(f"  - ネタ候補: {len(candidates)}件")
 
-    return {
+    result = {
         "analyzed_at": datetime.now().isoformat(),
-        "history_count": len(history),
+        "history_count": history_count,
         "stats_days": daily_count,
         "candidates": candidates,
     }
+    save_cached_analysis(inputs, result)
+    return result
+
+
+def load_shared_analysis() -> dict[str, Any] | None:
+    """他プロセスが共有した分析結果を読み込む（なければNone）"""
+    if not SHARED_ANALYSIS_FILE:
+        return None
+    with open(SHARED_ANALYSIS_FILE, 'r', encoding='utf-8') as f:
+        return json.load(f)
 
 
 if __name__ == "__main__":
-    result = analyze()
+    import sys
+
+    from memprofile import profiler
+
+    if "--memprofile" in sys.argv:
+        profiler.enable()
+    result = analyze(use_cache="--no-cache" not in sys.argv)
     print("\n📝 抽出されたネタ候補:")
     for i, c in enumerate(result["candidates"], 1):
         print(f"  {i}. {c['title']} (優先度: {c['priority']})")
+    profiler.report()
@@ -0,0 +1,42 @@
+"""
+API呼び出しの同時実行数制限
+
+複数アカウントを別プロセスで並列実行するとき、Anthropic・Xへの
+同時呼び出し数をホスト全体で API_SLOTS 件に抑える。
+API_SLOTS_DIR 内のスロットファイルを flock で奪い合うので、
+無関係なプロセス同士でも共有できる。未設定なら何もしない。
+"""
+import fcntl
+import time
+from contextlib import contextmanager
+from pathlib import Path
+
+from config import API_SLOTS_DIR, API_SLOTS
+from deadline import check_deadline
+
+
+@contextmanager
+def api_slot(poll_seconds: float = 0.05):
+    """空いているスロットを1つ確保している間だけAPIを呼ぶ"""
+    if not API_SLOTS_DIR or API_SLOTS <= 0:
+        yield
+        return
+
+    slots_dir = Path(API_SLOTS_DIR)
+    slots_dir.mkdir(parents=True, exist_ok=True)
+    while True:
+        for i in range(API_SLOTS):
+            f = open(slots_dir / f"slot-{i}.lock", 'a')
+            try:
+                fcntl.flock(f, fcntl.LOCK_EX | fcntl.LOCK_NB)
+            except BlockingIOError:
+                f.close()
+                continue
+            try:
+                yield
+            finally:
+                fcntl.flock(f, fcntl.LOCK_UN)
+                f.close()
+            return
+        check_deadline()  # 空きを待つ間に期限を過ぎたら諦める
+        time.sleep(poll_seconds)
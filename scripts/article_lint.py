@@ -0,0 +1,118 @@
+"""
+記事本文のストリーミング検査
+
+生成中のテキストを1行ずつ検査し、明らかに壊れた出力（フロントマター付き、
+## 以外で始まる等）はその時点で生成を打ち切る。
+**太字** の残りのように機械的に直せるものはその場で修正する。
+"""
+import re
+from typing import Any
+
+
+class ArticleValidationError(ValueError):
+    """生成を打ち切るべき違反が見つかった"""
+
+
+# 定型的なAI文章（CHARACTER_PROMPTの注意事項）
+BANNED_PHRASES = ["以下の3点から", "非常に重要"]
+
+# 連打を避けたい接続詞（CHARACTER["writing_rules"]）
+REPEATED_CONJUNCTIONS = ["さらに", "また", "したがって"]
+
+_BOLD_PATTERN = re.compile(r'\*\*(.+?)\*\*')
+_INLINE_CODE_PATTERN = re.compile(r'(`[^`]*`)')
+
+
+def strip_bold(line: str) -> str:
+    """インラインコード以外の **太字** 記号を外す"""
+    parts = _INLINE_CODE_PATTERN.split(line)
+    return "".join(
+        part if part.startswith("`") else _BOLD_PATTERN.sub(r'\1', part)
+        for part in parts
+    )
+
+
+class StreamingLinter:
+    """ストリーミング出力を1パスで検査・修正する"""
+
+    def __init__(self):
+        self.buffer = ""
+        self.output: list[str] = []
+        self.started = False
+        self.in_code_block = False
+        self.previous_conjunction: str | None = None
+        self.violations: list[dict[str, Any]] = []
+        self.repairs = 0
+
+    def _violation(self, rule: str, line_no: int, detail: str) -> None:
+        self.violations.append({"rule": rule, "line": line_no, "detail": detail})
+
+    def _check_start(self, line: str) -> None:
+        """最初の非空行は ## 見出しでなければならない"""
+        stripped = line.strip()
+        if stripped.startswith("---"):
+            raise ArticleValidationError("フロントマターが含まれています")
+        if not stripped.startswith("## "):
+            raise ArticleValidationError(f"## 見出しで始まっていません: {stripped[:30]}")
+        self.started = True
+
+    def _process_line(self, line: str) -> None:
+        line_no = len(self.output) + 1
+
+        if not self.started:
+            if not line.strip():
+                return  # 先頭の空行は捨てる
+            self._check_start(line)
+
+        if line.lstrip().startswith("```"):
+            self.in_code_block = not self.in_code_block
+            self.output.append(line)
+            return
+        if self.in_code_block:
+            self.output.append(line)
+            return
+
+        # 修正可能: **太字** の残り
+        fixed = strip_bold(line)
+        if fixed != line:
+            self.repairs += 1
+            self._violation("bold", line_no, "**太字** を除去")
+            line = fixed
+
+        # 修正不可: 定型的なAI文章
+        for phrase in BANNED_PHRASES:
+            if phrase in line:
+                self._violation("banned_phrase", line_no, phrase)
+
+        # 修正不可: 同じ接続詞で始まる文の連続
+        head = line.strip()
+        conjunction = next(
+            (c for c in REPEATED_CONJUNCTIONS if head.startswith(c)), None
+        )
+        if conjunction and conjunction == self.previous_conjunction:
+            self._violation("conjunction", line_no, conjunction)
+        if head:
+            self.previous_conjunction = conjunction
+
+        self.output.append(line)
+
+    def feed(self, chunk: str) -> None:
+        """受信したテキストを渡す（違反があれば ArticleValidationError）"""
+        self.buffer += chunk
+        *lines, self.buffer = self.buffer.split("\n")
+        for line in lines:
+            self._process_line(line)
+
+        # 1行目は改行を待たず、先頭3文字で判定できた時点で打ち切る
+        head = self.buffer.lstrip()
+        if not self.started and len(head) >= 3 and not head.startswith("## "):
+            self._check_start(head)
+
+    def finish(self) -> str:
+        """残りを処理して修正済みの本文を返す"""
+        if self.buffer:
+            self._process_line(self.buffer)
+            self.buffer = ""
+        if not self.started:
+            raise ArticleValidationError("本文が空です")
+        return "\n".join(self.output)
@@ -0,0 +1,127 @@
+"""
+記事のメタ情報（要約・トピック・告知文）の取り出し
+
+記事生成の1回のリクエストで、本文のあとに <article_meta> タグで囲んだ JSON を
+出力させる。ストリーミング中は MetaSplitter がタグより前を本文として検査側に流し、
+タグの中身だけを取り分ける。
+
+JSON が壊れていても「キー: 値」の行から拾い、それでも取れない項目は
+呼び出し側の既定値（ネタのタグ・口癖）を使う。
+"""
+import json
+import re
+from typing import Any
+
+META_OPEN = "<article_meta>"
+META_CLOSE = "</article_meta>"
+
+SUMMARY_MAX_CHARS = 100
+HOOK_MAX_CHARS = 60
+MAX_TOPICS = 5
+
+_TOPIC_RE = re.compile(r'[^a-z0-9]')
+_LINE_RE = re.compile(r'^\s*"?(\w+)"?\s*[:：]\s*(.+?)\s*,?\s*$', re.MULTILINE)
+_KEY_ALIASES = {
+    "summary": "summary",
+    "topics": "topics",
+    "tags": "topics",
+    "tweet_hook": "tweet_hook",
+    "hook": "tweet_hook",
+    "emoji": "emoji",
+}
+
+
+class MetaSplitter:
+    """ストリームを本文と <article_meta> の中身に振り分ける"""
+
+    def __init__(self):
+        self.pending = ""  # タグの途中かもしれないので保留している末尾
+        self.in_meta = False
+        self.meta = ""
+
+    def feed(self, text: str) -> str:
+        """受け取ったテキストのうち、本文として確定した部分を返す"""
+        if self.in_meta:
+            self.meta += text
+            return ""
+        buffer = self.pending + text
+        index = buffer.find(META_OPEN)
+        if index >= 0:
+            self.in_meta = True
+            self.meta = buffer[index + len(META_OPEN):]
+            self.pending = ""
+            return buffer[:index]
+        # タグの先頭と一致しうる末尾だけを次に回す
+        keep = 0
+        for n in range(min(len(META_OPEN) - 1, len(buffer)), 0, -1):
+            if META_OPEN.startswith(buffer[-n:]):
+                keep = n
+                break
+        self.pending = buffer[len(buffer) - keep:]
+        return buffer[:len(buffer) - keep]
+
+    def finish(self) -> str:
+        """残りの本文（保留していた末尾）を返す"""
+        rest, self.pending = self.pending, ""
+        return rest
+
+
+def _normalize_topics(value: Any) -> list[str]:
+    """Zennのトピックとして使える形（英小文字と数字）にそろえる"""
+    if isinstance(value, str):
+        value = re.split(r'[,、\s]+', value.strip("[]"))
+    if not isinstance(value, list):
+        return []
+    topics = []
+    for raw in value:
+        topic = _TOPIC_RE.sub("", str(raw).lower())
+        if topic and topic not in topics:
+            topics.append(topic)
+    return topics[:MAX_TOPICS]
+
+
+def _one_line(value: Any, limit: int) -> str:
+    text = " ".join(str(value or "").split()).strip('"「」')
+    return text[:limit]
+
+
+def _loads_object(raw: str) -> dict[str, Any] | None:
+    start, end = raw.find("{"), raw.rfind("}")
+    if start < 0 or end <= start:
+        return None
+    try:
+        data = json.loads(raw[start:end + 1])
+    except json.JSONDecodeError:
+        return None
+    return data if isinstance(data, dict) else None
+
+
+def parse_article_meta(raw: str) -> dict[str, Any]:
+    """<article_meta> の中身を解釈する（取れなかった項目は空）"""
+    raw = raw.split(META_CLOSE, 1)[0]
+    data = _loads_object(raw)
+    if data is None:
+        # JSONとして読めなければ「キー: 値」の行から拾う
+        data = {}
+        for key, value in _LINE_RE.findall(raw):
+            if key.lower() in _KEY_ALIASES:
+                data.setdefault(key.lower(), value.strip('"'))
+    fields = {_KEY_ALIASES[k.lower()]: v for k, v in data.items() if k.lower() in _KEY_ALIASES}
+
+    emoji = str(fields.get("emoji") or "").strip()
+    return {
+        "summary": _one_line(fields.get("summary"), SUMMARY_MAX_CHARS),
+        "topics": _normalize_topics(fields.get("topics")),
+        "tweet_hook": _one_line(fields.get("tweet_hook"), HOOK_MAX_CHARS),
+        # 絵文字1文字（異体字セレクタ込みで数コードポイント）以外は使わない
+        "emoji": emoji if 0 < len(emoji) <= 3 and not emoji.isascii() else "",
+    }
+
+
+def merge_topics(suggested: list[str], fallback: list[str]) -> list[str]:
+    """本文から提案されたトピックを優先し、足りなければネタのタグで補う"""
+    merged = []
+    for topic in suggested + _normalize_topics(fallback):
+        if topic not in merged:
+            merged.append(topic)
+    return merged[:MAX_TOPICS]
@@ -0,0 +1,76 @@
+"""
+記事候補のローカル採点
+
+best-of-k 生成で複数の下書きを比較するための決定的なスコア。
+APIは呼ばず、本文と検査結果（article_lint）だけから計算する。
+"""
+from typing import Any
+
+from config import CHARACTER
+
+
+# create_article_prompt の要件
+TARGET_CHARS = (1500, 3000)
+TARGET_HEADINGS = (3, 5)
+
+# 検査違反1件あたりの減点（自動修正済みのものは軽め）
+VIOLATION_PENALTY = {
+    "bold": 0.5,
+    "banned_phrase": 3.0,
+    "conjunction": 1.0,
+}
+
+
+def _range_score(value: float, low: float, high: float) -> float:
+    """範囲内なら1、外れるほど0に近づく"""
+    if low <= value <= high:
+        return 1.0
+    distance = (low - value) / low if value < low else (value - high) / high
+    return max(0.0, 1.0 - distance)
+
+
+def count_headings(content: str) -> int:
+    """コードブロック外の ## 見出しを数える"""
+    count = 0
+    in_code_block = False
+    for line in content.splitlines():
+        if line.lstrip().startswith("```"):
+            in_code_block = not in_code_block
+        elif not in_code_block and line.startswith("## "):
+            count += 1
+    return count
+
+
+def score_article(
+    content: str,
+    violations: list[dict[str, Any]] | None = None,
+) -> dict[str, float]:
+    """記事本文を採点する（高いほど良い）"""
+    length = _range_score(len(content), *TARGET_CHARS)
+    headings = _range_score(count_headings(content), *TARGET_HEADINGS)
+
+    penalty = sum(
+        VIOLATION_PENALTY.get(v.get("rule"), 1.0) for v in violations or []
+    )
+
+    # 口癖は1〜2回ならキャラらしさ、それ以上の繰り返しは減点
+    catchphrase = 0.0
+    for phrase in CHARACTER["catchphrases"]:
+        uses = content.count(phrase)
+        if uses:
+            catchphrase += 0.5 if uses <= 2 else -0.5 * (uses - 2)
+    catchphrase = max(-3.0, min(catchphrase, 1.0))
+
+    total = 4.0 * length + 3.0 * headings + catchphrase - penalty
+    return {
+        "total": round(total, 4),
+        "length": round(length, 4),
+        "headings": round(headings, 4),
+        "catchphrase": round(catchphrase, 4),
+        "penalty": round(penalty, 4),
+    }
+
+
+def select_best(drafts: list[dict[str, Any]]) -> int:
+    """最高スコアの下書きの添字を返す（同点なら先に来たもの）"""
+    return max(range(len(drafts)), key=lambda i: (drafts[i]["score"]["total"], -i))
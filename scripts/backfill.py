@@ -0,0 +1,275 @@
+"""
+下書きのまとめ生成（Message Batches API）
+
+休みの前などに、次に投稿する N 件のネタを1つのバッチで送り、
+完了を待って未公開（published: false）の記事として保存する。
+バッチは通常の生成より安いかわりに完了まで時間がかかるので、
+状態を data/backfill/<batch_id>.json に残し、途中で止めても
+次回の --backfill で同じバッチの続きから受け取る。
+
+- 完了の確認は BACKFILL_POLL_SECONDS から1.5倍ずつ間隔を延ばす
+- 保存済みの結果は飛ばすので、受け取りの途中で落ちても二重に保存しない
+- 失敗・期限切れのネタは下書き済みにせず、次のバッチでまた選ばれる
+- 件数はトークン予算の残りに収まるよう減らし、使った分は usage_ledger に記録する
+- 日次実行でそのネタが選ばれたら、生成し直さずに下書きを公開に切り替えて使う
+
+stub_servers の AnthropicStub がバッチのエンドポイントも代替する。
+"""
+import hashlib
+import json
+import os
+import re
+import time
+from datetime import datetime
+from pathlib import Path
+from typing import Any
+
+import anthropic
+
+from config import (
+    ANTHROPIC_MODEL,
+    ANTHROPIC_TIMEOUT,
+    BACKFILL_DIR,
+    BACKFILL_POLL_SECONDS,
+    BACKFILL_POLL_MAX_SECONDS,
+    BACKFILL_MAX_WAIT_SECONDS,
+)
+from article_lint import ArticleValidationError
+from generate_article import (
+    ARTICLE_MAX_TOKENS,
+    build_article,
+    create_article_prompt,
+    get_client,
+    lint_article_text,
+    make_draft,
+    save_article,
+)
+from topic_manager import _posted_titles, load_topics, rank_topics
+from usage_ledger import affordable_calls, record_call
+
+
+def custom_id_for(topic: dict[str, Any]) -> str:
+    """バッチ内でネタを識別するID（英数字とハイフンのみ）"""
+    digest = hashlib.sha256(topic.get("title", "").encode("utf-8")).hexdigest()
+    return f"topic-{digest[:16]}"
+
+
+class BackfillBatch:
+    """1つのバッチの送信内容と受け取り状況"""
+
+    def __init__(self, data: dict[str, Any], backfill_dir: Path = BACKFILL_DIR):
+        self.data = data
+        self.path = backfill_dir / f"{data['batch_id']}.json"
+
+    @property
+    def batch_id(self) -> str:
+        return self.data["batch_id"]
+
+    @property
+    def finished(self) -> bool:
+        return self.data["status"] == "finished"
+
+    @property
+    def items(self) -> dict[str, dict[str, Any]]:
+        return self.data["items"]
+
+    @classmethod
+    def load(cls, path: Path) -> "BackfillBatch":
+        with open(path, 'r', encoding='utf-8') as f:
+            return cls(json.load(f), path.parent)
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.path)
+
+    def count(self, status: str) -> int:
+        return sum(1 for item in self.items.values() if item["status"] == status)
+
+
+def load_batches(backfill_dir: Path = BACKFILL_DIR) -> list[BackfillBatch]:
+    if not backfill_dir.exists():
+        return []
+    return [BackfillBatch.load(p) for p in sorted(backfill_dir.glob("*.json"))]
+
+
+def select_backfill_topics(count: int, batches: list[BackfillBatch]) -> list[dict[str, Any]]:
+    """未投稿で、下書き済み・受け取り待ちでもないネタを優先度順に count 件"""
+    taken = set(_posted_titles())
+    for batch in batches:
+        for item in batch.items.values():
+            if item["status"] != "failed":
+                taken.add(item["topic"].get("title", "").lower())
+    available = [t for t in load_topics() if t.get("title", "").lower() not in taken]
+    return rank_topics(available, count)
+
+
+def submit_batch(client: anthropic.Anthropic, topics: list[dict[str, Any]]) -> BackfillBatch:
+    """ネタをまとめて1つのバッチとして送る"""
+    items = {custom_id_for(t): {"topic": t, "status": "pending"} for t in topics}
+    requests = [
+        {
+            "custom_id": custom_id,
+            "params": {
+                "model": ANTHROPIC_MODEL,
+                "max_tokens": ARTICLE_MAX_TOKENS,
+                "messages": [{"role": "user", "content": create_article_prompt(item["topic"])}],
+            },
+        }
+        for custom_id, item in items.items()
+    ]
+    created = client.messages.batches.create(requests=requests, timeout=ANTHROPIC_TIMEOUT)
+    batch = BackfillBatch({
+        "batch_id": created.id,
+        "created_at": datetime.now().isoformat(),
+        "model": ANTHROPIC_MODEL,
+        "status": "in_progress",
+        "items": items,
+    })
+    batch.save()
+    print(f"📦 {len(items)}件のネタをバッチで送信: {created.id}")
+    return batch
+
+
+def wait_for_batch(
+    client: anthropic.Anthropic,
+    batch: BackfillBatch,
+    poll: float = BACKFILL_POLL_SECONDS,
+    max_wait: float = BACKFILL_MAX_WAIT_SECONDS,
+) -> bool:
+    """バッチの処理が終わるまで待つ（max_wait 秒で終わらなければFalse）"""
+    start = time.monotonic()
+    while True:
+        status = client.messages.batches.retrieve(batch.batch_id, timeout=ANTHROPIC_TIMEOUT)
+        counts = status.request_counts
+        if status.processing_status == "ended":
+            print(
+                f"✅ バッチ完了: 成功 {counts.succeeded} / 失敗 {counts.errored}"
+                f" / 期限切れ {counts.expired} / 取消 {counts.canceled}"
+            )
+            return True
+        elapsed = time.monotonic() - start
+        if elapsed + poll > max_wait:
+            return False
+        print(f"⏳ 処理中 {counts.processing}件（{poll:.0f}秒後に再確認）")
+        time.sleep(poll)
+        poll = min(poll * 1.5, BACKFILL_POLL_MAX_SECONDS)
+
+
+def result_text(message: Any) -> str:
+    return "".join(block.text for block in message.content if block.type == "text")
+
+
+def collect_results(client: anthropic.Anthropic, batch: BackfillBatch) -> None:
+    """終わったバッチの結果を未公開の記事として保存する（保存済みは飛ばす）"""
+    seen = set()
+    for response in client.messages.batches.results(batch.batch_id, timeout=ANTHROPIC_TIMEOUT):
+        item = batch.items.get(response.custom_id)
+        seen.add(response.custom_id)
+        if item is None or item["status"] == "saved":
+            continue
+        title = item["topic"].get("title", "")
+        result = response.result
+        if result.type != "succeeded":
+            item.update(status="failed", error=result.type)
+            print(f"⚠️ {title}: {result.type}")
+            batch.save()
+            continue
+        if not item.get("usage_recorded"):
+            # 再開時に同じ結果のトークンを二重に数えない
+            message = result.message
+            record_call(message.model, message.usage, None, message.stop_reason, mode="batch", topic=item["topic"])
+            item["usage_recorded"] = True
+        try:
+            content, violations, meta = lint_article_text(result_text(result.message))
+        except ArticleValidationError as e:
+            item.update(status="failed", error=str(e))
+            print(f"⚠️ {title}: 検査で不合格: {e}")
+            batch.save()
+            continue
+        article = build_article(item["topic"], make_draft(content, violations, meta))
+        path = save_article(article, published=False)
+        item.update(
+            status="saved",
+            path=str(path),
+            summary=article["summary"],
+            tweet_hook=article["tweet_hook"],
+            error=None,
+        )
+        batch.save()
+
+    for custom_id, item in batch.items.items():
+        if custom_id not in seen and item["status"] == "pending":
+            item.update(status="failed", error="結果なし")
+    batch.data["status"] = "finished"
+    batch.data["finished_at"] = datetime.now().isoformat()
+    batch.save()
+
+
+def run_backfill(count: int, poll: float = BACKFILL_POLL_SECONDS) -> dict[str, Any]:
+    """次の count 件のネタの下書きをバッチで作る
+
+    受け取りの終わっていないバッチがあれば、新しく送らずにその続きを受け取る。
+    """
+    client = get_client()
+    batches = load_batches()
+    unfinished = [b for b in batches if not b.finished]
+    if unfinished:
+        print(f"🔁 受け取りの終わっていないバッチを再開: {', '.join(b.batch_id for b in unfinished)}")
+    else:
+        count = affordable_calls(count, "バックフィルの件数")
+        topics = select_backfill_topics(count, batches) if count else []
+        if not topics:
+            print("📭 下書きにできるネタがありません")
+            return {"batches": [], "saved": 0, "failed": 0, "pending": 0}
+        unfinished = [submit_batch(client, topics)]
+
+    summary = {"batches": [], "saved": 0, "failed": 0, "pending": 0}
+    for batch in unfinished:
+        summary["batches"].append(batch.batch_id)
+        if not wait_for_batch(client, batch, poll):
+            print(f"⏸️ {batch.batch_id} はまだ処理中です（次回 --backfill で続きを受け取ります）")
+            summary["pending"] += batch.count("pending")
+            continue
+        collect_results(client, batch)
+        summary["saved"] += batch.count("saved")
+        summary["failed"] += batch.count("failed")
+    return summary
+
+
+_PUBLISHED_RE = re.compile(r'\A(---\n.*?^published: )false[ \t]*$', re.MULTILINE | re.DOTALL)
+
+
+def find_backfill_draft(topic: dict[str, Any]) -> tuple[BackfillBatch, dict[str, Any]] | None:
+    """topic の保存済みの下書き（未使用のもの）"""
+    title = topic.get("title", "").lower()
+    for batch in load_batches():
+        for item in batch.items.values():
+            if (
+                item["status"] == "saved"
+                and item["topic"].get("title", "").lower() == title
+                and Path(item["path"]).exists()
+            ):
+                return batch, item
+    return None
+
+
+def publish_backfill_draft(topic: dict[str, Any]) -> tuple[dict[str, Any], Path] | None:
+    """topic の下書きがあれば published: true に切り替えて返す（なければNone）"""
+    found = find_backfill_draft(topic)
+    if found is None:
+        return None
+    batch, item = found
+    path = Path(item["path"])
+    text = path.read_text(encoding="utf-8")
+    path.write_text(_PUBLISHED_RE.sub(r"\1true", text, count=1), encoding="utf-8")
+    item.update(status="published", published_at=datetime.now().isoformat())
+    batch.save()
+    article = {
+        "title": topic.get("title", ""),
+        "summary": item.get("summary", ""),
+        "tweet_hook": item.get("tweet_hook", ""),
+    }
+    return article, path
@@ -0,0 +1,120 @@
+#!/usr/bin/env python3
+"""
+履歴読み込みのメモリベンチマーク
+
+90日分の合成 history.jsonl を作り、従来の「dictのリスト」と
+HistoryColumns で読み込んだときのピークメモリを tracemalloc で比較する。
+
+使い方:
+    python scripts/bench_history_memory.py --days 90 --per-day 400
+"""
+import argparse
+import importlib
+import json
+import os
+import random
+import sys
+import tempfile
+import time
+import tracemalloc
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+
+def write_synthetic_history(path: Path, days: int, per_day: int, seed: int = 0) -> int:
+    """Claude Codeの history.jsonl に似た合成データを書き出す"""
+    rng = random.Random(seed)
+    projects = [f"/Users/someone/Desktop/work/project-{i}" for i in range(40)]
+    prompts = [
+        "/commit", "/review", "tmuxでペインを分割して", "mcpサーバーを追加",
+        "スライドを作って", "テストを書いて", "このエラーを直して", "リファクタリングして",
+    ]
+    now_ms = time.time() * 1000
+    count = days * per_day
+    with open(path, 'w', encoding='utf-8') as f:
+        for i in range(count):
+            entry = {
+                "display": f"{rng.choice(prompts)} " + "詳細な指示" * rng.randint(2, 20),
+                "pastedContents": {},
+                "timestamp": now_ms - (count - i) * (days * 86_400_000 / count),
+                "project": rng.choice(projects),
+                "sessionId": f"{rng.getrandbits(128):032x}",
+            }
+            f.write(json.dumps(entry, ensure_ascii=False) + "\n")
+    return count
+
+
+def load_as_dicts(path: Path, cutoff_ts: float) -> list[dict]:
+    """従来の読み込み方（全キーを持つdictのリスト）"""
+    from analyze_history import parse_history_line
+
+    entries = []
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            entry = parse_history_line(line, cutoff_ts)
+            if entry is not None:
+                entries.append(entry)
+    return entries
+
+
+def load_as_columns(path: Path, cutoff_ts: float):
+    """HistoryColumns での読み込み"""
+    from analyze_history import parse_history_line
+    from history_columns import HistoryColumns
+
+    entries = HistoryColumns()
+    with open(path, 'r', encoding='utf-8') as f:
+        for line in f:
+            entry = parse_history_line(line, cutoff_ts)
+            if entry is not None:
+                entries.append_entry(entry)
+    return entries
+
+
+def measure(loader, path: Path, cutoff_ts: float) -> tuple[int, int, float, int]:
+    """(保持サイズ, ピーク, 秒数, 件数) を測る"""
+    tracemalloc.start()
+    start = time.perf_counter()
+    result = loader(path, cutoff_ts)
+    elapsed = time.perf_counter() - start
+    current, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return current, peak, elapsed, len(result)
+
+
+def main():
+    parser = argparse.ArgumentParser(description="履歴読み込みのメモリベンチマーク")
+    parser.add_argument("--days", type=int, default=90, help="合成する日数")
+    parser.add_argument("--per-day", type=int, default=400, help="1日あたりの件数")
+    args = parser.parse_args()
+
+    with tempfile.TemporaryDirectory(prefix="zenn-bench-") as tmp:
+        # 設定の読み込み時に実際の ~/.claude・データディレクトリを触らないようにする
+        # （CLAUDE_HISTORY・CLAUDE_STATS は HOME から決まる）
+        os.environ["HOME"] = tmp
+        os.environ.setdefault("ZENN_DATA_DIR", str(Path(tmp) / "data"))
+
+        path = Path(tmp) / "history.jsonl"
+        total = write_synthetic_history(path, args.days, args.per_day)
+        print(f"合成履歴: {total}件 ({path.stat().st_size / 1e6:.1f} MB)")
+
+        # パーサーのimportをベンチマーク対象から外す
+        for module in ("analyze_history", "history_columns"):
+            importlib.import_module(module)
+
+        rows = []
+        for name, loader in [("list[dict]", load_as_dicts), ("HistoryColumns", load_as_columns)]:
+            current, peak, elapsed, count = measure(loader, path, 0)
+            rows.append((name, current, peak, elapsed, count))
+
+    print(f"\n{'loader':<16}{'保持(MB)':>10}{'ピーク(MB)':>12}{'秒':>8}{'件数':>8}")
+    for name, current, peak, elapsed, count in rows:
+        print(f"{name:<16}{current / 1e6:>10.2f}{peak / 1e6:>12.2f}{elapsed:>8.2f}{count:>8}")
+
+    base, compact = rows
+    print(f"\n保持メモリ: {base[1] / compact[1]:.1f}倍削減, ピーク: {base[2] / compact[2]:.1f}倍削減")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,80 @@
+#!/usr/bin/env python3
+"""
+指示文クラスタリングのベンチマーク
+
+いくつかのテーマから合成した指示文を PromptClusters に流し、
+学習にかかる時間と、同じテーマの指示がどれだけ同じクラスタに
+まとまったか（純度）を表示する。
+
+使い方:
+    python scripts/bench_prompt_clusters.py --prompts 300000
+"""
+import argparse
+import os
+import random
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+THEMES = {
+    "docker": ["Dockerfileを{}してビルドを速くして", "docker composeで{}が起動しない", "コンテナの{}を確認して"],
+    "test": ["pytestで{}のテストを書いて", "失敗しているテスト{}を直して", "テストカバレッジを{}まで上げて"],
+    "react": ["Reactコンポーネントの{}をリファクタリング", "useEffectで{}が二重に呼ばれる", "Next.jsのページ{}を追加"],
+    "sql": ["SQLクエリ{}が遅いのでインデックスを検討", "マイグレーション{}を作成して", "PostgreSQLの{}を調べて"],
+    "slides": ["スライドを{}枚で作って", "プレゼン資料の{}ページを修正", "pptxの{}レイアウトを整えて"],
+    "git": ["git rebaseで{}のコンフリクトを解消", "ブランチ{}をmainにマージして", "コミット履歴の{}を整理"],
+    "mcp": ["MCPサーバー{}を追加して", "mcp設定の{}を確認", "Google DriveのMCPで{}を取得"],
+    "ci": ["GitHub Actionsのワークフロー{}が落ちる", "CIのキャッシュ{}を設定", "デプロイジョブ{}を追加して"],
+}
+
+
+def synthetic_prompts(count: int, seed: int = 0):
+    rng = random.Random(seed)
+    names = list(THEMES)
+    now_ms = time.time() * 1000
+    for i in range(count):
+        theme = rng.choice(names)
+        text = rng.choice(THEMES[theme]).format(f"{rng.choice(['api', 'auth', 'user', 'log'])}-{rng.randint(1, 999)}")
+        yield now_ms - (count - i) * 1000.0, text, theme
+
+
+def main():
+    parser = argparse.ArgumentParser(description="指示文クラスタリングのベンチマーク")
+    parser.add_argument("--prompts", type=int, default=300_000, help="合成する指示の件数")
+    args = parser.parse_args()
+
+    os.environ.setdefault("ZENN_DATA_DIR", tempfile.mkdtemp(prefix="zenn-bench-"))
+    from prompt_clusters import PromptClusters
+
+    data = list(synthetic_prompts(args.prompts))
+    with tempfile.TemporaryDirectory(prefix="zenn-bench-") as tmp:
+        model = PromptClusters(state_dir=Path(tmp))
+        start = time.perf_counter()
+        learned = model.update((ts, text) for ts, text, _ in data)
+        elapsed = time.perf_counter() - start
+
+        # 2回目は新しい指示がないので何もしない（差分更新）
+        start = time.perf_counter()
+        again = model.update((ts, text) for ts, text, _ in data)
+        incremental = time.perf_counter() - start
+
+    # 純度: 各クラスタで最も多いテーマの割合（件数で加重）
+    from prompt_clusters import vectorize
+    sample = data[-20_000:]
+    labels = model.similarities(vectorize([t for _, t, _ in sample])).argmax(axis=1)
+    by_cluster = defaultdict(Counter)
+    for label, (_, _, theme) in zip(labels.tolist(), sample):
+        by_cluster[label][theme] += 1
+    purity = sum(c.most_common(1)[0][1] for c in by_cluster.values()) / len(sample)
+
+    print(f"学習: {learned}件 {elapsed:.2f}秒 ({learned / elapsed:,.0f}件/秒)")
+    print(f"差分更新（新規なし）: {again}件 {incremental:.2f}秒")
+    print(f"純度: {purity:.3f}（使われたクラスタ {len(by_cluster)}個 / テーマ {len(THEMES)}個）")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+#!/usr/bin/env python3
+"""
+ストリーミングサニタイザのスループットベンチマーク
+
+合成したセッション記録（社名やローカルパスを含む）をチャンク単位で生成し、
+ファイルに書き出さずにそのまま sanitize_stream に流して、
+処理速度（MB/s）と tracemalloc のピークメモリを測る。
+入力サイズを増やしてもピークが変わらないことを確認する。
+
+使い方:
+    python scripts/bench_sanitize_stream.py --size-mb 1024
+"""
+import argparse
+import random
+import sys
+import time
+import tracemalloc
+from pathlib import Path
+from typing import IO
+
+sys.path.insert(0, str(Path(__file__).parent))
+
+from config import SENSITIVE_KEYWORDS
+from stream_sanitizer import DEFAULT_CHUNK_SIZE, sanitize_stream
+
+
+class SyntheticTranscript:
+    """read() のたびに合成テキストを返すファイル風オブジェクト"""
+
+    def __init__(self, size_chars: int, seed: int = 0):
+        rng = random.Random(seed)
+        keyword = SENSITIVE_KEYWORDS[0] if SENSITIVE_KEYWORDS else "Example"
+        fragments = [
+            "ツールの出力を確認しました。",
+            f"{keyword} 向けの資料を更新して ",
+            "/Users/someone/Desktop/work/project/src/main.py を編集 ",
+            '{"type": "tool_use", "name": "Bash", "input": {"command": "ls"}}\n',
+            "テストが通ったのでコミットします。\n",
+        ]
+        # 同じブロックを繰り返して生成コストを測定から外す
+        self.block = "".join(rng.choice(fragments) for _ in range(4000))
+        self.remaining = size_chars
+        self.offset = 0
+
+    def read(self, size: int) -> str:
+        size = min(size, self.remaining)
+        out = []
+        while size > 0:
+            piece = self.block[self.offset:self.offset + size]
+            out.append(piece)
+            size -= len(piece)
+            self.remaining -= len(piece)
+            self.offset = (self.offset + len(piece)) % len(self.block)
+        return "".join(out)
+
+
+class CountingSink:
+    """書き込まれた文字数だけ数える出力先"""
+
+    def __init__(self):
+        self.chars = 0
+        self.redactions = 0
+
+    def write(self, text: str) -> int:
+        self.chars += len(text)
+        self.redactions += text.count("[企業名]")
+        return len(text)
+
+
+def run(size_mb: int, chunk_size: int) -> tuple[float, int, CountingSink]:
+    """(秒数, ピークバイト数, 出力) を返す"""
+    src: IO[str] = SyntheticTranscript(size_mb * 1_000_000)  # type: ignore[assignment]
+    sink = CountingSink()
+    tracemalloc.start()
+    start = time.perf_counter()
+    sanitize_stream(src, sink, chunk_size=chunk_size)  # type: ignore[arg-type]
+    elapsed = time.perf_counter() - start
+    _, peak = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return elapsed, peak, sink
+
+
+def main():
+    parser = argparse.ArgumentParser(description="ストリーミングサニタイザのベンチマーク")
+    parser.add_argument("--size-mb", type=int, default=1024, help="入力サイズ（百万文字単位）")
+    parser.add_argument("--chunk-size", type=int, default=DEFAULT_CHUNK_SIZE, help="チャンクの文字数")
+    args = parser.parse_args()
+
+    sizes = sorted({max(1, args.size_mb // 16), args.size_mb})
+    print(f"{'入力(M文字)':>12}{'秒':>9}{'M文字/s':>10}{'ピーク(MB)':>12}{'伏せ字':>10}")
+    for size in sizes:
+        elapsed, peak, sink = run(size, args.chunk_size)
+        print(f"{size:>12}{elapsed:>9.2f}{size / elapsed:>10.1f}{peak / 1e6:>12.2f}{sink.redactions:>10}")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,6 +1,7 @@
 """
 Zenn自動投稿システム設定
 """
+import json
 import os
 from pathlib import Path
 
@@ -14,10 +15,18 @@ except ImportError:
 # ============================================================
 # パス設定
 # ============================================================
-BASE_DIR = Path(__file__).parent.parent
-SCRIPTS_DIR = BASE_DIR / "scripts"
-DATA_DIR = BASE_DIR / "data"
+# ZENN_BASE_DIR で記事リポジトリを差し替えられる（負荷試験・複数アカウント運用）
+BASE_DIR = Path(os.getenv("ZENN_BASE_DIR") or Path(__file__).parent.parent)
+SCRIPTS_DIR = Path(__file__).parent
+DATA_DIR = Path(os.getenv("ZENN_DATA_DIR") or BASE_DIR / "data")
 ARTICLES_DIR = BASE_DIR / "articles"
+DRAFTS_DIR = DATA_DIR / "drafts"  # best-of-k で選ばれなかった下書き（採点の見直し用）
+ANALYSIS_CACHE_FILE = DATA_DIR / "analysis_cache.json"  # analyze() の結果キャッシュ
+RUNS_DIR = DATA_DIR / "runs"  # 日次パイプラインの実行ジャーナル
+RESUME_MAX_AGE_DAYS = 2  # これより前に始まった未完了の実行は再開せずに打ち切る
+RESUME_MAX_ATTEMPTS = 3  # 同じ実行を試す回数の上限（毎回同じ理由で失敗する実行で止まらないように）
+HISTORY_CACHE_DIR = DATA_DIR / "history_cache"  # サニタイズ済み履歴の日別シャード
+HISTORY_SOURCE_CACHE_DIR = DATA_DIR / "history_source_cache"  # 追加の履歴ソースごとのシャード
 
 # Claude Code関連パス
 CLAUDE_DIR = Path.home() / ".claude"
@@ -25,13 +34,20 @@ CLAUDE_HISTORY = CLAUDE_DIR / "history.jsonl"
 CLAUDE_STATS = CLAUDE_DIR / "stats-cache.json"
 CLAUDE_PROJECTS = CLAUDE_DIR / "projects"
 ZSH_HISTORY = Path.home() / ".zsh_history"
+# 他のマシンから同期した履歴（ディレクトリまたは tar / tar.gz。os.pathsep 区切りで複数指定）
+HISTORY_SOURCES = [
+    Path(p).expanduser() for p in os.getenv("ZENN_HISTORY_SOURCES", "").split(os.pathsep) if p
+]
 
 # ============================================================
 # API設定
 # ============================================================
 ANTHROPIC_API_KEY = os.getenv("ANTHROPIC_API_KEY")
 ANTHROPIC_MODEL = "claude-opus-4-5-20251101"
+ARTICLE_LINT_RETRIES = 1  # 出力検査で打ち切ったときの再生成回数
+BEST_OF_K = int(os.getenv("BEST_OF_K", "1"))  # 1記事あたり並列生成する下書き数
 
+TWITTER_API_BASE = os.getenv("TWITTER_API_BASE", "https://api.twitter.com")
 TWITTER_CONSUMER_KEY = os.getenv("TWITTER_CONSUMER_KEY")
 TWITTER_CONSUMER_SECRET = os.getenv("TWITTER_CONSUMER_SECRET")
 TWITTER_BEARER_TOKEN = os.getenv("TWITTER_BEARER_TOKEN")
@@ -75,6 +91,12 @@ CHARACTER = {
     ],
 }
 
+# アカウントごとにキャラクターを差し替える場合はJSONで上書きする
+CHARACTER_FILE = os.getenv("ZENN_CHARACTER_FILE")
+if CHARACTER_FILE:
+    with open(CHARACTER_FILE, 'r', encoding='utf-8') as f:
+        CHARACTER.update(json.load(f))
+
 # キャラクタープロンプト（記事生成時に使用）
 CHARACTER_PROMPT = f"""
 あなたは「{CHARACTER['name']}」（愛称: {CHARACTER['nickname']}）として記事を書きます。
@@ -123,6 +145,7 @@ EXCLUDED_PATH_PATTERNS = [
 # ============================================================
 # Zenn設定
 # ============================================================
+ZENN_USERNAME = os.getenv("ZENN_USERNAME", "michey0495")
 ZENN_TOPICS = ["claudecode", "ai", "cli", "productivity", "automation"]
 DEFAULT_EMOJI = "🤖"
 
@@ -141,3 +164,148 @@ TWEET_TEMPLATES = [
 # ============================================================
 TOPIC_STOCK_MIN = 10  # 最低限確保するネタ数
 DAYS_TO_ANALYZE = 10  # 分析対象日数
+HISTORY_CACHE_ENABLED = True  # サニタイズ済み履歴キャッシュを使う
+HISTORY_CACHE_FLUSH_LINES = 50_000  # キャッシュ更新時にこの行数ごとにシャードへ書き出す
+HISTORY_REORDER_WINDOW = 1000  # 各ソース内で時刻が前後していても並べ直せる件数
+HISTORY_MERGE_QUEUE = 8  # ソースごとに先読みしておくチャンク数（1チャンク1000件）
+HISTORY_SYNC_LAG_HOURS = 48  # 他のマシンの履歴が同期されて届くまでの遅れ（この分だけ遡って読み直す）
+
+# ============================================================
+# デーモン設定（run_daily.py --daemon）
+# ============================================================
+DAEMON_SOCKET = DATA_DIR / "daemon.sock"  # --status 問い合わせ用ソケット
+DAEMON_STATE_FILE = DATA_DIR / "daemon_state.json"  # 最終実行時刻（取りこぼし補完用）
+DAEMON_JITTER_SECONDS = 300  # 各ジョブの実行時刻をずらす最大秒数
+DAEMON_JOBS = {
+    "publish": {"at": "00:00"},  # 毎日決まった時刻に投稿
+    "refresh": {"interval_minutes": 360},  # ネタストック補充
+    "metrics": {"interval_minutes": 180},  # ツイート反応の取得
+}
+
+# ============================================================
+# 履歴のライブ取り込み（デーモン時のみ）
+# ============================================================
+LIVE_INGEST_ENABLED = os.getenv("LIVE_INGEST_ENABLED", "0") == "1"
+LIVE_INGEST_POLL_SECONDS = 30  # inotifyが使えない場合のポーリング間隔
+
+# ============================================================
+# 状態ログ（ネタストック・投稿記録の保存形式）
+# ============================================================
+STATE_LOG_FSYNC_BATCH = 16  # この件数ごとにfsync
+STATE_LOG_FSYNC_INTERVAL = 1.0  # 前回fsyncからこの秒数を過ぎたらfsync
+STATE_LOG_COMPACT_EVENTS = 1000  # ログがこの件数を超えたらスナップショットへ畳み込む
+
+# ============================================================
+# 複数アカウント運用（scripts/multi_tenant.py）
+# ============================================================
+# 親プロセスで一度だけ行った analyze() の結果（全アカウントで共有・読み取り専用）
+SHARED_ANALYSIS_FILE = os.getenv("ZENN_SHARED_ANALYSIS")
+# API呼び出しの同時実行数をプロセスをまたいで制限するスロット
+API_SLOTS_DIR = os.getenv("ZENN_API_SLOTS_DIR")
+API_SLOTS = int(os.getenv("ZENN_API_SLOTS", "0"))
+
+# ============================================================
+# 反応に基づくネタの優先度（scripts/engagement_index.py）
+# ============================================================
+ENGAGEMENT_INDEX_FILE = DATA_DIR / "engagement_index.json"
+ENGAGEMENT_HALF_LIFE_DAYS = 14  # 反応スコアが半分に減衰するまでの日数
+ENGAGEMENT_WEIGHT = 1.0  # 優先度に足す反応スコアの重み
+ENGAGEMENT_TRACK_DAYS = 60  # この日数反応の増えないネタは、ツイートの前回値ごと索引から外す
+
+# ============================================================
+# メモリ（scripts/memprofile.py）
+# ============================================================
+# 0なら無制限。超えそうなローダーはストリーミング処理に切り替える
+MEMORY_BUDGET_MB = int(os.getenv("ZENN_MEMORY_BUDGET_MB", "0"))
+MEMPROFILE_TOP_N = 5  # --memprofile で区間ごとに表示する割り当て箇所の数
+HISTORY_MEMORY_FACTOR = 3  # 履歴を全件保持するときのメモリ量 / ファイルサイズ の見積もり
+
+# ============================================================
+# 指示文のクラスタリング（scripts/prompt_clusters.py）
+# ============================================================
+CLUSTER_STATE_DIR = DATA_DIR / "prompt_clusters"  # 重心と各クラスタの集計（差分更新用）
+CLUSTER_K = 24  # クラスタ数
+CLUSTER_DIM = 2 ** 11  # 文字n-gramをハッシュする次元数
+CLUSTER_NGRAMS = (2, 3)  # 使う文字n-gramの長さ
+CLUSTER_BATCH = 2048  # ミニバッチの件数
+CLUSTER_MAX_CHARS = 400  # 1件あたりベクトル化する最大文字数
+CLUSTER_MIN_CHARS = 8  # これより短い指示（/commit など）は使わない
+CLUSTER_MIN_SIZE = 20  # ネタにするクラスタの最小件数
+CLUSTER_COUNT_CAP = 5000  # 重心の更新幅の下限を保つための件数の上限（古い傾向を忘れる）
+
+# ============================================================
+# 実行期限とタイムアウト（scripts/deadline.py）
+# ============================================================
+# 日次実行の期限（"HH:MM" または "15m"）。空なら期限なし（各呼び出しのタイムアウトだけ効く）
+PIPELINE_DEADLINE = os.getenv("ZENN_DEADLINE", "")
+ANTHROPIC_TIMEOUT = 300  # 記事生成1回あたりの上限秒数
+X_API_TIMEOUT = 30  # X API 1回あたりの上限秒数
+GIT_TIMEOUT = 120  # git コマンド1回あたりの上限秒数
+# 各ステージを始めるのに最低限必要な残り時間（秒）。足りなければそのステージは打ち切る
+STAGE_MIN_SECONDS = {
+    "stock": 30,
+    "generate": 120,
+    "push": 15,
+    "tweet": 10,
+    "note": 60,
+    "performance": 20,
+}
+
+# ============================================================
+# 記事生成のヘッジとフォールバック（scripts/hedging.py）
+# ============================================================
+# 予備リクエストを送るか（"1" で有効）
+HEDGE_ENABLED = os.getenv("ZENN_HEDGE", "") == "1"
+HEDGE_PERCENTILE = float(os.getenv("ZENN_HEDGE_PERCENTILE", "95"))  # 過去の所要時間のこの分位点を超えたら予備を送る
+HEDGE_MIN_SAMPLES = 10  # 記録がこれより少ないうちはヘッジしない
+LATENCY_HISTORY_FILE = DATA_DIR / "generation_latency.json"  # モデル別の所要時間の記録
+LATENCY_HISTORY_SIZE = 200  # モデルごとに残す直近の件数
+# 過負荷（529）が続いたときに切り替えるモデル。空ならフォールバックしない
+ANTHROPIC_FALLBACK_MODEL = os.getenv("ANTHROPIC_FALLBACK_MODEL", "claude-sonnet-4-5-20250929")
+OVERLOAD_FALLBACK_AFTER = 2  # 過負荷で失敗した回数がこれに達したらフォールバック
+OVERLOAD_BACKOFF = float(os.getenv("ZENN_OVERLOAD_BACKOFF", "5"))  # 過負荷の再試行までの待ち時間（秒、回数ごとに倍）
+
+# ============================================================
+# 日別バケットの滑動窓カウンタ（scripts/window_counters.py）
+# ============================================================
+WINDOW_COUNTERS_FILE = DATA_DIR / "window_counters.json"  # 日別の件数（差分更新用）
+TREND_WINDOWS = (1, 7, 30, 90)  # 同じバケットから集計する窓の日数
+TREND_SHORT_DAYS = 7  # トレンドは「直近 SHORT 日の1日あたり件数」と
+TREND_LONG_DAYS = 30  # 「直近 LONG 日の1日あたり件数」の比（log2）
+TREND_MIN_COUNT = 3  # 長い窓でこれ未満のコマンド・語は候補にしない
+TREND_RISING_MIN = 1.0  # キーワードを「急上昇」とみなすトレンドの下限（2倍）
+TREND_WEIGHT = 2.0  # トレンド1あたりに上げる優先度
+KEYWORDS_PER_DAY = 300  # 1日のバケットに残すキーワードの種類数（状態の大きさを一定に保つ）
+
+# ============================================================
+# 公開先（scripts/publishers.py）
+# ============================================================
+# 公開先（カンマ区切り: zenn / note / x）。Zenn と note は並行し、X は Zenn の公開後に送る
+PUBLISH_TARGETS = [t.strip() for t in os.getenv("ZENN_PUBLISH_TARGETS", "zenn,x").split(",") if t.strip()]
+PUBLISH_RETRIES = {"zenn": 2, "note": 1, "x": 1}  # 公開先ごとの再試行回数
+PUBLISH_BACKOFF = 2.0  # 再試行までの待ち時間（秒、回数ごとに倍）
+# note投稿のコマンド（{path} を記事ファイル、{scripts} をこのディレクトリに置き換える）
+# 記事リポジトリではなくこのリポジトリ（package.json のある場所）で実行する
+NOTE_POST_COMMAND = os.getenv("NOTE_POST_COMMAND", "npx ts-node {scripts}/note-post.ts {path} --publish")
+NOTE_COOKIES_FILE = DATA_DIR / "note-cookies.json"  # noteのログイン状態（テナントごと）
+NOTE_TIMEOUT = 300  # note投稿1回あたりの上限秒数
+
+# ============================================================
+# まとめて下書きを作る（scripts/backfill.py、Message Batches API）
+# ============================================================
+BACKFILL_DIR = DATA_DIR / "backfill"  # バッチごとの状態（再開用）
+BACKFILL_POLL_SECONDS = float(os.getenv("ZENN_BACKFILL_POLL", "30"))  # 完了確認の最初の間隔（秒）
+BACKFILL_POLL_MAX_SECONDS = 600  # 完了確認の間隔の上限（秒、回数ごとに1.5倍）
+BACKFILL_MAX_WAIT_SECONDS = 24 * 3600  # これ以上待っても終わらなければ次回に持ち越す
+
+# ============================================================
+# トークン・所要時間の記録と予算（scripts/usage_ledger.py）
+# ============================================================
+# 1日・1か月に使うトークンの上限（入力・出力・キャッシュの合計）。0なら上限なし
+# 上限に近づくと best-of-k の本数と --backfill の件数を自動で減らす
+DAILY_TOKEN_BUDGET = int(os.getenv("ZENN_DAILY_TOKEN_BUDGET", "0"))
+MONTHLY_TOKEN_BUDGET = int(os.getenv("ZENN_MONTHLY_TOKEN_BUDGET", "0"))
+TOKENS_PER_CALL_DEFAULT = 12000  # 記録がないときの1回あたりの見込みトークン数
+USAGE_REPORT_DAYS = 30  # 集計・見込みに使う直近の日数
+# これより古い記録は1日1回捨てる（今月の予算と集計の範囲は必ず残す）
+USAGE_LEDGER_KEEP_DAYS = max(USAGE_REPORT_DAYS, 31) + 1
@@ -0,0 +1,333 @@
+"""
+常駐スケジューラ（run_daily.py --daemon）
+
+cronで毎回コールドスタートする代わりに、プロセスを常駐させて
+SDKのimport・JSONストア・HTTP接続プールを温めたまま各ジョブを回す。
+
+- publish: 毎日決まった時刻に日次パイプラインを実行
+- refresh: 一定間隔でネタストックを補充
+- metrics: 一定間隔でツイートの反応を取得
+
+各ジョブはジッター付きでスケジュールされ、停止中に取りこぼした回は
+起動直後に1回だけ実行（キャッチアップ）する。
+ローカルのUnixソケットで --status の問い合わせにメモリ上の状態から応答する。
+同じデータディレクトリで動くデーモンは1つだけ（daemon.lock を flock で取る）。
+"""
+import fcntl
+import json
+import os
+import random
+import signal
+import socket
+import threading
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Callable
+
+from config import (
+    DATA_DIR,
+    DAEMON_SOCKET,
+    DAEMON_STATE_FILE,
+    DAEMON_JITTER_SECONDS,
+    DAEMON_JOBS,
+)
+
+
+def log(message: str) -> None:
+    """ログ出力"""
+    timestamp = datetime.now().strftime("%Y-%m-%d %H:%M:%S")
+    print(f"[{timestamp}] {message}", flush=True)
+
+
+class Job:
+    """スケジュール対象のジョブ"""
+
+    def __init__(
+        self,
+        name: str,
+        func: Callable[[], Any],
+        at: str | None = None,
+        interval_minutes: int | None = None,
+        jitter_seconds: int = 0,
+    ):
+        if (at is None) == (interval_minutes is None):
+            raise ValueError(f"{name}: at か interval_minutes のどちらか一方を指定してください")
+        self.name = name
+        self.func = func
+        self.at = at
+        self.interval = timedelta(minutes=interval_minutes) if interval_minutes else None
+        self.jitter_seconds = jitter_seconds
+        self.last_run: datetime | None = None
+        self.next_run: datetime | None = None
+        self.last_error: str | None = None
+
+    def _latest_slot(self, now: datetime) -> datetime:
+        """now以前で直近の定刻（at指定のジョブ用）"""
+        hour, minute = (int(x) for x in self.at.split(":"))
+        slot = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        if slot > now:
+            slot -= timedelta(days=1)
+        return slot
+
+    def is_missed(self, now: datetime) -> bool:
+        """停止中に実行されるべき回を取りこぼしているか"""
+        if self.last_run is None:
+            # 初回起動時は、定刻ジョブは次の定刻まで待ち、間隔ジョブはすぐ実行する
+            return self.interval is not None
+        if self.interval is not None:
+            return now - self.last_run >= self.interval
+        return self.last_run < self._latest_slot(now)
+
+    def schedule_next(self, now: datetime) -> None:
+        """次回実行時刻をジッター付きで決める"""
+        if self.interval is not None:
+            base = now + self.interval
+        else:
+            base = self._latest_slot(now) + timedelta(days=1)
+        jitter = random.uniform(0, self.jitter_seconds) if self.jitter_seconds else 0
+        self.next_run = base + timedelta(seconds=jitter)
+
+    def describe(self) -> dict[str, Any]:
+        """状態を辞書で返す"""
+        return {
+            "name": self.name,
+            "last_run": self.last_run.isoformat() if self.last_run else None,
+            "next_run": self.next_run.isoformat() if self.next_run else None,
+            "last_error": self.last_error,
+        }
+
+
+class Daemon:
+    """常駐スケジューラ本体"""
+
+    def __init__(
+        self,
+        jobs: list[Job],
+        status_provider: Callable[[], dict[str, Any]],
+        socket_path: Path = DAEMON_SOCKET,
+        state_file: Path = DAEMON_STATE_FILE,
+    ):
+        self.jobs = jobs
+        self.status_provider = status_provider
+        self.socket_path = socket_path
+        self.state_file = state_file
+        self.started_at = datetime.now()
+        self.stop_event = threading.Event()
+        self.lock = threading.Lock()
+        self.snapshot: dict[str, Any] = {}
+        self.job_results: dict[str, Any] = {}
+        self.lock_fd: int | None = None
+
+    def acquire_lock(self) -> None:
+        """起動中のデーモンがいないことを確かめ、プロセスの終了まで保持するロックを取る"""
+        if self.lock_fd is not None:
+            return
+        DATA_DIR.mkdir(exist_ok=True)
+        fd = os.open(self.socket_path.with_suffix(".lock"), os.O_RDWR | os.O_CREAT, 0o600)
+        try:
+            fcntl.flock(fd, fcntl.LOCK_EX | fcntl.LOCK_NB)
+        except BlockingIOError:
+            os.close(fd)
+            raise RuntimeError(f"別のデーモンが起動中です（{self.socket_path}）") from None
+        self.lock_fd = fd
+
+    # --------------------------------------------------------
+    # 永続化（取りこぼし補完のため最終実行時刻だけ保存）
+    # --------------------------------------------------------
+    def load_state(self) -> None:
+        if not self.state_file.exists():
+            return
+        try:
+            with open(self.state_file, 'r', encoding='utf-8') as f:
+                state = json.load(f)
+        except (OSError, json.JSONDecodeError):
+            return
+        for job in self.jobs:
+            last = state.get(job.name)
+            if last:
+                job.last_run = datetime.fromisoformat(last)
+
+    def save_state(self) -> None:
+        DATA_DIR.mkdir(exist_ok=True)
+        state = {
+            job.name: job.last_run.isoformat()
+            for job in self.jobs if job.last_run
+        }
+        tmp = self.state_file.with_suffix(".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False, indent=2)
+        os.replace(tmp, self.state_file)
+
+    # --------------------------------------------------------
+    # 状態スナップショット
+    # --------------------------------------------------------
+    def refresh_snapshot(self) -> None:
+        """メモリ上の状態を更新する（ジョブ完了・ウォッチャーによるネタ補充のたびに呼ぶ）"""
+        try:
+            stock = self.status_provider()
+        except Exception as e:
+            stock = {"error": str(e)}
+        with self.lock:
+            self.snapshot = {
+                "pid": os.getpid(),
+                "started_at": self.started_at.isoformat(),
+                "stock": stock,
+                "jobs": [job.describe() for job in self.jobs],
+                "results": dict(self.job_results),
+            }
+
+    def get_snapshot(self) -> dict[str, Any]:
+        with self.lock:
+            return dict(self.snapshot)
+
+    # --------------------------------------------------------
+    # ジョブ実行
+    # --------------------------------------------------------
+    def run_job(self, job: Job) -> None:
+        log(f"▶️ ジョブ開始: {job.name}")
+        now = datetime.now()
+        try:
+            result = job.func()
+            job.last_error = None
+            self.job_results[job.name] = result
+            log(f"✅ ジョブ完了: {job.name}")
+        except Exception as e:
+            job.last_error = str(e)
+            log(f"❌ ジョブ失敗: {job.name}: {e}")
+        job.last_run = now
+        job.schedule_next(datetime.now())
+        self.save_state()
+        self.refresh_snapshot()
+
+    # --------------------------------------------------------
+    # 制御ソケット
+    # --------------------------------------------------------
+    def _handle_client(self, conn: socket.socket) -> None:
+        with conn:
+            conn.settimeout(5)
+            try:
+                command = conn.recv(1024).decode("utf-8").strip()
+            except OSError:
+                return
+            if command == "status":
+                response = {"ok": True, "status": self.get_snapshot()}
+            else:
+                response = {"ok": False, "error": f"unknown command: {command}"}
+            try:
+                # 状態に datetime・Path などが混ざっていても文字列にして返す
+                payload = json.dumps(response, ensure_ascii=False, default=str)
+            except (TypeError, ValueError) as e:
+                payload = json.dumps({"ok": False, "error": f"状態を返せません: {e}"}, ensure_ascii=False)
+            try:
+                conn.sendall(payload.encode("utf-8"))
+            except OSError:
+                pass  # 問い合わせ側が先に切断した
+
+    def serve_control_socket(self) -> socket.socket:
+        # ロックを取れたなら、残っているソケットは落ちたデーモンのもの
+        self.acquire_lock()
+        if self.socket_path.exists():
+            self.socket_path.unlink()
+        server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+        server.bind(str(self.socket_path))
+        os.chmod(self.socket_path, 0o600)
+        server.listen()
+        server.settimeout(1)
+
+        def loop() -> None:
+            while not self.stop_event.is_set():
+                try:
+                    conn, _ = server.accept()
+                except socket.timeout:
+                    continue
+                except OSError:
+                    break
+                self._handle_client(conn)
+
+        threading.Thread(target=loop, name="daemon-control", daemon=True).start()
+        return server
+
+    # --------------------------------------------------------
+    # メインループ
+    # --------------------------------------------------------
+    def run(self) -> None:
+        self.acquire_lock()
+        self.load_state()
+
+        def stop(signum, frame):
+            log(f"🛑 シグナル受信({signum})、停止します")
+            self.stop_event.set()
+
+        signal.signal(signal.SIGTERM, stop)
+        signal.signal(signal.SIGINT, stop)
+
+        now = datetime.now()
+        for job in self.jobs:
+            if job.is_missed(now):
+                log(f"⏪ 取りこぼしを検出: {job.name}")
+                job.next_run = now
+            else:
+                job.schedule_next(job.last_run or now)
+
+        self.refresh_snapshot()
+        server = self.serve_control_socket()
+        log(f"🟢 デーモン起動 (pid={os.getpid()}, socket={self.socket_path})")
+
+        try:
+            while not self.stop_event.is_set():
+                now = datetime.now()
+                for job in self.jobs:
+                    if job.next_run and job.next_run <= now:
+                        self.run_job(job)
+                next_due = min(job.next_run for job in self.jobs)
+                wait = max(0.0, (next_due - datetime.now()).total_seconds())
+                self.stop_event.wait(min(wait, 60))
+        finally:
+            server.close()
+            if self.socket_path.exists():
+                self.socket_path.unlink()
+            log("⏹️ デーモン停止")
+
+
+def build_jobs(handlers: dict[str, Callable[[], Any]]) -> list[Job]:
+    """DAEMON_JOBSの設定からジョブを組み立てる"""
+    jobs = []
+    for name, spec in DAEMON_JOBS.items():
+        if name not in handlers:
+            continue
+        jobs.append(Job(
+            name,
+            handlers[name],
+            at=spec.get("at"),
+            interval_minutes=spec.get("interval_minutes"),
+            jitter_seconds=DAEMON_JITTER_SECONDS,
+        ))
+    return jobs
+
+
+def query_daemon_status(socket_path: Path = DAEMON_SOCKET) -> dict[str, Any] | None:
+    """起動中のデーモンに状態を問い合わせる（起動していなければNone）"""
+    if not socket_path.exists():
+        return None
+    try:
+        with socket.socket(socket.AF_UNIX, socket.SOCK_STREAM) as client:
+            client.settimeout(5)
+            client.connect(str(socket_path))
+            client.sendall(b"status\n")
+            client.shutdown(socket.SHUT_WR)
+            chunks = []
+            while True:
+                chunk = client.recv(65536)
+                if not chunk:
+                    break
+                chunks.append(chunk)
+    except OSError:
+        return None
+
+    try:
+        response = json.loads(b"".join(chunks).decode("utf-8"))
+    except (UnicodeDecodeError, json.JSONDecodeError):
+        return None  # 途中で切れた・壊れた応答
+    if not isinstance(response, dict) or not response.get("ok"):
+        return None
+    return response.get("status")
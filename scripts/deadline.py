@@ -0,0 +1,103 @@
+"""
+実行期限（デッドライン）の伝播
+
+日次実行に「00:15 までに公開」のような期限を設定すると、
+contextvars で各ステージ・各API呼び出しに伝わる。
+外部呼び出しはそれぞれの上限と残り時間の短い方をタイムアウトに使い、
+期限を過ぎていれば呼び出す前に DeadlineExceeded を送出する。
+期限を設定しなくても、各呼び出しには上限のタイムアウトがかかる。
+"""
+import contextvars
+import re
+import time
+from contextlib import contextmanager
+from datetime import datetime, timedelta
+from typing import Iterator
+
+from config import PIPELINE_DEADLINE
+
+
+class DeadlineExceeded(TimeoutError):
+    """実行期限を過ぎた"""
+
+
+class Deadline:
+    """1回の実行の期限"""
+
+    def __init__(self, at: datetime):
+        self.at = at
+        # 時計の補正の影響を受けないよう、残り時間は単調時計で測る
+        self._expires = time.monotonic() + (at - datetime.now()).total_seconds()
+
+    @classmethod
+    def parse(cls, spec: str, now: datetime | None = None) -> "Deadline":
+        """"HH:MM"（前後12時間以内で最も近い時刻）または "15m" / "90s" から作る"""
+        now = now or datetime.now()
+        relative = re.fullmatch(r'(\d+)([ms])', spec.strip())
+        if relative:
+            amount = int(relative.group(1))
+            seconds = amount * 60 if relative.group(2) == "m" else amount
+            return cls(now + timedelta(seconds=seconds))
+
+        hour, minute = (int(x) for x in spec.strip().split(":"))
+        at = now.replace(hour=hour, minute=minute, second=0, microsecond=0)
+        # 23:55 開始で期限 00:15 なら翌日、00:20 開始で期限 00:15 なら過ぎている
+        if at - now > timedelta(hours=12):
+            at -= timedelta(days=1)
+        elif now - at > timedelta(hours=12):
+            at += timedelta(days=1)
+        return cls(at)
+
+    def remaining(self) -> float:
+        return self._expires - time.monotonic()
+
+    def expired(self) -> bool:
+        return self.remaining() <= 0
+
+    def timeout(self, cap: float) -> float:
+        """上限 cap と残り時間の短い方（期限切れなら DeadlineExceeded）"""
+        remaining = self.remaining()
+        if remaining <= 0:
+            raise DeadlineExceeded(f"実行期限 {self.at:%H:%M} を過ぎました")
+        return min(cap, remaining)
+
+
+def configured_deadline(spec: str = PIPELINE_DEADLINE) -> Deadline | None:
+    """設定（ZENN_DEADLINE / --deadline）から今回の実行の期限を作る"""
+    return Deadline.parse(spec) if spec else None
+
+
+_current: contextvars.ContextVar[Deadline | None] = contextvars.ContextVar("deadline", default=None)
+
+
+def current_deadline() -> Deadline | None:
+    return _current.get()
+
+
+@contextmanager
+def deadline_scope(deadline: Deadline | None) -> Iterator[Deadline | None]:
+    """この中で行う呼び出しに期限を伝える"""
+    token = _current.set(deadline)
+    try:
+        yield deadline
+    finally:
+        _current.reset(token)
+
+
+def call_timeout(cap: float) -> float:
+    """外部呼び出しに渡すタイムアウト秒数"""
+    deadline = _current.get()
+    return cap if deadline is None else deadline.timeout(cap)
+
+
+def check_deadline() -> None:
+    """期限を過ぎていれば DeadlineExceeded（長い処理の途中で呼ぶ）"""
+    deadline = _current.get()
+    if deadline is not None:
+        deadline.timeout(float("inf"))
+
+
+def has_time_for(seconds: float) -> bool:
+    """残り時間が seconds 以上あるか（期限なしなら常にTrue）"""
+    deadline = _current.get()
+    return deadline is None or deadline.remaining() >= seconds
@@ -0,0 +1,167 @@
+"""
+反応スコアの索引
+
+ツイートの反応（いいね・RT・リプライ）を、投稿したネタのタグと種類に
+結びつけて、タグ別・種類別の減衰付きスコアとして data/engagement_index.json に持つ。
+
+- 投稿時: ネタのタイトル → タグ・種類を記録する（record_topic）
+- 反応取得時: 前回からの増分だけをそのタグ・種類のスコアに足す（observe）
+
+スコアは「最終更新時刻」と一緒に持ち、読むときに半減期で減衰させるので、
+1件の計測値を取り込むコストはネタやツイートの総数によらず一定。
+ENGAGEMENT_TRACK_DAYS の間反応の増えないネタは、そのツイートの前回値と一緒に
+保存時に捨てるので、索引の大きさも投稿数に比例して伸び続けない。
+反応を計測するのも、その日数以内に投稿したツイートだけ（post_to_x.analyze_tweet_performance）。
+"""
+import json
+import math
+import os
+import time
+from pathlib import Path
+from typing import Any
+
+from config import (
+    ENGAGEMENT_INDEX_FILE,
+    ENGAGEMENT_HALF_LIFE_DAYS,
+    ENGAGEMENT_TRACK_DAYS,
+    ENGAGEMENT_WEIGHT,
+)
+from state_log import get_state_log
+
+
+def engagement_of(perf: dict[str, Any]) -> float:
+    """計測値を1つの反応量にまとめる（索引のスコアとツイートの並べ替えで共通）"""
+    return perf.get("likes", 0) + perf.get("retweets", 0) * 2 + perf.get("replies", 0)
+
+
+def engagement_index_version(path: Path = ENGAGEMENT_INDEX_FILE) -> tuple[int, int] | None:
+    """索引ファイルの版（保存のたびに変わる。まだなければ None）"""
+    try:
+        st = path.stat()
+    except FileNotFoundError:
+        return None
+    # 保存は別ファイルからの置き換えなので、inode も変わる
+    return st.st_mtime_ns, st.st_ino
+
+
+class EngagementIndex:
+    """タグ別・種類別の減衰付き反応スコア"""
+
+    def __init__(self, path: Path = ENGAGEMENT_INDEX_FILE, half_life_days: float = ENGAGEMENT_HALF_LIFE_DAYS):
+        self.path = path
+        self.half_life = half_life_days * 86400
+        # 読み込んだ（保存した）ファイルの版。ネタの並びを使い回せるかの判定に使う
+        self.version = engagement_index_version(path)
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+        else:
+            self.data = {"tags": {}, "types": {}, "topics": {}, "seen": {}}
+
+    def save(self) -> None:
+        self.prune()
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False)
+        # 置き換えても mtime・inode は変わらないので、別プロセスが続けて保存しても取り違えない
+        self.version = engagement_index_version(tmp)
+        os.replace(tmp, self.path)
+
+    # --------------------------------------------------------
+    # 減衰付きスコア
+    # --------------------------------------------------------
+    def _decayed(self, entry: dict[str, float] | None, now: float) -> float:
+        if not entry:
+            return 0.0
+        return entry["score"] * 0.5 ** ((now - entry["updated"]) / self.half_life)
+
+    def _bump(self, table: str, name: str, amount: float, now: float) -> None:
+        entry = self.data[table].get(name)
+        self.data[table][name] = {"score": self._decayed(entry, now) + amount, "updated": now}
+
+    def score(self, table: str, name: str, now: float | None = None) -> float:
+        return self._decayed(self.data[table].get(name), now or time.time())
+
+    # --------------------------------------------------------
+    # 更新
+    # --------------------------------------------------------
+    def record_topic(self, topic: dict[str, Any], now: float | None = None) -> None:
+        """投稿したネタのタグと種類を覚えておく"""
+        self.data["topics"][topic.get("title", "")] = {
+            "type": topic.get("type", ""),
+            "tags": topic.get("tags", []),
+            "active": now or time.time(),
+        }
+
+    def observe(self, perf: dict[str, Any], now: float | None = None) -> float:
+        """1件の計測値を取り込み、前回からの反応の増分を返す"""
+        now = now or time.time()
+        title = perf.get("article_title") or ""
+        topic = self.data["topics"].get(title)
+        tweet_id = str(perf.get("tweet_id", ""))
+        if topic is None or not tweet_id:
+            return 0.0
+
+        # 計測値は累計なので、前回見た値との差分だけを足す
+        total = engagement_of(perf)
+        previous = self.data["seen"].get(tweet_id)
+        if isinstance(previous, dict):
+            previous = previous["total"]
+        delta = total - (previous or 0)
+        self.data["seen"][tweet_id] = {"total": total, "title": title}
+        if delta <= 0:
+            return 0.0
+
+        topic["active"] = now
+        if topic["type"]:
+            self._bump("types", topic["type"], delta, now)
+        for tag in topic["tags"]:
+            self._bump("tags", tag, delta, now)
+        return delta
+
+    def prune(self, now: float | None = None) -> None:
+        """反応の増えなくなったネタと、そのツイートの前回値を捨てる"""
+        now = now or time.time()
+        cutoff = now - ENGAGEMENT_TRACK_DAYS * 86400
+        topics = self.data["topics"]
+        for title, topic in list(topics.items()):
+            # 期限を入れる前に記録したネタは、今から数え始める
+            if topic.setdefault("active", now) < cutoff:
+                del topics[title]
+        seen_table = self.data["seen"]
+        for tweet_id, seen in list(seen_table.items()):
+            if not isinstance(seen, dict):
+                # 旧形式（数値だけ）の前回値は、今から数えて期限が来たら捨てる
+                # （その間に計測されればネタと結びつく。それより古いツイートはもう計測しない）
+                seen = seen_table[tweet_id] = {"total": seen, "title": None, "since": now}
+            if seen["title"] in topics:
+                continue
+            if seen["title"] is None and seen["since"] >= cutoff:
+                continue
+            del seen_table[tweet_id]
+
+    # --------------------------------------------------------
+    # ネタの重み付け
+    # --------------------------------------------------------
+    def boost(self, topic: dict[str, Any], now: float | None = None) -> float:
+        """ネタの優先度に足す値（種類のスコア + タグのスコアの平均、対数で圧縮）"""
+        now = now or time.time()
+        boost = math.log1p(self.score("types", topic.get("type", ""), now))
+        tags = topic.get("tags", [])
+        if tags:
+            boost += sum(math.log1p(self.score("tags", tag, now)) for tag in tags) / len(tags)
+        return ENGAGEMENT_WEIGHT * boost
+
+    def weighted_priority(self, topic: dict[str, Any], now: float | None = None) -> float:
+        return topic.get("priority", 0) + self.boost(topic, now)
+
+
+def load_engagement_index(path: Path = ENGAGEMENT_INDEX_FILE) -> EngagementIndex:
+    """索引を開く（まだなければ投稿済みネタから作る。反応は次回の計測で累計から取り込まれる）"""
+    index = EngagementIndex(path)
+    if not path.exists():
+        for topic in get_state_log("posted_topics").items():
+            index.record_topic(topic)
+        index.save()
+    return index
@@ -3,9 +3,12 @@
 
 Anthropic APIを使用して、キャラクター「椎名しおり」として記事を生成する。
 """
+import contextvars
 import json
 import re
 import random
+import threading
+from concurrent.futures import ThreadPoolExecutor
 from datetime import datetime
 from pathlib import Path
 from typing import Any
@@ -15,12 +18,24 @@ import anthropic
 from config import (
     ANTHROPIC_API_KEY,
     ANTHROPIC_MODEL,
+    ANTHROPIC_TIMEOUT,
+    ARTICLE_LINT_RETRIES,
+    BEST_OF_K,
     CHARACTER,
     CHARACTER_PROMPT,
     ARTICLES_DIR,
+    DRAFTS_DIR,
     ZENN_TOPICS,
     DEFAULT_EMOJI,
 )
+from api_limit import api_slot
+from article_lint import StreamingLinter, ArticleValidationError
+from article_meta import META_CLOSE, META_OPEN, MetaSplitter, merge_topics, parse_article_meta
+from article_score import score_article, select_best
+from deadline import call_timeout, check_deadline
+from hedging import HedgeCancelled, call_with_policy
+from stream_sanitizer import sanitize_article
+from usage_ledger import affordable_calls, track_call, usage_scope
 
 
 # 絵文字候補
@@ -37,6 +52,8 @@ EMOJI_MAP = {
     "default": ["🤖", "💻", "🔥"],
 }
 
+ARTICLE_MAX_TOKENS = 4096
+
 
 def get_emoji_for_topic(tags: list[str]) -> str:
     """タグに応じた絵文字を選択"""
@@ -96,36 +113,187 @@ def create_article_prompt(topic: dict[str, Any]) -> str:
 - 見出し（##）から始めてください
 - 最初の見出しは「## はじめに」や「## 結論から言うと」など
 
-記事本文のみを出力してください。
+記事本文を書き終えたら、最後に次の形式でメタ情報を出力してください（本文中には書かない）。
+
+{META_OPEN}
+{{"summary": "記事の要点を{CHARACTER['nickname']}の口調で1行（60文字以内）",
+ "topics": ["claudecode", "本文の内容に合うZennのトピック（英小文字・数字のみ）を最大4つ"],
+ "tweet_hook": "X告知の1行目に置く、読みたくなる一言（30文字程度）",
+ "emoji": "記事に合う絵文字1つ"}}
+{META_CLOSE}
 """
 
 
-def generate_article(topic: dict[str, Any]) -> dict[str, Any]:
-    """Anthropic APIで記事を生成"""
+_client: anthropic.Anthropic | None = None
+
+
+def get_client() -> anthropic.Anthropic:
+    """Anthropicクライアントを取得（プロセス内で使い回して接続プールを温存）"""
+    global _client
     if not ANTHROPIC_API_KEY:
         raise ValueError("ANTHROPIC_API_KEY が設定されていません")
+    if _client is None:
+        _client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+    return _client
+
+
+def stream_article_text(
+    client: anthropic.Anthropic,
+    prompt: str,
+    model: str = ANTHROPIC_MODEL,
+    cancel: threading.Event | None = None,
+) -> tuple[str, list, dict[str, Any]]:
+    """ストリーミングで本文を受け取りながら検査する（本文, 違反, メタ情報）
+
+    壊れた出力と判定した時点でストリームを閉じ、以降の生成を打ち切る。
+    ヘッジでもう一方が先に終わった（cancel がセットされた）場合も同様。
+    本文のあとのメタ情報は検査に流さず取り分ける。
+    """
+    linter = StreamingLinter()
+    splitter = MetaSplitter()
+    with api_slot(), track_call(model) as call, client.messages.stream(
+        model=model,
+        max_tokens=ARTICLE_MAX_TOKENS,
+        messages=[
+            {"role": "user", "content": prompt}
+        ],
+        timeout=call_timeout(ANTHROPIC_TIMEOUT),
+    ) as stream:
+        call.watch(stream)
+        for text in stream.text_stream:
+            # タイムアウトは受信の間隔にしか効かないので、期限は受信のたびに確認する
+            check_deadline()
+            if cancel is not None and cancel.is_set():
+                raise HedgeCancelled()
+            linter.feed(splitter.feed(text))
+
+    linter.feed(splitter.finish())
+    content = linter.finish()
+    if linter.repairs:
+        print(f"🔧 {linter.repairs}箇所を自動修正")
+    meta = parse_article_meta(splitter.meta)
+    if not splitter.in_meta:
+        print("⚠️ メタ情報が出力されませんでした（ネタのタグと既定の告知文を使います）")
+    return content, linter.violations, meta
+
+
+def lint_article_text(text: str) -> tuple[str, list, dict[str, Any]]:
+    """生成し終えた本文を検査する（バッチで受け取った結果用）"""
+    linter = StreamingLinter()
+    splitter = MetaSplitter()
+    linter.feed(splitter.feed(text))
+    linter.feed(splitter.finish())
+    content = linter.finish()
+    if linter.repairs:
+        print(f"🔧 {linter.repairs}箇所を自動修正")
+    return content, linter.violations, parse_article_meta(splitter.meta)
+
+
+def make_draft(content: str, violations: list, meta: dict[str, Any]) -> dict[str, Any]:
+    return {
+        "content": content,
+        "violations": violations,
+        "meta": meta,
+        "score": score_article(content, violations),
+    }
+
+
+def generate_draft(client: anthropic.Anthropic, prompt: str) -> dict[str, Any]:
+    """下書きを1本生成して採点する（検査で打ち切ったら再生成）"""
+    for attempt in range(ARTICLE_LINT_RETRIES + 1):
+        try:
+            content, violations, meta = call_with_policy(
+                lambda model, cancel: stream_article_text(client, prompt, model, cancel)
+            )
+            break
+        except ArticleValidationError as e:
+            print(f"⚠️ 生成を打ち切り: {e}")
+            if attempt == ARTICLE_LINT_RETRIES:
+                raise
+
+    return make_draft(content, violations, meta)
+
+
+def archive_drafts(topic: dict[str, Any], drafts: list[dict[str, Any]]) -> None:
+    """選ばれなかった下書きを、採点の比較・調整用に保存する（自動では読み戻さない）"""
+    DRAFTS_DIR.mkdir(parents=True, exist_ok=True)
+    stamp = datetime.now().strftime("%Y%m%d%H%M%S")
+    slug = generate_slug(topic.get("title", ""))
+    for i, draft in enumerate(drafts, 1):
+        path = DRAFTS_DIR / f"{slug}-{stamp}-{i}.json"
+        with open(path, 'w', encoding='utf-8') as f:
+            json.dump({"topic": topic, **draft}, f, ensure_ascii=False, indent=2)
+
+
+def generate_best_of(
+    client: anthropic.Anthropic,
+    prompt: str,
+    topic: dict[str, Any],
+    k: int,
+) -> dict[str, Any]:
+    """k本の下書きを並列に生成し、最高スコアのものを返す"""
+    with ThreadPoolExecutor(max_workers=k) as pool:
+        # 実行期限をワーカースレッドにも引き継ぐ
+        futures = [
+            pool.submit(contextvars.copy_context().run, generate_draft, client, prompt)
+            for _ in range(k)
+        ]
+
+    drafts = []
+    errors = []
+    for future in futures:
+        try:
+            drafts.append(future.result())
+        except Exception as e:
+            errors.append(e)
+    if not drafts:
+        raise errors[0]
+
+    best = select_best(drafts)
+    for i, draft in enumerate(drafts):
+        mark = "👑" if i == best else "  "
+        print(f"   {mark} 候補{i + 1}: スコア {draft['score']['total']}")
+
+    archive_drafts(topic, [d for i, d in enumerate(drafts) if i != best])
+    return drafts[best]
 
-    client = anthropic.Anthropic(api_key=ANTHROPIC_API_KEY)
+
+def generate_article(topic: dict[str, Any], best_of: int = BEST_OF_K) -> dict[str, Any]:
+    """Anthropic APIで記事を生成"""
+    client = get_client()
 
     prompt = create_article_prompt(topic)
 
     print(f"📝 記事を生成中: {topic.get('title')}")
 
-    message = client.messages.create(
-        model=ANTHROPIC_MODEL,
-        max_tokens=4096,
-        messages=[
-            {"role": "user", "content": prompt}
-        ]
-    )
+    if best_of > 1:
+        # 予算が足りなければ下書きの本数を減らす（1本は必ず書く）
+        best_of = affordable_calls(best_of, "best-of-k", minimum=1)
+
+    with usage_scope(topic):
+        if best_of > 1:
+            draft = generate_best_of(client, prompt, topic, best_of)
+        else:
+            draft = generate_draft(client, prompt)
 
-    content = message.content[0].text
+    return build_article(topic, draft)
 
+
+def build_article(topic: dict[str, Any], draft: dict[str, Any]) -> dict[str, Any]:
+    """採用した下書きから保存・投稿用の記事情報を組み立てる"""
+    # タグ・絵文字・告知文は本文と同じリクエストで受け取ったメタ情報から決める
+    meta = draft["meta"]
+    topic_tags = topic.get("tags", ZENN_TOPICS[:3])
     return {
         "title": topic.get("title", ""),
-        "content": content,
-        "tags": topic.get("tags", ZENN_TOPICS[:3]),
-        "emoji": get_emoji_for_topic(topic.get("tags", [])),
+        "content": draft["content"],
+        "tags": merge_topics(meta["topics"], topic_tags),
+        "emoji": meta["emoji"] or get_emoji_for_topic(topic_tags),
+        # 要約・告知文はそのままXに出るので、本文と同じ基準で伏せる
+        "summary": sanitize_article(meta["summary"]),
+        "tweet_hook": sanitize_article(meta["tweet_hook"]),
+        "lint_violations": draft["violations"],
+        "score": draft["score"],
         "generated_at": datetime.now().isoformat(),
     }
 
@@ -149,10 +317,10 @@ published: {str(published).lower()}
 
 """
 
-    full_content = frontmatter + article["content"]
-
+    # 公開前に本文の社名・ローカルパスを伏せる
     with open(filepath, 'w', encoding='utf-8') as f:
-        f.write(full_content)
+        f.write(frontmatter)
+        f.write(sanitize_article(article["content"]))
 
     print(f"✅ 記事を保存: {filepath}")
     return filepath
@@ -0,0 +1,185 @@
+"""
+記事生成のヘッジとフォールバック
+
+Opus の生成時間はまれに大きく伸び、過負荷（529）が続くと日次実行ごと失敗する。
+
+- ヘッジ: 1本目が過去の所要時間の HEDGE_PERCENTILE 分位点を過ぎても終わらなければ、
+  同じリクエストをもう1本送り、先に終わった方を使う（遅い方は打ち切る）
+- フォールバック: 過負荷で OVERLOAD_FALLBACK_AFTER 回失敗したら
+  ANTHROPIC_FALLBACK_MODEL に切り替える（それまでは OVERLOAD_BACKOFF 秒から倍々に待って再試行）
+
+所要時間は呼び出し側から見た時間（1本目を送ってから結果が出るまで）を記録する。
+先に終わった方の時間だけを記録すると、遅い呼び出しほど記録に残らず閾値が下がり続ける。
+
+判断はすべてログに出す。stub_servers の遅延・529注入（ストリーム途中のエラーも）で
+動作を確認できる。
+"""
+import contextvars
+import json
+import os
+import threading
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from pathlib import Path
+from typing import Callable, TypeVar
+
+import anthropic
+
+from config import (
+    ANTHROPIC_MODEL,
+    ANTHROPIC_FALLBACK_MODEL,
+    HEDGE_ENABLED,
+    HEDGE_PERCENTILE,
+    HEDGE_MIN_SAMPLES,
+    LATENCY_HISTORY_FILE,
+    LATENCY_HISTORY_SIZE,
+    OVERLOAD_BACKOFF,
+    OVERLOAD_FALLBACK_AFTER,
+)
+from deadline import has_time_for
+
+T = TypeVar("T")
+
+# attempt(model, cancel): cancel がセットされたら途中で HedgeCancelled を送出する
+Attempt = Callable[[str, threading.Event], T]
+
+
+class HedgeCancelled(Exception):
+    """もう一方のリクエストが先に終わったので打ち切った"""
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """最近順位法による分位点"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, round(pct / 100 * len(ordered) + 0.5))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+class LatencyHistory:
+    """モデル別の直近の所要時間（秒）"""
+
+    def __init__(self, path: Path = LATENCY_HISTORY_FILE, size: int = LATENCY_HISTORY_SIZE):
+        self.path = path
+        self.size = size
+        self.lock = threading.Lock()
+        if path.exists():
+            with open(path, 'r', encoding='utf-8') as f:
+                self.data: dict[str, list[float]] = json.load(f)
+        else:
+            self.data = {}
+
+    def record(self, model: str, seconds: float) -> None:
+        with self.lock:
+            samples = self.data.setdefault(model, [])
+            samples.append(round(seconds, 3))
+            del samples[:-self.size]
+            self.path.parent.mkdir(parents=True, exist_ok=True)
+            tmp = self.path.with_suffix(".tmp")
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump(self.data, f)
+            os.replace(tmp, self.path)
+
+    def threshold(self, model: str, pct: float = HEDGE_PERCENTILE) -> float | None:
+        """ヘッジを始める経過秒数（記録が少ないうちはNone）"""
+        samples = self.data.get(model, [])
+        if len(samples) < HEDGE_MIN_SAMPLES:
+            return None
+        return percentile(samples, pct)
+
+
+_history: LatencyHistory | None = None
+
+
+def latency_history() -> LatencyHistory:
+    global _history
+    if _history is None:
+        _history = LatencyHistory()
+    return _history
+
+
+def hedged(call: Callable[[threading.Event], T], delay: float | None, label: str) -> T:
+    """call を実行し、delay 秒で終わらなければもう1本送って先に成功した方を返す"""
+    if delay is None:
+        return call(threading.Event())
+
+    cancels = [threading.Event(), threading.Event()]
+    pool = ThreadPoolExecutor(max_workers=2, thread_name_prefix="hedge")
+    try:
+        # 実行期限をワーカースレッドにも引き継ぐ
+        futures = [pool.submit(contextvars.copy_context().run, call, cancels[0])]
+        done, _ = wait(futures, timeout=delay)
+        if not done:
+            print(f"⏳ {label}: {delay:.1f}秒（p{HEDGE_PERCENTILE:g}）を過ぎたため予備リクエストを送信")
+            futures.append(pool.submit(contextvars.copy_context().run, call, cancels[1]))
+
+        pending = set(futures)
+        error: BaseException | None = None
+        while pending:
+            done, pending = wait(pending, return_when=FIRST_COMPLETED)
+            for future in done:
+                if future.exception() is None:
+                    if len(futures) > 1:
+                        winner = "予備" if futures.index(future) else "最初の"
+                        print(f"🏁 {label}: {winner}リクエストが先に完了")
+                    return future.result()
+                error = future.exception()
+                if pending:
+                    print(f"⚠️ {label}: 片方のリクエストが失敗（もう一方を待ちます）: {error}")
+        raise error
+    finally:
+        # 負けた方はストリームの受信中に打ち切る（終わるのを待たない）
+        for cancel in cancels:
+            cancel.set()
+        pool.shutdown(wait=False, cancel_futures=True)
+
+
+def is_overloaded(error: anthropic.APIStatusError) -> bool:
+    """過負荷のエラーか
+
+    529 は OverloadedError になるが、ストリームの途中で届いた overloaded_error イベントは
+    HTTP 200 の応答なのでステータスでは見分けられず、本文のエラーの種類で判断する。
+    """
+    if isinstance(error, anthropic.OverloadedError):
+        return True
+    body = error.body if isinstance(error.body, dict) else {}
+    detail = body.get("error", body)
+    return isinstance(detail, dict) and detail.get("type") == "overloaded_error"
+
+
+def call_with_policy(
+    attempt: Attempt,
+    model: str = ANTHROPIC_MODEL,
+    fallback: str = ANTHROPIC_FALLBACK_MODEL,
+) -> T:
+    """ヘッジ・過負荷時のフォールバックを挟んで attempt を呼ぶ"""
+    history = latency_history()
+    overloads = 0
+    while True:
+        delay = history.threshold(model) if HEDGE_ENABLED else None
+        start = time.perf_counter()
+        try:
+            result = hedged(lambda cancel, model=model: attempt(model, cancel), delay, model)
+        except anthropic.APITimeoutError:
+            # 打ち切られた呼び出しも、少なくともそこまでかかったものとして記録する
+            history.record(model, time.perf_counter() - start)
+            raise
+        except anthropic.APIStatusError as e:
+            if not is_overloaded(e):
+                raise
+            overloads += 1
+            backoff = OVERLOAD_BACKOFF * 2 ** (overloads - 1)
+            if overloads < OVERLOAD_FALLBACK_AFTER and has_time_for(backoff):
+                print(f"⚠️ {model} が過負荷（{overloads}回目）。{backoff:g}秒後に再試行します")
+                time.sleep(backoff)
+                continue
+            if not fallback or model == fallback:
+                print(f"❌ {model} の過負荷が{overloads}回続きました")
+                raise
+            print(f"🔀 {model} の過負荷が{overloads}回続いたため {fallback} に切り替えます")
+            model = fallback
+            overloads = 0
+        else:
+            history.record(model, time.perf_counter() - start)
+            return result
@@ -0,0 +1,191 @@
+"""
+サニタイズ済み履歴の日別キャッシュ
+
+history.jsonl は追記されていくだけなので、前回読んだ位置から先の行だけを
+サニタイズし、日付ごとのシャード（data/history_cache/<設定ハッシュ>/YYYY-MM-DD.jsonl）
+に [timestamp, project, display] の配列として追記する。
+
+キャッシュは SENSITIVE_KEYWORDS と EXCLUDED_PATH_PATTERNS のハッシュで
+ディレクトリを分けているので、伏せ字の設定を変えると自動的に作り直される。
+分析時は対象期間に含まれる日のシャードだけを読む。
+
+更新はキャッシュディレクトリの flock で直列化する（デーモンのジョブ・ウォッチャー・
+cronの実行が同時に更新しても、巻き戻しと追記が交錯しない）。読み込みはロックを取らず、
+マニフェストに記録済みのサイズまでだけを読む。
+"""
+import contextlib
+import hashlib
+import json
+import os
+import shutil
+from collections import defaultdict
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any, Iterator
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows ではプロセス間のロックはしない
+
+from config import (
+    CLAUDE_HISTORY,
+    HISTORY_CACHE_DIR,
+    HISTORY_CACHE_FLUSH_LINES,
+    SENSITIVE_KEYWORDS,
+    EXCLUDED_PATH_PATTERNS,
+)
+
+
+def redaction_hash() -> str:
+    """伏せ字設定のハッシュ（キャッシュのタグ）"""
+    config = json.dumps([SENSITIVE_KEYWORDS, EXCLUDED_PATH_PATTERNS], ensure_ascii=False)
+    return hashlib.sha256(config.encode("utf-8")).hexdigest()[:16]
+
+
+def shard_day(timestamp_ms: float) -> str:
+    """タイムスタンプ（ミリ秒）が属するローカル日付"""
+    return datetime.fromtimestamp(timestamp_ms / 1000).strftime("%Y-%m-%d")
+
+
+class HistoryCache:
+    """日別シャードの管理"""
+
+    def __init__(self, source: Path = CLAUDE_HISTORY, root: Path = HISTORY_CACHE_DIR):
+        self.source = source
+        self.root = root
+        self.dir = root / redaction_hash()
+        self.manifest_file = self.dir / "manifest.json"
+        # 作り直すときに self.dir ごと消すので、ロックファイルはその外に置く
+        self.lock_file = root / f"{self.dir.name}.lock"
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """キャッシュの更新を他のスレッド・プロセスと直列化する"""
+        self.root.mkdir(parents=True, exist_ok=True)
+        with open(self.lock_file, 'a') as lock:
+            if fcntl is not None:
+                fcntl.flock(lock.fileno(), fcntl.LOCK_EX)
+            yield
+
+    def _load_manifest(self) -> dict[str, Any]:
+        if self.manifest_file.exists():
+            with open(self.manifest_file, 'r', encoding='utf-8') as f:
+                return json.load(f)
+        return {"inode": None, "offset": 0, "shards": {}}
+
+    def _save_manifest(self, manifest: dict[str, Any]) -> None:
+        tmp = self.manifest_file.with_suffix(".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(manifest, f)
+        os.replace(tmp, self.manifest_file)
+
+    def _reset(self) -> dict[str, Any]:
+        shutil.rmtree(self.dir, ignore_errors=True)
+        self.dir.mkdir(parents=True)
+        return {"inode": None, "offset": 0, "shards": {}}
+
+    def _prune_other_configs(self) -> None:
+        """伏せ字設定が変わる前のキャッシュを消す"""
+        for path in self.root.iterdir():
+            if path.is_dir() and path != self.dir:
+                shutil.rmtree(path, ignore_errors=True)
+
+    def update(self) -> int:
+        """前回以降に追記された行をサニタイズしてシャードに追加する（追加件数を返す）"""
+        if not self.source.exists():
+            return 0
+        with self._locked():
+            return self._update_locked()
+
+    def _update_locked(self) -> int:
+        # 循環importを避けるためここで読み込む
+        from analyze_history import parse_history_line
+
+        self.dir.mkdir(parents=True, exist_ok=True)
+        self._prune_other_configs()
+
+        st = self.source.stat()
+        manifest = self._load_manifest()
+        if manifest["inode"] != st.st_ino or st.st_size < manifest["offset"]:
+            # ローテーション・切り詰め: 作り直す
+            manifest = self._reset()
+            manifest["inode"] = st.st_ino
+
+        # 前回の更新が途中で落ちていたら、マニフェストの位置まで巻き戻す
+        for day, size in manifest["shards"].items():
+            shard = self.dir / f"{day}.jsonl"
+            if shard.exists() and shard.stat().st_size > size:
+                with open(shard, 'r+b') as f:
+                    f.truncate(size)
+
+        if st.st_size == manifest["offset"]:
+            return 0
+
+        rows: dict[str, list[str]] = defaultdict(list)
+        buffered = 0
+        added = 0
+        with open(self.source, 'rb') as f:
+            f.seek(manifest["offset"])
+            offset = manifest["offset"]
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # 書き込み途中の行は次回に回す
+                offset += len(raw)
+                entry = parse_history_line(raw.decode('utf-8', errors='ignore'))
+                if entry is None:
+                    continue
+                ts = float(entry.get('timestamp', 0))
+                rows[shard_day(ts)].append(json.dumps(
+                    [ts, entry.get('project', ''), entry.get('display', '')],
+                    ensure_ascii=False,
+                ))
+                buffered += 1
+                if buffered >= HISTORY_CACHE_FLUSH_LINES:
+                    # 全件作り直しでもメモリを一定に保つため、途中で書き出す
+                    self._flush(rows, manifest, offset)
+                    added += buffered
+                    buffered = 0
+
+        self._flush(rows, manifest, offset)
+        return added + buffered
+
+    def _flush(self, rows: dict[str, list[str]], manifest: dict[str, Any], offset: int) -> None:
+        """たまった行をシャードに追記し、読んだ位置までマニフェストを進める"""
+        for day, lines in rows.items():
+            shard = self.dir / f"{day}.jsonl"
+            with open(shard, 'a', encoding='utf-8') as f:
+                f.write("\n".join(lines) + "\n")
+            manifest["shards"][day] = shard.stat().st_size
+        rows.clear()
+        manifest["offset"] = offset
+        self._save_manifest(manifest)
+
+    def window_bytes(self, cutoff_ts: float) -> int:
+        """cutoff_ts 以降を含むシャードの合計サイズ"""
+        first_day = self._first_day(cutoff_ts)
+        shards = self._load_manifest()["shards"]
+        return sum(size for day, size in shards.items() if day >= first_day)
+
+    def _first_day(self, cutoff_ts: float) -> str:
+        return (datetime.fromtimestamp(cutoff_ts / 1000) - timedelta(days=1)).strftime("%Y-%m-%d")
+
+    def iter_rows(self, cutoff_ts: float) -> Iterator[tuple[float, str, str]]:
+        """cutoff_ts（ミリ秒）以降の (timestamp, project, display) を対象日のシャードだけから読む"""
+        first_day = self._first_day(cutoff_ts)
+        manifest = self._load_manifest()
+        for day in sorted(d for d in manifest["shards"] if d >= first_day):
+            # 更新中の追記分（マニフェストに未記録）は読まない
+            remaining = manifest["shards"][day]
+            try:
+                f = open(self.dir / f"{day}.jsonl", 'rb')
+            except FileNotFoundError:
+                continue  # 読んでいる間に作り直された
+            with f:
+                for raw in f:
+                    remaining -= len(raw)
+                    if remaining < 0:
+                        break
+                    ts, project, display = json.loads(raw)
+                    if ts >= cutoff_ts:
+                        yield ts, project, display
@@ -0,0 +1,53 @@
+"""
+履歴の列指向コンテナ
+
+history.jsonl の1行は多数のキーを持つdictだが、分析で使うのは
+timestamp・project・display の3つだけ。dictのリストで持つ代わりに
+
+- timestamp: array('d')（NumPyからはコピーなしで参照できる）
+- project:   重複を除いた文字列表 + array('I') の添字
+- display:   文字列のリスト
+
+の列で保持し、メモリ使用量を抑える。
+"""
+from array import array
+from typing import Any
+
+
+class HistoryColumns:
+    """timestamp・project・display の3列だけを持つ履歴"""
+
+    __slots__ = ("timestamps", "project_ids", "projects", "displays", "_project_index")
+
+    def __init__(self):
+        self.timestamps = array('d')
+        self.project_ids = array('I')
+        self.projects: list[str] = []
+        self.displays: list[str] = []
+        self._project_index: dict[str, int] = {}
+
+    def append(self, timestamp: float, project: str, display: str) -> None:
+        project_id = self._project_index.get(project)
+        if project_id is None:
+            project_id = self._project_index[project] = len(self.projects)
+            self.projects.append(project)
+        self.timestamps.append(timestamp)
+        self.project_ids.append(project_id)
+        self.displays.append(display)
+
+    def append_entry(self, entry: dict[str, Any]) -> None:
+        """パース済みの履歴1件（dict）を追加する"""
+        self.append(
+            float(entry.get('timestamp', 0)),
+            entry.get('project', ''),
+            entry.get('display', ''),
+        )
+
+    def __len__(self) -> int:
+        return len(self.timestamps)
+
+    def timestamps_array(self):
+        """timestampをNumPy配列として参照する（コピーなし）"""
+        import numpy as np
+
+        return np.frombuffer(self.timestamps, dtype=np.float64)
@@ -0,0 +1,299 @@
+"""
+複数マシンの履歴の取り込み
+
+ローカルの ~/.claude に加えて、ZENN_HISTORY_SOURCES で指定した
+同期ディレクトリや tar / tar.gz のエクスポートから履歴を読む。
+
+- 各ソースは別スレッドでパース・サニタイズし、チャンク単位で有限長のキューに流す
+- ソース内で多少時刻が前後していても、小さなヒープで並べ直してから
+- heapq.merge で timestamp 順に k-way マージし、マシン間の重複を除く
+- 読み手が途中でやめたり、どれかのソースが失敗したりしたら、残りのスレッドも止める
+
+どのソースも全件をメモリに載せないので、ソースが増えても使用量は一定。
+"""
+import hashlib
+import heapq
+import io
+import json
+import queue
+import tarfile
+import threading
+from contextlib import contextmanager
+from pathlib import Path
+from typing import IO, Any, Iterable, Iterator
+
+from config import (
+    CLAUDE_DIR,
+    ZSH_HISTORY,
+    HISTORY_SOURCES,
+    HISTORY_CACHE_DIR,
+    HISTORY_SOURCE_CACHE_DIR,
+    HISTORY_CACHE_ENABLED,
+    HISTORY_REORDER_WINDOW,
+    HISTORY_MERGE_QUEUE,
+)
+
+Row = tuple[float, str, str]
+
+CHUNK_ROWS = 1000
+_END = object()
+
+# ソース内のファイル名（ディレクトリ直下・.claude/ 配下・tar内のどこにあってもよい）
+HISTORY_NAME = "history.jsonl"
+STATS_NAME = "stats-cache.json"
+ZSH_NAMES = (".zsh_history", "zsh_history")
+
+
+class HistorySource:
+    """1台分の履歴（ディレクトリまたは tar アーカイブ）"""
+
+    def __init__(self, root: Path, zsh_history: Path | None = None, cache_root: Path | None = None):
+        self.root = root
+        self.is_archive = root.is_file() and tarfile.is_tarfile(root)
+        self._zsh_history = zsh_history
+        self.cache_root = cache_root or HISTORY_SOURCE_CACHE_DIR / self.key
+
+    @property
+    def key(self) -> str:
+        """キャッシュのディレクトリ名"""
+        digest = hashlib.sha256(str(self.root.resolve()).encode("utf-8")).hexdigest()[:12]
+        return f"{self.root.name}-{digest}"
+
+    # --------------------------------------------------------
+    # ファイルの場所
+    # --------------------------------------------------------
+    def _find(self, names: tuple[str, ...]) -> Path | None:
+        for name in names:
+            for candidate in (self.root / name, self.root / ".claude" / name):
+                if candidate.exists():
+                    return candidate
+        return None
+
+    def _member(self, tar: tarfile.TarFile, names: tuple[str, ...]) -> tarfile.TarInfo | None:
+        for member in tar:
+            if member.isfile() and Path(member.name).name in names:
+                return member
+        return None
+
+    @contextmanager
+    def _open_text(self, names: tuple[str, ...]) -> Iterator[IO[str] | None]:
+        """ソース内のファイルをテキストとして開く（なければNone）"""
+        if not self.is_archive:
+            path = self._find(names)
+            if path is None:
+                yield None
+                return
+            with open(path, 'r', encoding='utf-8', errors='ignore') as f:
+                yield f
+            return
+
+        with tarfile.open(self.root, "r:*") as tar:
+            member = self._member(tar, names)
+            if member is None:
+                yield None
+                return
+            with io.TextIOWrapper(tar.extractfile(member), encoding="utf-8", errors="ignore") as f:
+                yield f
+
+    @property
+    def history_path(self) -> Path | None:
+        return None if self.is_archive else self._find((HISTORY_NAME,))
+
+    def signature(self) -> list[Any]:
+        """analyze() のキャッシュ判定に使う（ファイルのサイズと更新時刻）"""
+        paths = [self.root] if self.is_archive else [
+            self._find((HISTORY_NAME,)), self._find((STATS_NAME,)), self.zsh_path(),
+        ]
+        signature = []
+        for path in paths:
+            st = path.stat() if path else None
+            signature.append([st.st_size, st.st_mtime_ns] if st else None)
+        return signature
+
+    def size(self) -> int:
+        """履歴のおおよそのバイト数（メモリ予算の見積もり用）"""
+        path = self.root if self.is_archive else self.history_path
+        return path.stat().st_size if path else 0
+
+    def zsh_path(self) -> Path | None:
+        if self._zsh_history is not None:
+            return self._zsh_history if self._zsh_history.exists() else None
+        return self._find(ZSH_NAMES)
+
+    # --------------------------------------------------------
+    # 読み込み
+    # --------------------------------------------------------
+    def iter_rows(self, cutoff_ts: float) -> Iterator[Row]:
+        """cutoff_ts（ミリ秒）以降の (timestamp, project, display) をサニタイズして返す"""
+        from analyze_history import parse_history_line
+        from history_cache import HistoryCache
+
+        path = self.history_path
+        if path is not None and HISTORY_CACHE_ENABLED:
+            cache = HistoryCache(source=path, root=self.cache_root)
+            cache.update()
+            yield from cache.iter_rows(cutoff_ts)
+            return
+
+        with self._open_text((HISTORY_NAME,)) as f:
+            if f is None:
+                return
+            for line in f:
+                entry = parse_history_line(line, cutoff_ts)
+                if entry is not None:
+                    yield (
+                        float(entry.get('timestamp', 0)),
+                        entry.get('project', ''),
+                        entry.get('display', ''),
+                    )
+
+    def load_stats(self) -> dict[str, Any]:
+        with self._open_text((STATS_NAME,)) as f:
+            return json.load(f) if f is not None else {}
+
+    def zsh_lines(self) -> Iterator[str]:
+        if self._zsh_history is not None:
+            # ローカルは設定どおりのパスだけを見る
+            if self._zsh_history.exists():
+                with open(self._zsh_history, 'r', encoding='utf-8', errors='ignore') as f:
+                    yield from f
+            return
+        with self._open_text(ZSH_NAMES) as f:
+            if f is not None:
+                yield from f
+
+
+def history_sources() -> list[HistorySource]:
+    """ローカルの履歴と、設定された追加ソースの一覧"""
+    local = HistorySource(CLAUDE_DIR, zsh_history=ZSH_HISTORY, cache_root=HISTORY_CACHE_DIR)
+    return [local] + [
+        HistorySource(root) for root in HISTORY_SOURCES if root.exists()
+    ]
+
+
+# ============================================================
+# マージ
+# ============================================================
+def reorder(rows: Iterable[Row], window: int = HISTORY_REORDER_WINDOW) -> Iterator[Row]:
+    """前後のずれが window 件以内なら timestamp 順に並べ直す"""
+    heap: list[tuple[float, int, Row]] = []
+    for i, row in enumerate(rows):
+        heapq.heappush(heap, (row[0], i, row))
+        if len(heap) > window:
+            yield heapq.heappop(heap)[2]
+    while heap:
+        yield heapq.heappop(heap)[2]
+
+
+def _put(out: queue.Queue, item: Any, stop: threading.Event) -> bool:
+    """キューが空くまで待って入れる（stop がセットされたらFalse）"""
+    while not stop.is_set():
+        try:
+            out.put(item, timeout=0.1)
+            return True
+        except queue.Full:
+            continue
+    return False
+
+
+def _pump(rows: Iterator[Row], out: queue.Queue, stop: threading.Event) -> None:
+    """ソースを読み、チャンクにまとめてキューに流す（スレッドで実行）"""
+    try:
+        chunk = []
+        for row in rows:
+            chunk.append(row)
+            if len(chunk) >= CHUNK_ROWS:
+                if not _put(out, chunk, stop):
+                    return
+                chunk = []
+        if chunk and not _put(out, chunk, stop):
+            return
+        _put(out, _END, stop)
+    except Exception as e:
+        _put(out, e, stop)
+    finally:
+        rows.close()  # 途中で止めたときも開いているファイル・アーカイブを閉じる
+
+
+def _drain(q: queue.Queue) -> Iterator[Row]:
+    while True:
+        item = q.get()
+        if item is _END:
+            return
+        if isinstance(item, Exception):
+            raise item
+        yield from item
+
+
+def _discard(q: queue.Queue) -> None:
+    """読まなかったチャンクを捨てる"""
+    while True:
+        try:
+            q.get_nowait()
+        except queue.Empty:
+            return
+
+
+def dedupe_rows(rows: Iterable[Row]) -> Iterator[Row]:
+    """同じ時刻・同じ指示の重複（同期で複数ソースに入ったもの）を除く"""
+    current_ts = None
+    seen: set[str] = set()
+    for row in rows:
+        ts, _project, display = row
+        if ts != current_ts:
+            current_ts = ts
+            seen.clear()
+        if display in seen:
+            continue
+        seen.add(display)
+        yield row
+
+
+def iter_merged_rows(cutoff_ts: float, sources: list[HistorySource] | None = None) -> Iterator[Row]:
+    """全ソースの履歴を timestamp 順に1本にして返す"""
+    sources = history_sources() if sources is None else sources
+    stop = threading.Event()
+    queues = []
+    streams = []
+    for source in sources:
+        q: queue.Queue = queue.Queue(maxsize=HISTORY_MERGE_QUEUE)
+        thread = threading.Thread(
+            target=_pump,
+            args=(reorder(source.iter_rows(cutoff_ts)), q, stop),
+            name=f"history-{source.root.name}",
+            daemon=True,
+        )
+        thread.start()
+        queues.append(q)
+        streams.append(_drain(q))
+    try:
+        yield from dedupe_rows(heapq.merge(*streams, key=lambda row: row[0]))
+    finally:
+        # 読み終わる前にやめた・失敗したときに、キューの空きを待つスレッドを残さない
+        stop.set()
+        for q in queues:
+            _discard(q)
+
+
+def merge_stats(stats_list: list[dict[str, Any]]) -> dict[str, Any]:
+    """各マシンの使用統計の dailyActivity を日付ごとに合算する"""
+    merged: dict[str, Any] = {}
+    daily: dict[str, dict[str, Any]] = {}
+    seen: list[dict[str, Any]] = []
+    for stats in stats_list:
+        if not stats or stats in seen:
+            continue  # 同じファイルが複数のソースに同期されている
+        seen.append(stats)
+        for key, value in stats.items():
+            merged.setdefault(key, value)
+        for day in stats.get("dailyActivity", []):
+            date = day.get("date")
+            if date not in daily:
+                daily[date] = dict(day)
+                continue
+            for field, value in day.items():
+                if field != "date" and isinstance(value, (int, float)):
+                    daily[date][field] = daily[date].get(field, 0) + value
+    if daily:
+        merged["dailyActivity"] = [daily[d] for d in sorted(daily)]
+    return merged
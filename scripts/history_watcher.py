@@ -0,0 +1,425 @@
+"""
+Claude Code履歴のライブ取り込み
+
+CLAUDE_HISTORY・CLAUDE_STATS・CLAUDE_PROJECTS配下のセッション記録を
+Linuxのinotifyで監視し、追記された行だけをサニタイズ・特徴抽出する。
+inotifyが使えない環境（macOS等）ではポーリングで代替する。
+
+ウォッチャーが動いている間は get_live_analysis() が analyze() と同じ形の
+結果をメモリから返すので、ネタ補充のたびに履歴を全件読み直さずに済む。
+滑動窓とテーマのクラスタは analyze() と同じ保存済みの状態に差分だけを足す。
+監視するのは手元の履歴だけなので、HISTORY_SOURCES を設定しているときは
+ライブの結果は使わず analyze() に任せる。
+"""
+import ctypes
+import ctypes.util
+import heapq
+import json
+import time
+import os
+import select
+import struct
+import threading
+from collections import Counter, deque
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable
+
+from config import (
+    CLAUDE_DIR,
+    CLAUDE_HISTORY,
+    CLAUDE_STATS,
+    CLAUDE_PROJECTS,
+    ZSH_HISTORY,
+    DAYS_TO_ANALYZE,
+    HISTORY_SOURCES,
+    LIVE_INGEST_POLL_SECONDS,
+)
+from analyze_history import (
+    analyze,
+    sanitize_text,
+    parse_history_line,
+    history_cutoff_ts,
+    extract_entry_features,
+    extract_live_candidates,
+    load_stats_cache,
+    load_zsh_history,
+)
+
+try:
+    import numpy as np
+    from activity_analytics import analyze_activity
+except ImportError:
+    np = None
+
+
+# inotifyのイベントマスク（linux/inotify.h）
+IN_MODIFY = 0x00000002
+IN_CLOSE_WRITE = 0x00000008
+IN_MOVED_TO = 0x00000080
+IN_CREATE = 0x00000100
+IN_ISDIR = 0x40000000
+_WATCH_MASK = IN_MODIFY | IN_CLOSE_WRITE | IN_MOVED_TO | IN_CREATE
+_EVENT_HEADER = struct.Struct("iIII")
+
+
+class FileTail:
+    """ファイルの読み取り位置を覚えて追記分だけ返す"""
+
+    def __init__(self, path: Path):
+        self.path = path
+        self.offset = 0
+        self.inode: int | None = None
+        self.partial = b""
+
+    def read_new_lines(self) -> list[str]:
+        try:
+            st = self.path.stat()
+        except FileNotFoundError:
+            return []
+
+        # ローテーション・切り詰めを検出したら先頭から読み直す
+        if st.st_ino != self.inode or st.st_size < self.offset:
+            self.inode = st.st_ino
+            self.offset = 0
+            self.partial = b""
+        if st.st_size == self.offset:
+            return []
+
+        with open(self.path, 'rb') as f:
+            f.seek(self.offset)
+            data = f.read()
+        self.offset += len(data)
+
+        # 書きかけの行は次回に回す
+        data = self.partial + data
+        *lines, self.partial = data.split(b"\n")
+        return [line.decode('utf-8', errors='ignore') for line in lines if line.strip()]
+
+
+class _Inotify:
+    """ctypesによる最小限のinotifyラッパー"""
+
+    def __init__(self):
+        libc_name = ctypes.util.find_library("c")
+        self.libc = ctypes.CDLL(libc_name, use_errno=True)
+        self.fd = self.libc.inotify_init1(os.O_NONBLOCK | os.O_CLOEXEC)
+        if self.fd < 0:
+            raise OSError(ctypes.get_errno(), "inotify_init1 failed")
+        self.watches: dict[int, Path] = {}
+
+    def add_watch(self, directory: Path) -> None:
+        wd = self.libc.inotify_add_watch(self.fd, str(directory).encode(), _WATCH_MASK)
+        if wd < 0:
+            raise OSError(ctypes.get_errno(), f"inotify_add_watch failed: {directory}")
+        self.watches[wd] = directory
+
+    def read_events(self, timeout: float) -> list[tuple[Path, int]]:
+        """変更されたパスとマスクを返す（timeout秒まで待つ）"""
+        ready, _, _ = select.select([self.fd], [], [], timeout)
+        if not ready:
+            return []
+        try:
+            data = os.read(self.fd, 64 * 1024)
+        except BlockingIOError:
+            return []
+
+        events = []
+        pos = 0
+        while pos + _EVENT_HEADER.size <= len(data):
+            wd, mask, _cookie, length = _EVENT_HEADER.unpack_from(data, pos)
+            pos += _EVENT_HEADER.size
+            name = data[pos:pos + length].rstrip(b"\0").decode('utf-8', errors='ignore')
+            pos += length
+            directory = self.watches.get(wd)
+            if directory is not None:
+                events.append((directory / name if name else directory, mask))
+        return events
+
+    def close(self) -> None:
+        os.close(self.fd)
+
+
+class HistoryWatcher:
+    """履歴ファイルを監視し、ネタ候補の元になる集計を常に最新に保つ"""
+
+    def __init__(
+        self,
+        days: int = DAYS_TO_ANALYZE,
+        on_change: Callable[[dict[str, Any]], None] | None = None,
+        poll_seconds: float = LIVE_INGEST_POLL_SECONDS,
+    ):
+        self.days = days
+        self.on_change = on_change
+        self.poll_seconds = poll_seconds
+        self.lock = threading.Lock()
+        self.stop_event = threading.Event()
+        self.thread: threading.Thread | None = None
+        self.mode = "stopped"
+
+        self.history_tail = FileTail(CLAUDE_HISTORY)
+        self.transcript_tails: dict[Path, FileTail] = {}
+
+        # (timestamp, コマンド, パターン) を時刻順に保持し、期間外になったら差し引く
+        self.window: deque[tuple[float, list[str], list[str]]] = deque()
+        self.commands = Counter()
+        self.patterns = Counter()
+        # (timestamp, ツール名) のヒープ。記録ファイルごとに時刻が前後するので時刻順に取り出す
+        self.tool_uses: list[tuple[float, str]] = []
+        self.tools = Counter()
+        self.stats: dict[str, Any] = {}
+        self.stats_mtime: int | None = None
+        self.zsh_commands: list[str] = []
+        self.zsh_mtime: int | None = None
+        self.last_titles: set[str] = set()
+
+    # --------------------------------------------------------
+    # 取り込み
+    # --------------------------------------------------------
+    def _ingest_history(self) -> bool:
+        cutoff_ts = history_cutoff_ts(self.days)
+        changed = False
+        for line in self.history_tail.read_new_lines():
+            entry = parse_history_line(line, cutoff_ts)
+            if entry is None:
+                continue
+            commands, patterns = extract_entry_features(entry['display'])
+            self.window.append((entry.get('timestamp', 0), commands, patterns))
+            self.commands.update(commands)
+            self.patterns.update(patterns)
+            changed = True
+        return changed
+
+    def _expire(self) -> bool:
+        cutoff_ts = history_cutoff_ts(self.days)
+        changed = False
+        while self.window and self.window[0][0] < cutoff_ts:
+            _, commands, patterns = self.window.popleft()
+            self.commands.subtract(commands)
+            self.patterns.subtract(patterns)
+            changed = True
+        while self.tool_uses and self.tool_uses[0][0] < cutoff_ts:
+            _, tool = heapq.heappop(self.tool_uses)
+            self.tools[tool] -= 1
+            changed = True
+        if changed:
+            self.commands = +self.commands
+            self.patterns = +self.patterns
+            self.tools = +self.tools
+        return changed
+
+    @staticmethod
+    def _record_ts(record: dict[str, Any]) -> float:
+        """セッション記録の時刻（ミリ秒）。読めなければ取り込んだ時刻"""
+        try:
+            return datetime.fromisoformat(str(record["timestamp"])).timestamp() * 1000
+        except (KeyError, ValueError):
+            return time.time() * 1000
+
+    def _ingest_transcript(self, path: Path) -> bool:
+        tail = self.transcript_tails.get(path)
+        if tail is None:
+            tail = self.transcript_tails[path] = FileTail(path)
+        cutoff_ts = history_cutoff_ts(self.days)
+        changed = False
+        for line in tail.read_new_lines():
+            try:
+                record = json.loads(line)
+            except json.JSONDecodeError:
+                continue
+            if not isinstance(record, dict):
+                continue
+            content = (record.get("message") or {}).get("content")
+            if not isinstance(content, list):
+                continue
+            ts = self._record_ts(record)
+            if ts < cutoff_ts:
+                continue
+            for block in content:
+                if isinstance(block, dict) and block.get("type") == "tool_use":
+                    tool = sanitize_text(str(block.get("name", "")))
+                    heapq.heappush(self.tool_uses, (ts, tool))
+                    self.tools[tool] += 1
+                    changed = True
+        return changed
+
+    def _reload_stats(self) -> bool:
+        try:
+            mtime = CLAUDE_STATS.stat().st_mtime_ns
+        except FileNotFoundError:
+            return False
+        if mtime == self.stats_mtime:
+            return False
+        try:
+            self.stats = load_stats_cache()
+        except json.JSONDecodeError:
+            return False  # 書き込み途中。次のイベントで読み直す
+        self.stats_mtime = mtime
+        return True
+
+    def _reload_zsh(self) -> bool:
+        """zsh履歴が更新されていれば読み直す（監視対象外なので結果を返すたびに確認する）"""
+        try:
+            mtime = ZSH_HISTORY.stat().st_mtime_ns
+        except FileNotFoundError:
+            mtime = None
+        if mtime == self.zsh_mtime and self.zsh_mtime is not None:
+            return False
+        self.zsh_commands = load_zsh_history(self.days)
+        self.zsh_mtime = mtime
+        return True
+
+    def _scan_transcripts(self) -> bool:
+        if not CLAUDE_PROJECTS.exists():
+            return False
+        changed = False
+        for path in CLAUDE_PROJECTS.rglob("*.jsonl"):
+            changed |= self._ingest_transcript(path)
+        return changed
+
+    def _handle_path(self, path: Path) -> bool:
+        if path == CLAUDE_HISTORY:
+            return self._ingest_history()
+        if path == CLAUDE_STATS:
+            return self._reload_stats()
+        if path.suffix == ".jsonl" and CLAUDE_PROJECTS in path.parents:
+            return self._ingest_transcript(path)
+        return False
+
+    def _changed(self) -> None:
+        if self.on_change is None:
+            return
+        # 他のマシンの履歴は監視していないので、そのときは全体を分析し直す（入力が同じなら再利用される）
+        analysis = analyze() if HISTORY_SOURCES else self.get_analysis()
+        titles = {c["title"] for c in analysis["candidates"]}
+        if titles != self.last_titles:
+            self.last_titles = titles
+            self.on_change(analysis)
+
+    # --------------------------------------------------------
+    # 結果
+    # --------------------------------------------------------
+    def get_analysis(self) -> dict[str, Any]:
+        """analyze() と同じ形の結果をメモリから組み立てる"""
+        with self.lock:
+            self._expire()
+            self._reload_zsh()
+            features = {
+                "commands_used": Counter(self.commands),
+                "tools_used": Counter(self.tools),
+                "patterns": list(self.patterns.elements()),
+            }
+            stats = self.stats
+            zsh_commands = list(self.zsh_commands)
+            history_count = len(self.window)
+            timestamps = [ts for ts, _, _ in self.window] if np is not None else None
+
+        activity = None
+        if timestamps is not None:
+            activity = analyze_activity(np.array(timestamps, dtype=np.float64), stats)
+        candidates = extract_live_candidates(features, stats, zsh_commands, activity)
+        return {
+            "analyzed_at": datetime.now().isoformat(),
+            "history_count": history_count,
+            "stats_days": len(stats.get("dailyActivity", [])),
+            "candidates": candidates,
+        }
+
+    # --------------------------------------------------------
+    # 監視ループ
+    # --------------------------------------------------------
+    def _initial_load(self) -> None:
+        with self.lock:
+            self._ingest_history()
+            self._reload_stats()
+            self._scan_transcripts()
+            self._reload_zsh()
+
+    def _run_inotify(self, inotify: _Inotify) -> None:
+        while not self.stop_event.is_set():
+            events = inotify.read_events(timeout=1.0)
+            changed = False
+            with self.lock:
+                for path, mask in events:
+                    if mask & IN_ISDIR:
+                        # 新しいプロジェクトディレクトリ（その下の階層も）を監視対象に加える
+                        if path == CLAUDE_PROJECTS or CLAUDE_PROJECTS in path.parents:
+                            self._watch_tree(inotify, path)
+                            for child in path.rglob("*.jsonl"):
+                                changed |= self._ingest_transcript(child)
+                        continue
+                    changed |= self._handle_path(path)
+            if changed:
+                self._changed()
+        inotify.close()
+
+    def _run_polling(self) -> None:
+        while not self.stop_event.wait(self.poll_seconds):
+            with self.lock:
+                changed = self._ingest_history()
+                changed |= self._reload_stats()
+                changed |= self._scan_transcripts()
+            if changed:
+                self._changed()
+
+    @staticmethod
+    def _watch_tree(inotify: _Inotify, directory: Path) -> None:
+        """directory と配下の全ディレクトリを監視する（_scan_transcripts の rglob と同じ範囲）"""
+        for path in [directory, *(p for p in directory.rglob("*") if p.is_dir())]:
+            try:
+                inotify.add_watch(path)
+            except OSError:
+                if path.exists():
+                    raise  # 監視上限など。消えたディレクトリは無視する
+
+    def _open_inotify(self) -> _Inotify | None:
+        try:
+            inotify = _Inotify()
+            inotify.add_watch(CLAUDE_DIR)
+            if CLAUDE_PROJECTS.exists():
+                self._watch_tree(inotify, CLAUDE_PROJECTS)
+            return inotify
+        except (OSError, AttributeError):
+            # Linux以外、または監視上限に達した場合はポーリングにする
+            return None
+
+    def start(self) -> None:
+        self._initial_load()
+        inotify = self._open_inotify() if CLAUDE_DIR.exists() else None
+        if inotify is not None:
+            self.mode = "inotify"
+            target = lambda: self._run_inotify(inotify)
+        else:
+            self.mode = "polling"
+            target = self._run_polling
+        self.thread = threading.Thread(target=target, name="history-watcher", daemon=True)
+        self.thread.start()
+        print(f"👀 履歴のライブ取り込みを開始 ({self.mode})")
+        self._changed()
+
+    def stop(self) -> None:
+        self.stop_event.set()
+        if self.thread is not None:
+            self.thread.join(timeout=5)
+        self.mode = "stopped"
+
+
+_watcher: HistoryWatcher | None = None
+
+
+def start_watcher(
+    on_change: Callable[[dict[str, Any]], None] | None = None,
+) -> HistoryWatcher:
+    """プロセス共有のウォッチャーを起動する"""
+    global _watcher
+    if _watcher is None:
+        _watcher = HistoryWatcher(on_change=on_change)
+        _watcher.start()
+    return _watcher
+
+
+def get_live_analysis() -> dict[str, Any] | None:
+    """ウォッチャー起動中なら最新の分析結果を返す（未起動・複数マシンの履歴を使うときはNone）"""
+    if _watcher is None or _watcher.mode == "stopped" or HISTORY_SOURCES:
+        return None
+    return _watcher.get_analysis()
@@ -0,0 +1,230 @@
+#!/usr/bin/env python3
+"""
+オフライン負荷試験ハーネス
+
+Anthropic・X・noteの代替（stub_servers）とローカルのbareリポジトリを
+originにした作業リポジトリを用意し、run_daily_pipeline を連続実行する。
+スループット、ステージごとのレイテンシ分位点、失敗の内訳を報告する。
+ネットワークには一切接続しない。
+
+使い方:
+    python scripts/loadtest.py --runs 50 --latency 0.2 --error-rate 0.1
+"""
+import argparse
+import contextlib
+import io
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from collections import Counter, defaultdict
+from pathlib import Path
+from typing import Any
+
+SCRIPT_DIR = Path(__file__).parent
+REPO_DIR = SCRIPT_DIR.parent
+sys.path.insert(0, str(SCRIPT_DIR))
+
+from stub_servers import AnthropicStub, NoteStub, XStub, StubBehavior
+
+
+def percentile(values: list[float], pct: float) -> float:
+    """最近順位法による分位点"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(1, round(pct / 100 * len(ordered) + 0.5))
+    return ordered[min(rank, len(ordered)) - 1]
+
+
+def git(*args: str, cwd: Path) -> None:
+    subprocess.run(["git", *args], cwd=cwd, check=True, capture_output=True)
+
+
+def prepare_sandbox(root: Path) -> tuple[Path, Path]:
+    """bareリポジトリをoriginにした作業リポジトリと、合成した履歴を持つHOMEを作る"""
+    origin = root / "origin.git"
+    work = root / "work"
+    home = root / "home"
+
+    git("init", "--bare", "-b", "main", str(origin), cwd=root)
+    work.mkdir()
+    git("init", "-b", "main", cwd=work)
+    git("config", "user.name", "loadtest", cwd=work)
+    git("config", "user.email", "loadtest@localhost", cwd=work)
+    (work / "articles").mkdir()
+    (work / "articles" / ".keep").touch()
+    git("add", ".", cwd=work)
+    git("commit", "-m", "init", cwd=work)
+    git("remote", "add", "origin", str(origin), cwd=work)
+    git("push", "-u", "origin", "main", cwd=work)
+
+    claude_dir = home / ".claude"
+    claude_dir.mkdir(parents=True)
+    now_ms = time.time() * 1000
+    with open(claude_dir / "history.jsonl", 'w', encoding='utf-8') as f:
+        for i, display in enumerate(["/commit", "tmuxで分割", "mcp設定", "/review"] * 5):
+            f.write(json.dumps({"display": display, "timestamp": now_ms - i * 60000}) + "\n")
+
+    return work, home
+
+
+def run_load_test(
+    runs: int,
+    anthropic_behavior: StubBehavior,
+    x_behavior: StubBehavior,
+    verbose: bool = False,
+    note_behavior: StubBehavior | None = None,
+) -> dict[str, Any]:
+    """サンドボックスでパイプラインをruns回実行して結果を集計する"""
+    with tempfile.TemporaryDirectory(prefix="zenn-loadtest-") as tmp, \
+            AnthropicStub(anthropic_behavior) as anthropic_stub, \
+            XStub(x_behavior) as x_stub, \
+            NoteStub(note_behavior) as note_stub:
+        work, home = prepare_sandbox(Path(tmp))
+
+        # config の読み込み前に環境を差し替える
+        os.environ.update({
+            "HOME": str(home),
+            "ZENN_BASE_DIR": str(work),
+            "ANTHROPIC_API_KEY": "stub",
+            "ANTHROPIC_BASE_URL": anthropic_stub.url,
+            "TWITTER_API_BASE": x_stub.url,
+            "TWITTER_CONSUMER_KEY": "stub",
+            "TWITTER_CONSUMER_SECRET": "stub",
+            "TWITTER_ACCESS_TOKEN": "stub",
+            "TWITTER_ACCESS_TOKEN_SECRET": "stub",
+            "TWITTER_BEARER_TOKEN": "stub",
+            "NOTE_POST_COMMAND": note_stub.command,
+            "ZENN_PUBLISH_TARGETS": "zenn,note,x",
+        })
+        sys.path.insert(0, str(REPO_DIR))
+        from run_daily import run_daily_pipeline
+        from topic_manager import add_manual_topic
+
+        for i in range(runs):
+            add_manual_topic(f"Load test topic {i:04d}", priority=10)
+
+        results = []
+        started = time.perf_counter()
+        for i in range(runs):
+            run_start = time.perf_counter()
+            sink = contextlib.nullcontext() if verbose else contextlib.redirect_stdout(io.StringIO())
+            with sink:
+                result = run_daily_pipeline(run_id=f"loadtest-{i:04d}")
+            result["wall"] = time.perf_counter() - run_start
+            results.append(result)
+        elapsed = time.perf_counter() - started
+
+        pushed = subprocess.run(
+            ["git", "rev-list", "--count", "main"],
+            cwd=Path(tmp) / "origin.git", capture_output=True, text=True,
+        ).stdout.strip()
+
+        return summarize(results, elapsed, {
+            "anthropic_requests": len(anthropic_stub.requests),
+            "x_requests": len(x_stub.requests),
+            "tweets": len(x_stub.tweets),
+            "note_posts": len(note_stub.posts),
+            "origin_commits": int(pushed or 0) - 1,
+        })
+
+
+def summarize(results: list[dict], elapsed: float, counters: dict[str, int]) -> dict[str, Any]:
+    """実行結果をレポート用に集計する"""
+    stages = defaultdict(list)
+    for result in results:
+        for stage, seconds in result.get("timings", {}).items():
+            stages[stage].append(seconds)
+        stages["total"].append(result["wall"])
+
+    errors = Counter(error.split(" - ")[0] for r in results for error in r["errors"])
+    succeeded = sum(1 for r in results if r["success"])
+
+    return {
+        "runs": len(results),
+        "succeeded": succeeded,
+        "failed": len(results) - succeeded,
+        "elapsed_seconds": round(elapsed, 3),
+        "runs_per_minute": round(len(results) / elapsed * 60, 2) if elapsed else 0.0,
+        "errors": dict(errors),
+        "stages": {
+            stage: {
+                "count": len(values),
+                "p50": round(percentile(values, 50), 4),
+                "p95": round(percentile(values, 95), 4),
+                "p99": round(percentile(values, 99), 4),
+                "max": round(max(values), 4),
+            }
+            for stage, values in stages.items()
+        },
+        **counters,
+    }
+
+
+def print_report(report: dict[str, Any]) -> None:
+    print("📈 負荷試験結果")
+    print(f"  - 実行: {report['runs']}回（成功 {report['succeeded']} / 失敗 {report['failed']}）")
+    print(f"  - 所要時間: {report['elapsed_seconds']}秒（{report['runs_per_minute']}回/分）")
+    print(f"  - API呼び出し: Anthropic {report['anthropic_requests']}回, X {report['x_requests']}回")
+    print(
+        f"  - originへのコミット: {report['origin_commits']}件, ツイート: {report['tweets']}件, "
+        f"note: {report['note_posts']}件"
+    )
+    if report["errors"]:
+        print("  - 失敗の内訳:")
+        for error, count in report["errors"].items():
+            print(f"      {error}: {count}")
+    print("\n⏱️ ステージ別レイテンシ（秒）")
+    print(f"  {'stage':<12}{'p50':>9}{'p95':>9}{'p99':>9}{'max':>9}")
+    for stage, s in report["stages"].items():
+        print(f"  {stage:<12}{s['p50']:>9}{s['p95']:>9}{s['p99']:>9}{s['max']:>9}")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="オフライン負荷試験")
+    parser.add_argument("--runs", type=int, default=20, help="パイプラインの実行回数")
+    parser.add_argument("--latency", type=float, default=0.0, help="Anthropic代替の応答遅延（秒）")
+    parser.add_argument("--jitter", type=float, default=0.0, help="遅延に加える揺らぎの最大値（秒）")
+    parser.add_argument("--error-rate", type=float, default=0.0, help="Anthropic代替のエラー率")
+    parser.add_argument("--error-status", type=int, default=529, help="注入するエラーのHTTPステータス")
+    parser.add_argument("--rate-limit", type=float, default=None, help="Anthropic代替の毎秒リクエスト上限")
+    parser.add_argument("--x-latency", type=float, default=0.0, help="X代替の応答遅延（秒）")
+    parser.add_argument("--x-error-rate", type=float, default=0.0, help="X代替のエラー率")
+    parser.add_argument("--x-rate-limit", type=float, default=None, help="X代替の毎秒リクエスト上限")
+    parser.add_argument("--note-error-rate", type=float, default=0.0, help="note代替のエラー率")
+    parser.add_argument("--seed", type=int, default=0, help="障害注入の乱数シード")
+    parser.add_argument("--json", action="store_true", help="結果をJSONで出力")
+    parser.add_argument("--verbose", action="store_true", help="パイプラインのログを表示")
+    args = parser.parse_args()
+
+    report = run_load_test(
+        args.runs,
+        StubBehavior(
+            latency=args.latency,
+            jitter=args.jitter,
+            error_rate=args.error_rate,
+            error_status=args.error_status,
+            rate_limit=args.rate_limit,
+            seed=args.seed,
+        ),
+        StubBehavior(
+            latency=args.x_latency,
+            error_rate=args.x_error_rate,
+            rate_limit=args.x_rate_limit,
+            seed=args.seed + 1,
+        ),
+        verbose=args.verbose,
+        note_behavior=StubBehavior(error_rate=args.note_error_rate, seed=args.seed + 2),
+    )
+
+    if args.json:
+        print(json.dumps(report, ensure_ascii=False, indent=2))
+    else:
+        print_report(report)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,142 @@
+"""
+メモリプロファイルとメモリ予算
+
+--memprofile を付けて実行すると、パイプラインの各ステージと analyze_history の
+各ローダーの前後で tracemalloc のスナップショットを取り、区間ごとの
+ピーク・増減・割り当ての多い行を記録する。区間は入れ子にできる。
+
+MEMORY_BUDGET_MB を設定すると、ローダーは読み込む前に必要量を見積もり、
+予算を超えそうなら全件を保持しないストリーミング処理に切り替える。
+"""
+import os
+import resource
+import sys
+import tracemalloc
+from contextlib import contextmanager
+from typing import Any, Iterator
+
+from config import MEMORY_BUDGET_MB, MEMPROFILE_TOP_N
+
+
+# 計測用の内部処理は集計から除く
+_IGNORED_FILES = (tracemalloc.__file__, __file__, "<frozen *>", "<unknown>")
+
+
+class MemoryProfiler:
+    """区間ごとのメモリ使用量を記録する"""
+
+    def __init__(self):
+        self.enabled = False
+        self.top_n = MEMPROFILE_TOP_N
+        self.sections: list[dict[str, Any]] = []
+        self._stack: list[dict[str, Any]] = []
+        self._started = 0
+
+    def enable(self, top_n: int = MEMPROFILE_TOP_N) -> None:
+        self.enabled = True
+        self.top_n = top_n
+        if not tracemalloc.is_tracing():
+            tracemalloc.start(1)
+
+    def _snapshot(self) -> tracemalloc.Snapshot:
+        return tracemalloc.take_snapshot().filter_traces(
+            [tracemalloc.Filter(False, f) for f in _IGNORED_FILES]
+        )
+
+    def _carry_peak(self) -> None:
+        """ピークをリセットする前に、開いている区間へ現時点のピークを引き継ぐ"""
+        _, peak = tracemalloc.get_traced_memory()
+        for frame in self._stack:
+            frame["peak"] = max(frame["peak"], peak)
+
+    @contextmanager
+    def section(self, name: str) -> Iterator[None]:
+        if not self.enabled:
+            yield
+            return
+
+        self._carry_peak()
+        self._started += 1
+        frame = {
+            "order": self._started,
+            "name": name,
+            "depth": len(self._stack),
+            "peak": 0,
+            "start": tracemalloc.get_traced_memory()[0],
+            "snapshot": self._snapshot(),
+        }
+        self._stack.append(frame)
+        tracemalloc.reset_peak()
+        try:
+            yield
+        finally:
+            self._carry_peak()
+            self._stack.pop()
+            current, _ = tracemalloc.get_traced_memory()
+            stats = self._snapshot().compare_to(frame["snapshot"], "lineno")
+            top = [
+                {
+                    "site": f"{s.traceback[0].filename}:{s.traceback[0].lineno}",
+                    "size_diff": s.size_diff,
+                    "count_diff": s.count_diff,
+                }
+                for s in stats[:self.top_n]
+                if s.size_diff > 0
+            ]
+            self.sections.append({
+                "order": frame["order"],
+                "name": name,
+                "depth": frame["depth"],
+                "peak": frame["peak"],
+                "net": current - frame["start"],
+                "top": top,
+            })
+
+    def results(self) -> list[dict[str, Any]]:
+        """開始順に並べた区間の記録"""
+        return sorted(self.sections, key=lambda s: s["order"])
+
+    def report(self) -> None:
+        sections = self.results()
+        if not sections:
+            return
+        print("\n🧠 メモリプロファイル（tracemalloc）")
+        print(f"  {'区間':<32}{'ピーク(MB)':>12}{'増減(MB)':>11}")
+        for s in sections:
+            name = "  " * s["depth"] + s["name"]
+            print(f"  {name:<32}{s['peak'] / 1e6:>12.2f}{s['net'] / 1e6:>11.2f}")
+        for s in sections:
+            if not s["top"]:
+                continue
+            print(f"\n  📍 {s['name']} の割り当て上位")
+            for t in s["top"]:
+                print(f"     {t['size_diff'] / 1e6:>8.2f} MB  {t['count_diff']:>8}個  {t['site']}")
+
+
+profiler = MemoryProfiler()
+
+
+def profile_section(name: str):
+    """プロファイル有効時だけ計測する区間（無効時はほぼコストなし）"""
+    return profiler.section(name)
+
+
+# ============================================================
+# メモリ予算
+# ============================================================
+def current_rss() -> int:
+    """現在の常駐メモリ（バイト）"""
+    try:
+        with open("/proc/self/statm", 'r') as f:
+            return int(f.read().split()[1]) * os.sysconf("SC_PAGE_SIZE")
+    except (OSError, ValueError):
+        # /proc がない環境では最大値で代用する（macOSはバイト、Linuxはキロバイト）
+        maxrss = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+        return maxrss if sys.platform == "darwin" else maxrss * 1024
+
+
+def fits_budget(estimate_bytes: int) -> bool:
+    """見積もり分を追加で確保しても予算内に収まるか（予算未設定なら常にTrue）"""
+    if not MEMORY_BUDGET_MB:
+        return True
+    return current_rss() + estimate_bytes <= MEMORY_BUDGET_MB * 1_000_000
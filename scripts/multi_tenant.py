@@ -0,0 +1,167 @@
+"""
+複数アカウントの並列実行
+
+テナント設定ファイル（JSON）に書かれたアカウントごとに run_daily.py を
+別プロセスで起動し、日次パイプラインを並列に回す。
+
+- 記事リポジトリ・データディレクトリ・認証情報はテナントごとに分離
+- Claude Code履歴の分析は親プロセスで一度だけ行い、結果を読み取り専用で共有
+- Anthropic・Xへの同時呼び出し数はホスト全体で api_concurrency 件まで
+
+設定ファイルの例:
+    {
+      "max_workers": 4,
+      "api_concurrency": 2,
+      "tenants": [
+        {
+          "name": "shiori",
+          "base_dir": "~/zenn-shiori",
+          "zenn_username": "michey0495",
+          "character_file": "~/tenants/shiori.json",
+          "env": {"TWITTER_ACCESS_TOKEN": "$SHIORI_TWITTER_ACCESS_TOKEN"}
+        }
+      ]
+    }
+
+env の値が $ で始まる場合は親プロセスの環境変数から読む（秘密情報を
+設定ファイルに直接書かないため）。
+"""
+import json
+import os
+import subprocess
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from pathlib import Path
+from typing import Any
+
+from config import SCRIPTS_DIR
+from analyze_history import analyze
+from deadline import Deadline
+
+
+RUN_DAILY = SCRIPTS_DIR.parent / "run_daily.py"
+
+# テナント間で共有してはいけない認証情報（未指定なら空にして .env からの継承も防ぐ）
+TENANT_SECRETS = [
+    "TWITTER_CONSUMER_KEY",
+    "TWITTER_CONSUMER_SECRET",
+    "TWITTER_BEARER_TOKEN",
+    "TWITTER_ACCESS_TOKEN",
+    "TWITTER_ACCESS_TOKEN_SECRET",
+    "NOTE_EMAIL",
+    "NOTE_PASSWORD",
+]
+
+
+def load_tenants(path: Path) -> dict[str, Any]:
+    """テナント設定を読み込んで検証する"""
+    with open(path, 'r', encoding='utf-8') as f:
+        config = json.load(f)
+
+    names = set()
+    for tenant in config.get("tenants", []):
+        if "name" not in tenant or "base_dir" not in tenant:
+            raise ValueError(f"テナントには name と base_dir が必要です: {tenant}")
+        if tenant["name"] in names:
+            raise ValueError(f"テナント名が重複しています: {tenant['name']}")
+        names.add(tenant["name"])
+    return config
+
+
+def _resolve(value: str) -> str:
+    """$VAR 形式なら親プロセスの環境変数に置き換える"""
+    if value.startswith("$"):
+        resolved = os.getenv(value[1:])
+        if resolved is None:
+            raise ValueError(f"環境変数 {value[1:]} が設定されていません")
+        return resolved
+    return value
+
+
+def tenant_env(tenant: dict[str, Any], shared: dict[str, str]) -> dict[str, str]:
+    """テナント用のプロセス環境を組み立てる"""
+    base_dir = Path(tenant["base_dir"]).expanduser()
+    data_dir = Path(tenant.get("data_dir") or base_dir / "data").expanduser()
+
+    env = dict(os.environ)
+    env.update({key: "" for key in TENANT_SECRETS})
+    env.update(shared)
+    env["ZENN_BASE_DIR"] = str(base_dir)
+    env["ZENN_DATA_DIR"] = str(data_dir)
+    if tenant.get("zenn_username"):
+        env["ZENN_USERNAME"] = tenant["zenn_username"]
+    if tenant.get("character_file"):
+        env["ZENN_CHARACTER_FILE"] = str(Path(tenant["character_file"]).expanduser())
+    for key, value in tenant.get("env", {}).items():
+        env[key] = _resolve(str(value))
+    return env
+
+
+def run_tenant(
+    tenant: dict[str, Any],
+    env: dict[str, str],
+    deadline: Deadline | None = None,
+) -> dict[str, Any]:
+    """1テナント分の日次パイプラインを子プロセスで実行する"""
+    if deadline is not None:
+        # 並列数の上限で待った分も差し引いた残り時間を渡す
+        env = dict(env, ZENN_DEADLINE=f"{max(0, int(deadline.remaining()))}s")
+    data_dir = Path(env["ZENN_DATA_DIR"])
+    data_dir.mkdir(parents=True, exist_ok=True)
+    result_file = data_dir / "last_result.json"
+    log_file = data_dir / "run.log"
+    if result_file.exists():
+        result_file.unlink()
+
+    start = time.perf_counter()
+    with open(log_file, 'a', encoding='utf-8') as log:
+        proc = subprocess.run(
+            [sys.executable, str(RUN_DAILY), "--result-file", str(result_file)],
+            env=env,
+            stdout=log,
+            stderr=subprocess.STDOUT,
+        )
+
+    if result_file.exists():
+        with open(result_file, 'r', encoding='utf-8') as f:
+            result = json.load(f)
+    else:
+        result = {"success": False, "errors": [f"終了コード {proc.returncode}（{log_file}を確認）"]}
+    result["tenant"] = tenant["name"]
+    result["elapsed"] = round(time.perf_counter() - start, 3)
+    return result
+
+
+def run_tenants(path: Path, deadline: Deadline | None = None) -> list[dict[str, Any]]:
+    """設定ファイルの全テナントを並列実行する（deadline は各テナントに引き継ぐ）"""
+    config = load_tenants(path)
+    tenants = config.get("tenants", [])
+    if not tenants:
+        print("⚠️ テナントがありません")
+        return []
+
+    with tempfile.TemporaryDirectory(prefix="zenn-tenants-") as tmp:
+        # 全テナント共通の履歴分析は一度だけ
+        shared_analysis = Path(tmp) / "analysis.json"
+        with open(shared_analysis, 'w', encoding='utf-8') as f:
+            json.dump(analyze(), f, ensure_ascii=False)
+
+        shared = {
+            "ZENN_SHARED_ANALYSIS": str(shared_analysis),
+            "ZENN_API_SLOTS_DIR": str(Path(tmp) / "api-slots"),
+            "ZENN_API_SLOTS": str(config.get("api_concurrency", 2)),
+        }
+        envs = [tenant_env(t, shared) for t in tenants]
+
+        max_workers = config.get("max_workers", len(tenants))
+        print(f"🚀 {len(tenants)}テナントを最大{max_workers}並列で実行")
+        with ThreadPoolExecutor(max_workers=max_workers) as pool:
+            results = list(pool.map(run_tenant, tenants, envs, [deadline] * len(tenants)))
+
+    for result in results:
+        mark = "✅" if result.get("success") else "❌"
+        detail = result.get("article_title") or result.get("errors")
+        print(f"  {mark} {result['tenant']} ({result['elapsed']}秒): {detail}")
+    return results
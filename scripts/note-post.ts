@@ -13,7 +13,8 @@ dotenv.config()
 // 設定
 const NOTE_EMAIL = process.env.NOTE_EMAIL
 const NOTE_PASSWORD = process.env.NOTE_PASSWORD
-const COOKIES_PATH = path.join(__dirname, '.note-cookies.json')
+// アカウントごとに分けられるよう、保存先は環境変数で指定できる
+const COOKIES_PATH = process.env.NOTE_COOKIES_PATH || path.join(__dirname, '.note-cookies.json')
 
 interface ArticleData {
   title: string
@@ -3,10 +3,9 @@ X（Twitter）投稿スクリプト
 
 Twitter API v2を使用して記事の告知を投稿する。
 """
-import json
 import random
 import re
-from datetime import datetime
+from datetime import datetime, timedelta
 from pathlib import Path
 from typing import Any
 
@@ -19,14 +18,38 @@ from config import (
     TWITTER_ACCESS_TOKEN,
     TWITTER_ACCESS_TOKEN_SECRET,
     TWITTER_BEARER_TOKEN,
+    TWITTER_API_BASE,
+    X_API_TIMEOUT,
     TWEET_TEMPLATES,
-    DATA_DIR,
     CHARACTER,
+    ENGAGEMENT_TRACK_DAYS,
 )
+from api_limit import api_slot
+from deadline import call_timeout
+from engagement_index import engagement_of, load_engagement_index
+from state_log import get_state_log
 
 
 # Twitter API v2エンドポイント
-TWITTER_API_URL = "https://api.twitter.com/2/tweets"
+TWITTER_API_URL = f"{TWITTER_API_BASE}/2/tweets"
+
+_session: requests.Session | None = None
+
+
+class TweetError(Exception):
+    """ツイート投稿APIがエラーを返した"""
+
+    def __init__(self, message: str, status_code: int):
+        super().__init__(message)
+        self.status_code = status_code
+
+
+def get_session() -> requests.Session:
+    """HTTPセッションを取得（プロセス内で使い回して接続プールを温存）"""
+    global _session
+    if _session is None:
+        _session = requests.Session()
+    return _session
 
 
 def get_oauth1() -> OAuth1:
@@ -66,12 +89,17 @@ def truncate_text(text: str, max_length: int = 280) -> str:
 def generate_tweet_text(
     title: str,
     url: str,
-    summary: str = ""
+    summary: str = "",
+    hook: str = "",
 ) -> str:
     """ツイート文を生成"""
     # テンプレートをランダム選択
     template = random.choice(TWEET_TEMPLATES)
 
+    # 記事から作った一言があれば、定型の1行目の代わりに使う
+    if hook:
+        template = hook.replace("{", "{{").replace("}", "}}") + "\n" + template.split("\n", 1)[1]
+
     # サマリーがない場合はキャラの口癖を使う
     if not summary:
         summary = random.choice(CHARACTER["catchphrases"])
@@ -99,14 +127,19 @@ def post_tweet(text: str) -> dict[str, Any]:
 
     payload = {"text": text}
 
-    response = requests.post(
-        TWITTER_API_URL,
-        auth=auth,
-        json=payload,
-    )
+    with api_slot():
+        response = get_session().post(
+            TWITTER_API_URL,
+            auth=auth,
+            json=payload,
+            timeout=call_timeout(X_API_TIMEOUT),
+        )
 
     if response.status_code != 201:
-        raise Exception(f"ツイート投稿失敗: {response.status_code} - {response.text}")
+        raise TweetError(
+            f"ツイート投稿失敗: {response.status_code} - {response.text}",
+            response.status_code,
+        )
 
     result = response.json()
     tweet_id = result.get("data", {}).get("id")
@@ -123,15 +156,7 @@ def save_tweet_record(
     article_url: str
 ) -> None:
     """投稿記録を保存"""
-    DATA_DIR.mkdir(exist_ok=True)
-    records_file = DATA_DIR / "tweet_records.json"
-
-    records = []
-    if records_file.exists():
-        with open(records_file, 'r', encoding='utf-8') as f:
-            records = json.load(f)
-
-    records.append({
+    get_state_log("tweet_records").add({
         "article_title": article_title,
         "tweet_text": tweet_text,
         "tweet_id": tweet_id,
@@ -139,17 +164,28 @@ def save_tweet_record(
         "posted_at": datetime.now().isoformat(),
     })
 
-    with open(records_file, 'w', encoding='utf-8') as f:
-        json.dump(records, f, ensure_ascii=False, indent=2)
+
+def load_tweet_records() -> list[dict[str, Any]]:
+    """投稿記録を読み込む"""
+    return get_state_log("tweet_records").items()
+
+
+def find_tweet_record(article_url: str) -> dict[str, Any] | None:
+    """記事URLに対応する投稿記録を探す"""
+    for record in reversed(load_tweet_records()):
+        if record.get("article_url") == article_url:
+            return record
+    return None
 
 
 def post_article_announcement(
     title: str,
     url: str,
-    summary: str = ""
+    summary: str = "",
+    hook: str = "",
 ) -> dict[str, Any]:
     """記事告知ツイートを投稿（メイン関数）"""
-    tweet_text = generate_tweet_text(title, url, summary)
+    tweet_text = generate_tweet_text(title, url, summary, hook)
 
     print(f"📢 ツイート投稿中...")
     print(f"   {tweet_text[:50]}...")
@@ -175,12 +211,18 @@ def get_tweet_performance(tweet_id: str) -> dict[str, Any] | None:
         "Authorization": f"Bearer {TWITTER_BEARER_TOKEN}",
     }
 
-    url = f"https://api.twitter.com/2/tweets/{tweet_id}"
+    url = f"{TWITTER_API_URL}/{tweet_id}"
     params = {
         "tweet.fields": "public_metrics",
     }
 
-    response = requests.get(url, headers=headers, params=params)
+    with api_slot():
+        response = get_session().get(
+            url,
+            headers=headers,
+            params=params,
+            timeout=call_timeout(X_API_TIMEOUT),
+        )
 
     if response.status_code != 200:
         return None
@@ -198,13 +240,11 @@ def get_tweet_performance(tweet_id: str) -> dict[str, Any] | None:
 
 
 def analyze_tweet_performance() -> list[dict[str, Any]]:
-    """過去のツイートパフォーマンスを分析"""
-    records_file = DATA_DIR / "tweet_records.json"
-    if not records_file.exists():
-        return []
-
-    with open(records_file, 'r', encoding='utf-8') as f:
-        records = json.load(f)
+    """過去のツイートパフォーマンスを分析（ENGAGEMENT_TRACK_DAYS 以内に投稿したものだけ）"""
+    cutoff = (datetime.now() - timedelta(days=ENGAGEMENT_TRACK_DAYS)).isoformat()
+    # それより古いツイートのネタは索引から外れているので、計測しても使わない
+    records = [r for r in load_tweet_records() if r.get("posted_at", "") >= cutoff]
+    index = load_engagement_index()
 
     results = []
     for record in records:
@@ -213,13 +253,15 @@ def analyze_tweet_performance() -> list[dict[str, Any]]:
             perf = get_tweet_performance(tweet_id)
             if perf:
                 perf["article_title"] = record.get("article_title")
+                index.observe(perf)
                 results.append(perf)
 
-    # エンゲージメント順にソート
-    results.sort(
-        key=lambda x: x.get("likes", 0) + x.get("retweets", 0) * 2,
-        reverse=True
-    )
+    # 次のネタ選びで使うタグ別・種類別スコアに反映
+    if results:
+        index.save()
+
+    # エンゲージメント順にソート（索引のスコアと同じ重み）
+    results.sort(key=engagement_of, reverse=True)
 
     return results
 
@@ -0,0 +1,400 @@
+"""
+指示文のクラスタリング（NumPy）
+
+サニタイズ済みの display を文字n-gramのハッシュでベクトル化し、
+ミニバッチk-means（コサイン類似度）でテーマごとにまとめる。
+ネットワークもモデルのダウンロードも使わない。
+
+重心と各クラスタの集計（日別件数・代表例・頻出語）は data/prompt_clusters/ に保存し、
+次回は前回より新しい指示（遅れて同期された分を含む）だけを追加で学習する。
+件数の多いテーマと、直近で急に増えたテーマを記事ネタ候補にする
+（同じキーワードになったクラスタは1つのテーマにまとめる）。
+"""
+import json
+import math
+import os
+from collections import Counter
+from datetime import date, datetime, timedelta
+from pathlib import Path
+from typing import Any, Iterable, NamedTuple
+
+import numpy as np
+
+from config import (
+    CLUSTER_STATE_DIR,
+    CLUSTER_K,
+    CLUSTER_DIM,
+    CLUSTER_NGRAMS,
+    CLUSTER_BATCH,
+    CLUSTER_MAX_CHARS,
+    CLUSTER_MIN_CHARS,
+    CLUSTER_MIN_SIZE,
+    CLUSTER_COUNT_CAP,
+    DAYS_TO_ANALYZE,
+    HISTORY_SYNC_LAG_HOURS,
+)
+from window_counters import IngestedRows, extract_words
+
+
+EPOCH = date(1970, 1, 1)
+MS_PER_DAY = 86_400_000
+HASH_PRIME = np.uint64(1_000_003)
+HASH_MIX = np.uint64(0x9E3779B97F4A7C15)
+DAY_HISTORY = 28  # クラスタごとに残す日別件数の日数
+EXAMPLES_PER_CLUSTER = 3
+WORDS_PER_CLUSTER = 200
+GROWTH_DAYS = 7  # 直近この日数と、その前の同じ日数を比べる
+GROWTH_RATIO_MIN = 2.0
+
+
+class HashedBatch(NamedTuple):
+    """ハッシュした文字n-gramの疎行列（行ごとにL2正規化、rows は昇順）"""
+    size: int
+    rows: np.ndarray
+    cols: np.ndarray
+    vals: np.ndarray
+
+    def dense(self, dim: int) -> np.ndarray:
+        X = np.zeros((self.size, dim), dtype=np.float32)
+        X[self.rows, self.cols] = self.vals
+        return X
+
+
+def vectorize(texts: list[str], dim: int = CLUSTER_DIM, ngrams: tuple[int, ...] = CLUSTER_NGRAMS) -> HashedBatch:
+    """文字n-gramをハッシュした出現数ベクトル"""
+    lowered = [t[:CLUSTER_MAX_CHARS].lower() for t in texts]
+    size = len(lowered)
+    empty = np.zeros(0, dtype=np.int64)
+    if size == 0:
+        return HashedBatch(0, empty, empty, np.zeros(0, dtype=np.float32))
+
+    # 全件を区切り文字（\0）でつないだコードポイント列の上で、n-gramを一括でハッシュする
+    codes = np.frombuffer("\0".join(lowered).encode("utf-32-le"), dtype=np.uint32).astype(np.uint64)
+    row_of = np.repeat(np.arange(size), [len(t) + 1 for t in lowered])[:codes.size]
+
+    cells = [empty]
+    for n in ngrams:
+        width = codes.size - n + 1
+        if width <= 0:
+            continue
+        h = np.zeros(width, dtype=np.uint64)
+        for j in range(n):
+            h = h * HASH_PRIME + codes[j:j + width]
+        # 文をまたぐn-gramと区切り文字で終わるn-gramは使わない
+        valid = (row_of[:width] == row_of[n - 1:]) & (codes[n - 1:] != 0)
+        cols = ((h[valid] * HASH_MIX) >> np.uint64(40)) % np.uint64(dim)
+        cells.append(row_of[:width][valid] * dim + cols.astype(np.int64))
+
+    keys, counts = np.unique(np.concatenate(cells), return_counts=True)
+    rows, cols = np.divmod(keys, dim)
+    vals = np.sqrt(counts).astype(np.float32)  # 長い文で同じn-gramが繰り返されても効きすぎないように
+    norms = np.sqrt(np.bincount(rows, weights=vals * vals, minlength=size))
+    vals /= np.maximum(norms[rows], 1e-12).astype(np.float32)
+    return HashedBatch(size, rows, cols, vals)
+
+
+class PromptClusters:
+    """ミニバッチk-meansの重心と各クラスタの集計"""
+
+    def __init__(self, k: int = CLUSTER_K, dim: int = CLUSTER_DIM, state_dir: Path = CLUSTER_STATE_DIR):
+        self.k = k
+        self.dim = dim
+        self.state_dir = state_dir
+        self.centers: np.ndarray | None = None
+        self.counts = np.zeros(k, dtype=np.float64)
+        self.rows = IngestedRows()
+        self.clusters = [self._empty_cluster() for _ in range(k)]
+        self.words: Counter = Counter()  # 全体の頻出語（キーワードの特徴度の基準）
+
+    @staticmethod
+    def _empty_cluster() -> dict[str, Any]:
+        return {"days": {}, "examples": [], "words": Counter()}
+
+    # --------------------------------------------------------
+    # 保存・読み込み
+    # --------------------------------------------------------
+    def _config(self) -> dict[str, Any]:
+        return {"k": self.k, "dim": self.dim, "ngrams": list(CLUSTER_NGRAMS), "sync_lag": HISTORY_SYNC_LAG_HOURS}
+
+    @classmethod
+    def load(cls, state_dir: Path = CLUSTER_STATE_DIR) -> "PromptClusters":
+        """保存済みの状態を開く（設定が変わっていれば作り直す）"""
+        model = cls(state_dir=state_dir)
+        state_file = state_dir / "state.json"
+        centers_file = state_dir / "centers.npy"
+        if not (state_file.exists() and centers_file.exists()):
+            return model
+        with open(state_file, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get("config") != model._config():
+            return model
+
+        model.centers = np.load(centers_file)
+        model.counts = np.array(state["counts"], dtype=np.float64)
+        model.rows = IngestedRows.from_dict(state["rows"])
+        model.words = Counter(state["words"])
+        model.clusters = [
+            {"days": c["days"], "examples": c["examples"], "words": Counter(c["words"])}
+            for c in state["clusters"]
+        ]
+        return model
+
+    def save(self) -> None:
+        self.state_dir.mkdir(parents=True, exist_ok=True)
+        if self.centers is not None:
+            tmp = self.state_dir / "centers.tmp.npy"
+            np.save(tmp, self.centers)
+            os.replace(tmp, self.state_dir / "centers.npy")
+        state = {
+            "config": self._config(),
+            "counts": self.counts.tolist(),
+            "rows": self.rows.to_dict(),
+            "words": dict(self.words),
+            "clusters": [
+                {"days": c["days"], "examples": c["examples"], "words": dict(c["words"])}
+                for c in self.clusters
+            ],
+        }
+        tmp = self.state_dir / "state.tmp.json"
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, self.state_dir / "state.json")
+
+    # --------------------------------------------------------
+    # 学習
+    # --------------------------------------------------------
+    def _seed(self, X: np.ndarray) -> None:
+        """k-means++ で最初の重心を選ぶ"""
+        rng = np.random.default_rng(0)
+        chosen = [int(rng.integers(X.shape[0]))]
+        dist = 1.0 - X @ X[chosen[0]]
+        for _ in range(1, self.k):
+            weights = np.maximum(dist, 0) ** 2
+            total = weights.sum()
+            if total <= 0:
+                break
+            chosen.append(int(rng.choice(X.shape[0], p=weights / total)))
+            dist = np.minimum(dist, 1.0 - X @ X[chosen[-1]])
+        centers = X[chosen]
+        if len(chosen) < self.k:
+            # 似た指示しかない場合は、ずらした重心で埋める
+            extra = rng.normal(size=(self.k - len(chosen), self.dim)).astype(np.float32)
+            extra /= np.linalg.norm(extra, axis=1, keepdims=True)
+            centers = np.vstack([centers, extra])
+        self.centers = centers.astype(np.float32)
+
+    def similarities(self, batch: HashedBatch) -> np.ndarray:
+        """各行と各重心のコサイン類似度（size × k）"""
+        if batch.vals.size == 0:
+            return np.zeros((batch.size, self.k), dtype=np.float32)
+        contrib = np.ascontiguousarray(self.centers.T)[batch.cols] * batch.vals[:, None]  # nnz × k
+        # rows は昇順なので、行ごとの区間をまとめて足し合わせる
+        starts = np.searchsorted(batch.rows, np.arange(batch.size))
+        sims = np.add.reduceat(contrib, np.minimum(starts, batch.vals.size - 1), axis=0)
+        sims[np.bincount(batch.rows, minlength=batch.size) == 0] = 0.0
+        return sims
+
+    def partial_fit(self, batch: HashedBatch) -> tuple[np.ndarray, np.ndarray]:
+        """1バッチ分で重心を更新し、(ラベル, 重心との類似度) を返す"""
+        if self.centers is None:
+            self._seed(batch.dense(self.dim))
+
+        sims = self.similarities(batch)
+        labels = np.argmax(sims, axis=1)
+        best = sims[np.arange(batch.size), labels]
+
+        # 各クラスタの新しい点の合計と件数をまとめて求め、学習率 n/累計件数 で重心を動かす
+        sums = np.bincount(
+            labels[batch.rows] * self.dim + batch.cols,
+            weights=batch.vals,
+            minlength=self.k * self.dim,
+        ).reshape(self.k, self.dim)
+        added = np.bincount(labels, minlength=self.k).astype(np.float64)
+        hit = added > 0
+        self.counts = np.minimum(self.counts + added, CLUSTER_COUNT_CAP)
+        eta = (added[hit] / np.maximum(self.counts[hit], added[hit]))[:, None]
+        means = sums[hit] / added[hit, None]
+        self.centers[hit] = ((1 - eta) * self.centers[hit] + eta * means).astype(np.float32)
+        self.centers /= np.maximum(np.linalg.norm(self.centers, axis=1, keepdims=True), 1e-12)
+        return labels, best
+
+    def _record(self, timestamps: list[float], texts: list[str], labels: np.ndarray, sims: np.ndarray) -> None:
+        """バッチの割り当て結果をクラスタごとの集計に反映する"""
+        offset = datetime.now().astimezone().utcoffset()
+        offset_ms = offset.total_seconds() * 1000 if offset else 0.0
+        days = np.floor_divide(np.asarray(timestamps) + offset_ms, MS_PER_DAY).astype(np.int64)
+
+        for label in np.unique(labels).tolist():
+            members = np.flatnonzero(labels == label)
+            cluster = self.clusters[label]
+
+            # 日別件数
+            day_ids, day_counts = np.unique(days[members], return_counts=True)
+            for day_id, n in zip(day_ids.tolist(), day_counts.tolist()):
+                day = (EPOCH + timedelta(days=day_id)).isoformat()
+                cluster["days"][day] = cluster["days"].get(day, 0) + n
+
+            # 頻出語（クラスタごとにまとめて数える）
+            words = Counter(extract_words("\n".join(texts[i] for i in members.tolist())))
+            cluster["words"].update(words)
+            self.words.update(words)
+
+            # 代表例: 重心に近いものだけを候補にする
+            examples = cluster["examples"]
+            nearest = members[np.argsort(-sims[members])[:EXAMPLES_PER_CLUSTER]]
+            for i in nearest.tolist():
+                text = texts[i][:200]
+                if any(e[1] == text for e in examples):
+                    continue
+                examples.append([round(float(sims[i]), 4), text])
+            examples.sort(key=lambda e: -e[0])
+            del examples[EXAMPLES_PER_CLUSTER:]
+
+    def _prune(self, today: datetime) -> None:
+        """古い日別件数と頻度の低い語を捨てて、状態の大きさを一定に保つ"""
+        oldest = (today - timedelta(days=DAY_HISTORY)).strftime("%Y-%m-%d")
+        for cluster in self.clusters:
+            cluster["days"] = {d: n for d, n in cluster["days"].items() if d >= oldest}
+            cluster["words"] = Counter(dict(cluster["words"].most_common(WORDS_PER_CLUSTER)))
+        self.words = Counter(dict(self.words.most_common(WORDS_PER_CLUSTER * self.k)))
+
+    def update(self, rows: Iterable[tuple[float, str]]) -> int:
+        """まだ学習していない (timestamp, display) を追加で学習する（学習した件数を返す）"""
+        since = self.rows.since
+        learned = 0
+        batch_ts: list[float] = []
+        batch_texts: list[str] = []
+
+        def flush() -> None:
+            nonlocal learned
+            labels, sims = self.partial_fit(vectorize(batch_texts, self.dim))
+            self._record(batch_ts, batch_texts, labels, sims)
+            for ts, display in zip(batch_ts, batch_texts):
+                self.rows.mark(ts, display)
+            learned += len(batch_ts)
+            batch_ts.clear()
+            batch_texts.clear()
+
+        for ts, display in rows:
+            if len(display.strip()) < CLUSTER_MIN_CHARS or not self.rows.is_new(ts, display, since):
+                continue
+            batch_ts.append(ts)
+            batch_texts.append(display)
+            if len(batch_texts) >= CLUSTER_BATCH:
+                flush()
+        # 最初のバッチは重心の初期化に使うので、k件に満たなければ次回に回す
+        if batch_texts and (self.centers is not None or len(batch_texts) >= self.k):
+            flush()
+
+        if learned:
+            self._prune(datetime.now())
+            self.rows.prune()
+        return learned
+
+    # --------------------------------------------------------
+    # ネタ候補
+    # --------------------------------------------------------
+    def keywords(self, index: int, limit: int = 2) -> list[str]:
+        """全体と比べてこのクラスタで特に多い語"""
+        cluster_words = self.clusters[index]["words"]
+        cluster_total = sum(cluster_words.values()) or 1
+        global_total = sum(self.words.values()) or 1
+        scored = [
+            (count / cluster_total * math.log(global_total / (self.words[w] + 1)), w)
+            for w, count in cluster_words.items()
+            if count >= 3
+        ]
+        return [w for _, w in sorted(scored, reverse=True)[:limit]]
+
+    def window_counts(self, index: int, days: int, end: datetime) -> int:
+        start = (end - timedelta(days=days)).strftime("%Y-%m-%d")
+        stop = end.strftime("%Y-%m-%d")
+        return sum(n for d, n in self.clusters[index]["days"].items() if start < d <= stop)
+
+    def themes(self) -> dict[tuple[str, ...], list[int]]:
+        """キーワードの組ごとのクラスタ（順序によらず同じ組なら1つのテーマにまとめる）"""
+        themes: dict[tuple[str, ...], list[int]] = {}
+        for i in range(self.k):
+            words = self.keywords(i)
+            if words:
+                themes.setdefault(tuple(sorted(words)), []).append(i)
+        return themes
+
+    def candidates(self, days: int = DAYS_TO_ANALYZE, top: int = 3) -> list[dict[str, Any]]:
+        """件数の多いテーマと急に増えたテーマを記事ネタ候補にする
+
+        タイトルはキーワードだけで決め、件数は source に書く
+        （件数が変わるたびに別のネタとしてストックに積まれないように）。
+        """
+        now = datetime.now()
+        sized = []
+        growing = []
+        for words, members in self.themes().items():
+            recent = sum(self.window_counts(i, days, now) for i in members)
+            if recent < CLUSTER_MIN_SIZE:
+                continue
+            this_week = sum(self.window_counts(i, GROWTH_DAYS, now) for i in members)
+            last_week = sum(self.window_counts(i, GROWTH_DAYS, now - timedelta(days=GROWTH_DAYS)) for i in members)
+            sized.append((recent, words, members))
+            if this_week >= CLUSTER_MIN_SIZE and (this_week + 1) / (last_week + 1) >= GROWTH_RATIO_MIN:
+                growing.append(((this_week + 1) / (last_week + 1), this_week, last_week, words, members))
+
+        candidates = []
+        for recent, words, members in sorted(sized, reverse=True)[:top]:
+            theme = "」「".join(words)
+            candidates.append(self._candidate(
+                members,
+                type_="theme",
+                title=f"「{theme}」まわりの指示から見えたClaude Codeの使い方",
+                source=f"指示のクラスタ: 直近{days}日で{recent}件",
+                priority=6,
+            ))
+
+        for _, this_week, last_week, words, members in sorted(growing, reverse=True)[:2]:
+            theme = "」「".join(words)
+            candidates.append(self._candidate(
+                members,
+                type_="theme_trend",
+                title=f"最近急に増えた「{theme}」の指示を振り返る",
+                source=f"指示のクラスタ: 今週 {this_week}件 / 先週 {last_week}件",
+                priority=7,
+            ))
+        return candidates
+
+    def _candidate(self, members: list[int], type_: str, title: str, source: str, priority: int) -> dict[str, Any]:
+        examples = sorted(
+            (e for i in members for e in self.clusters[i]["examples"]),
+            key=lambda e: -e[0],
+        )[:EXAMPLES_PER_CLUSTER]
+        return {
+            "type": type_,
+            "title": title,
+            "description": "代表的な指示:\n" + "\n".join(f"- {text}" for _, text in examples),
+            "source": source,
+            "priority": priority,
+            "tags": ["claudecode", "workflow", "tips"],
+        }
+
+
+def cluster_candidates(rows: Iterable[tuple[float, str]]) -> list[dict[str, Any]]:
+    """新しい指示で重心を更新して保存し、テーマのネタ候補を返す"""
+    model = PromptClusters.load()
+    if model.update(rows):
+        model.save()
+    return model.candidates()
+
+
+def update_cluster_candidates(rows_since) -> list[dict[str, Any]]:
+    """前回以降の指示だけを読んで学習し、テーマのネタ候補を返す
+
+    rows_since(days) は直近 days 日の (timestamp, display) を返す関数
+    （update_window_counters と同じ読み方）。
+    """
+    model = PromptClusters.load()
+    days: float = DAYS_TO_ANALYZE
+    if model.rows.since:
+        now_ms = datetime.now().timestamp() * 1000
+        days = min(days, (now_ms - model.rows.since) / MS_PER_DAY + 1)
+    if model.update(rows_since(days)):
+        model.save()
+    return model.candidates()
@@ -0,0 +1,465 @@
+"""
+複数プラットフォームへの公開
+
+生成した記事を、有効な公開先（PUBLISH_TARGETS）に並行して送る。
+公開先はそれぞれ Publisher のプラグインで、
+
+- Zenn: 記事をコミットして git push（何度実行しても同じ結果）
+- note: note-post.ts（NOTE_POST_COMMAND）で投稿
+- X: Zenn のURLを告知（Zenn の公開が済んでから送る）
+
+公開先ごとに再試行回数を持ち、「公開先 + slug + タイトル」の冪等キーで
+data/publish_records に送信状況を記録する。公開済みのキーは二度と送らず、
+送信中に落ちたキーや、送ったあとに失敗した可能性のあるキーは、
+確認できなければ再送しない（unknown）。
+"""
+import contextvars
+import hashlib
+import os
+import re
+import shlex
+import subprocess
+import time
+from concurrent.futures import FIRST_COMPLETED, ThreadPoolExecutor, wait
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Callable, NamedTuple
+
+import requests
+from urllib3.exceptions import NewConnectionError
+
+from config import (
+    BASE_DIR,
+    GIT_TIMEOUT,
+    NOTE_COOKIES_FILE,
+    NOTE_POST_COMMAND,
+    NOTE_TIMEOUT,
+    PUBLISH_BACKOFF,
+    PUBLISH_RETRIES,
+    PUBLISH_TARGETS,
+    SCRIPTS_DIR,
+    STAGE_MIN_SECONDS,
+    ZENN_USERNAME,
+)
+from deadline import DeadlineExceeded, call_timeout, has_time_for
+from post_to_x import TweetError, find_tweet_record, post_article_announcement
+from state_log import get_state_log
+
+
+class Publication(NamedTuple):
+    """公開する記事"""
+    title: str
+    path: Path
+    slug: str
+    url: str  # Zenn上のURL（告知に使う）
+    summary: str = ""  # 記事と同時に生成した1行の要約
+    tweet_hook: str = ""  # 告知の1行目
+
+
+class PublishError(Exception):
+    """公開に失敗した
+
+    retryable: 同じ実行の中で再試行してよい（送られていないことが確実）
+    not_sent: 送られていないことが確実（省略時は retryable と同じ）。
+    Falseなら送信後に失敗した可能性があるので、確認できるまで再送しない。
+    """
+
+    def __init__(self, message: str, retryable: bool = False, not_sent: bool | None = None):
+        super().__init__(message)
+        self.retryable = retryable
+        self.not_sent = retryable if not_sent is None else not_sent
+
+
+def get_zenn_article_url(slug: str) -> str:
+    """Zenn記事のURLを生成"""
+    return f"https://zenn.dev/{ZENN_USERNAME}/articles/{slug}"
+
+
+# ============================================================
+# 公開先のプラグイン
+# ============================================================
+class Publisher:
+    """公開先の共通部分"""
+
+    name = ""
+    label = ""
+    stage = ""  # 実行ジャーナル・期限の判定で使うステージ名
+    depends_on: tuple[str, ...] = ()  # 先に公開が済んでいる必要がある公開先
+    resend_safe = False  # 送信中に落ちたとき、確認せずに送り直してよいか
+
+    @property
+    def retries(self) -> int:
+        return PUBLISH_RETRIES.get(self.name, 0)
+
+    def idempotency_key(self, item: Publication) -> str:
+        # slug は50文字で切られ、日本語だけのタイトルは日付になるので、タイトル全体も含める
+        return hashlib.sha256(f"{self.name}:{item.slug}:{item.title}".encode("utf-8")).hexdigest()[:16]
+
+    def publish(self, item: Publication) -> dict[str, Any]:
+        """公開して {"url": ..., "id": ...} を返す（失敗したら例外）"""
+        raise NotImplementedError
+
+    def recover(self, item: Publication) -> dict[str, Any] | None:
+        """送信中に落ちた前回分が公開済みか確かめる（分からなければNone）"""
+        return None
+
+
+def git_commit_article(filepath: Path, title: str) -> str | None:
+    """記事をコミットしてSHAを返す（コミット済みなら既存のSHAを返す）"""
+    try:
+        # git add
+        subprocess.run(
+            ["git", "add", str(filepath)],
+            cwd=BASE_DIR,
+            check=True,
+            capture_output=True,
+            timeout=call_timeout(GIT_TIMEOUT),
+        )
+
+        # 前回の実行でコミット済みなら何もしない
+        staged = subprocess.run(
+            ["git", "diff", "--cached", "--quiet", "--", str(filepath)],
+            cwd=BASE_DIR,
+            capture_output=True,
+            timeout=call_timeout(GIT_TIMEOUT),
+        )
+        if staged.returncode == 0:
+            sha = subprocess.run(
+                ["git", "log", "-1", "--format=%H", "--", str(filepath)],
+                cwd=BASE_DIR,
+                check=True,
+                capture_output=True,
+                text=True,
+                timeout=call_timeout(GIT_TIMEOUT),
+            ).stdout.strip()
+            if sha:
+                return sha
+
+        # git commit
+        commit_message = f"📝 新記事: {title}"
+        subprocess.run(
+            ["git", "commit", "-m", commit_message],
+            cwd=BASE_DIR,
+            check=True,
+            capture_output=True,
+            timeout=call_timeout(GIT_TIMEOUT),
+        )
+        return subprocess.run(
+            ["git", "rev-parse", "HEAD"],
+            cwd=BASE_DIR,
+            check=True,
+            capture_output=True,
+            text=True,
+            timeout=call_timeout(GIT_TIMEOUT),
+        ).stdout.strip()
+
+    except subprocess.CalledProcessError as e:
+        print(f"❌ Gitコミット失敗: {e}")
+        return None
+    except subprocess.TimeoutExpired as e:
+        print(f"⏰ Gitコミットがタイムアウト: {e}")
+        return None
+
+
+def git_push() -> bool:
+    """mainをoriginにpushしてZennに公開（何度実行しても同じ結果）"""
+    try:
+        subprocess.run(
+            ["git", "push", "origin", "main"],
+            cwd=BASE_DIR,
+            check=True,
+            capture_output=True,
+            timeout=call_timeout(GIT_TIMEOUT),
+        )
+        return True
+
+    except subprocess.CalledProcessError as e:
+        print(f"❌ Git push失敗: {e}")
+        return False
+    except subprocess.TimeoutExpired as e:
+        print(f"⏰ Git pushがタイムアウト: {e}")
+        return False
+
+
+class ZennPublisher(Publisher):
+    name = "zenn"
+    label = "Zenn"
+    stage = "push"
+    resend_safe = True  # コミット済みなら再コミットせず、pushは冪等
+
+    def publish(self, item: Publication) -> dict[str, Any]:
+        sha = git_commit_article(item.path, item.title)
+        if not sha:
+            raise PublishError("Gitコミット失敗", retryable=True)
+        if not git_push():
+            raise PublishError("Git push失敗", retryable=True)
+        print(f"✅ Git push完了: {item.path.name}")
+        return {"url": item.url, "id": sha}
+
+
+class NotePublisher(Publisher):
+    name = "note"
+    label = "note"
+    stage = "note"
+
+    def publish(self, item: Publication) -> dict[str, Any]:
+        command = [
+            arg.replace("{path}", str(item.path.resolve())).replace("{scripts}", str(SCRIPTS_DIR))
+            for arg in shlex.split(NOTE_POST_COMMAND)
+        ]
+        try:
+            proc = subprocess.run(
+                command,
+                # note-post.ts の依存（node_modules）はこのリポジトリにある
+                cwd=SCRIPTS_DIR.parent,
+                # ログイン状態はテナントごとのデータディレクトリに置く
+                env={**os.environ, "NOTE_COOKIES_PATH": str(NOTE_COOKIES_FILE)},
+                capture_output=True,
+                text=True,
+                timeout=call_timeout(NOTE_TIMEOUT),
+            )
+        except subprocess.TimeoutExpired as e:
+            # 投稿の途中で打ち切ったかもしれない
+            raise PublishError(f"タイムアウト: {e}", not_sent=False) from e
+
+        match = re.search(r'^URL:\s*(\S+)', proc.stdout, re.MULTILINE)
+        if proc.returncode != 0 or not match:
+            lines = (proc.stderr.strip() or proc.stdout.strip()).splitlines()
+            detail = lines[-1] if lines else f"終了コード {proc.returncode}"
+            # 終了コード1はログイン失敗など投稿前の終了なので再試行できる。
+            # 0でURLがない（投稿中の例外を握りつぶした）ときや異常終了は、投稿されたか分からない
+            raise PublishError(detail, retryable=proc.returncode == 1)
+        url = match.group(1)
+        print(f"✅ note投稿完了: {url}")
+        return {"url": url, "id": url.rstrip("/").rsplit("/", 1)[-1]}
+
+
+class XPublisher(Publisher):
+    name = "x"
+    label = "X"
+    stage = "tweet"
+    depends_on = ("zenn",)
+
+    def publish(self, item: Publication) -> dict[str, Any]:
+        try:
+            tweet = post_article_announcement(
+                title=item.title,
+                url=item.url,
+                summary=item.summary,
+                hook=item.tweet_hook,
+            )
+        except TweetError as e:
+            # レート制限なら投稿されていないので、待ってから送り直せる。
+            # ほかの4xxは受け付けられていない。5xxは投稿されたか分からない
+            raise PublishError(
+                str(e),
+                retryable=e.status_code == 429,
+                not_sent=400 <= e.status_code < 500,
+            ) from e
+        except ValueError as e:
+            # 認証情報がない。リクエストは送っていない
+            raise PublishError(str(e), not_sent=True) from e
+        except requests.ConnectTimeout as e:
+            raise PublishError(f"X API に接続できません: {e}", retryable=True) from e
+        except requests.ConnectionError as e:
+            # 接続を張れなかったなら送られていない。接続後に切れたときは投稿されたか分からない
+            reason = getattr(e.args[0], "reason", None) if e.args else None
+            if isinstance(reason, NewConnectionError):
+                raise PublishError(f"X API に接続できません: {e}", retryable=True) from e
+            raise
+        return {"url": tweet["tweet_url"], "id": tweet["tweet_id"]}
+
+    def recover(self, item: Publication) -> dict[str, Any] | None:
+        record = find_tweet_record(item.url)
+        if record is None:
+            return None
+        return {"url": f"https://twitter.com/i/status/{record['tweet_id']}", "id": record["tweet_id"]}
+
+
+PUBLISHERS: dict[str, type[Publisher]] = {
+    "zenn": ZennPublisher,
+    "note": NotePublisher,
+    "x": XPublisher,
+}
+
+
+def enabled_publishers(targets: list[str] = PUBLISH_TARGETS) -> list[Publisher]:
+    publishers = []
+    for name in targets:
+        if name not in PUBLISHERS:
+            print(f"⚠️ 不明な公開先を無視します: {name}")
+            continue
+        publishers.append(PUBLISHERS[name]())
+    return publishers
+
+
+# ============================================================
+# 送信記録（冪等キーごと）
+# ============================================================
+def _records():
+    return get_state_log("publish_records", key="key")
+
+
+def find_publish_record(key: str) -> dict[str, Any] | None:
+    for record in _records().items():
+        if record.get("key") == key:
+            return record
+    return None
+
+
+def _save_record(record: dict[str, Any]) -> None:
+    _records().add({**record, "updated_at": datetime.now().isoformat()})
+
+
+def _remove_record(key: str) -> None:
+    _records().remove(key)
+
+
+# ============================================================
+# 公開
+# ============================================================
+def publish_one(publisher: Publisher, item: Publication) -> dict[str, Any]:
+    """1つの公開先に送る（公開済み・送信状態不明なら送らない）
+
+    status は published / failed / unknown / deferred（期限のため次回に回した）。
+    """
+    label = publisher.label
+    key = publisher.idempotency_key(item)
+    outcome: dict[str, Any] = {
+        "target": publisher.name,
+        "key": key,
+        "status": "failed",
+        "url": None,
+        "id": None,
+        "attempts": 0,
+        "error": None,
+    }
+    base = {"key": key, "target": publisher.name, "slug": item.slug}
+
+    record = find_publish_record(key)
+    if record and record["status"] == "published":
+        print(f"♻️ {label}: 公開済みのため送信しません（{record.get('url')}）")
+        return {**outcome, "status": "published", "url": record.get("url"), "id": record.get("id"), "reused": True}
+    if record and not publisher.resend_safe:
+        recovered = publisher.recover(item)
+        if recovered:
+            _save_record({**base, "status": "published", **recovered})
+            return {**outcome, "status": "published", **recovered, "reused": True}
+        print(f"⚠️ {label}: 前回の送信が完了したか不明なため、再送しません")
+        _save_record({**base, "status": "unknown"})
+        return {**outcome, "status": "unknown", "error": f"{label}投稿状態不明（手動確認が必要）"}
+
+    if not has_time_for(STAGE_MIN_SECONDS.get(publisher.stage, 0)):
+        print(f"⏰ 実行期限が近いため {label} への公開は次回の実行で行います")
+        return {**outcome, "status": "deferred"}
+
+    _save_record({**base, "status": "sending"})
+    for attempt in range(publisher.retries + 1):
+        outcome["attempts"] = attempt + 1
+        try:
+            published = publisher.publish(item)
+        except DeadlineExceeded:
+            # 送信前に期限切れになったので、次回の実行で送る
+            print(f"⏰ 実行期限を過ぎたため {label} への公開は次回の実行で行います")
+            _remove_record(key)
+            return {**outcome, "status": "deferred"}
+        except Exception as e:
+            outcome["error"] = str(e)
+            error = e
+            delay = PUBLISH_BACKOFF * 2 ** attempt
+            retryable = isinstance(e, PublishError) and e.retryable
+            if retryable and attempt < publisher.retries and has_time_for(delay):
+                print(f"🔁 {label}: {e}（{delay:g}秒後に再試行 {attempt + 1}/{publisher.retries}）")
+                time.sleep(delay)
+                continue
+            break
+        else:
+            _save_record({**base, "status": "published", **published})
+            return {**outcome, "status": "published", "error": None, **published}
+
+    print(f"⚠️ {label}: 公開失敗: {outcome['error']}")
+    if publisher.resend_safe or (isinstance(error, PublishError) and error.not_sent):
+        # 送られなかったことが確実なので、次回はやり直してよい
+        _remove_record(key)
+        return outcome
+
+    # 送ったあとに失敗した可能性がある（5xx・応答待ちのタイムアウトなど）
+    recovered = publisher.recover(item)
+    if recovered:
+        _save_record({**base, "status": "published", **recovered})
+        return {**outcome, "status": "published", "error": None, **recovered}
+    print(f"⚠️ {label}: 送信が完了したか不明なため、再送しません")
+    _save_record({**base, "status": "unknown"})
+    return {**outcome, "status": "unknown", "error": f"{label}投稿状態不明（手動確認が必要）"}
+
+
+def _timed_publish(publisher: Publisher, item: Publication) -> dict[str, Any]:
+    start = time.perf_counter()
+    outcome = publish_one(publisher, item)
+    outcome["seconds"] = round(time.perf_counter() - start, 4)
+    return outcome
+
+
+def publish_all(
+    item: Publication,
+    publishers: list[Publisher] | None = None,
+    on_result: Callable[[Publisher, dict[str, Any]], None] | None = None,
+) -> dict[str, dict[str, Any]]:
+    """公開先すべてに並行して送り、公開先ごとの結果を返す
+
+    depends_on の公開先がこの呼び出しに含まれていれば、その公開が済んでから送る
+    （失敗したら送らずに skipped とする）。depends_on の公開先が PUBLISH_TARGETS に
+    なければ公開されないので、送らずに skipped とする。設定を直すまで結果が変わらない
+    skipped（公開先にない・依存関係の循環）には final=True を付ける。
+    on_result は結果が出た順に呼ばれる。
+    """
+    publishers = enabled_publishers() if publishers is None else publishers
+    by_name = {p.name: p for p in publishers}
+    pending = dict(by_name)
+    running: dict[Any, str] = {}
+    results: dict[str, dict[str, Any]] = {}
+
+    def finish(name: str, outcome: dict[str, Any]) -> None:
+        results[name] = outcome
+        if on_result is not None:
+            on_result(by_name[name], outcome)
+
+    with ThreadPoolExecutor(max_workers=max(len(publishers), 1), thread_name_prefix="publish") as pool:
+        while pending or running:
+            for name, publisher in list(pending.items()):
+                waiting = [d for d in publisher.depends_on if d in pending or d in running.values()]
+                if waiting:
+                    continue
+                del pending[name]
+                # 前回の実行で公開済みの依存先はこの呼び出しに含まれない
+                missing = [d for d in publisher.depends_on if d not in by_name and d not in PUBLISH_TARGETS]
+                if missing:
+                    print(f"⏭️ {publisher.label}: {missing[0]} が公開先にないため送りません")
+                    finish(name, {
+                        "target": name,
+                        "status": "skipped",
+                        "error": f"{missing[0]} が公開先にありません",
+                        "final": True,
+                    })
+                    continue
+                failed = [d for d in publisher.depends_on if d in results and results[d]["status"] != "published"]
+                if failed:
+                    print(f"⏭️ {publisher.label}: {by_name[failed[0]].label} が未公開のため送りません")
+                    finish(name, {"target": name, "status": "skipped", "error": f"{failed[0]} が未公開"})
+                    continue
+                # 実行期限をワーカースレッドにも引き継ぐ
+                future = pool.submit(contextvars.copy_context().run, _timed_publish, publisher, item)
+                running[future] = name
+
+            if not running:
+                # 依存関係が循環している
+                for name in list(pending):
+                    finish(name, {"target": name, "status": "skipped", "error": "依存関係が循環しています", "final": True})
+                pending.clear()
+                break
+
+            done, _ = wait(running, return_when=FIRST_COMPLETED)
+            for future in done:
+                finish(running.pop(future), future.result())
+
+    return results
@@ -0,0 +1,156 @@
+"""
+日次パイプラインの実行ジャーナル
+
+1回の実行で完了したステージとその出力（ネタ、記事パス、コミットSHA、
+ツイートID）を data/runs/<run_id>.json に記録する。
+途中で失敗したら、再実行時は最初の未完了ステージから再開するので、
+記事生成（課金）やツイート（公開）を繰り返さない。
+
+再開するのは RESUME_MAX_AGE_DAYS 日以内に始まり、試行が RESUME_MAX_ATTEMPTS 回
+未満の実行だけ。それ以外は "abandoned" として打ち切る。
+前の日の実行で記事の生成まで済んでいないものも打ち切る（課金・公開が残っていないので、
+ネタは今日の実行が選び直す）。
+"""
+import json
+import os
+from datetime import datetime, timedelta
+from pathlib import Path
+from typing import Any
+
+from config import RUNS_DIR, RESUME_MAX_AGE_DAYS, RESUME_MAX_ATTEMPTS
+
+# これらの状態の実行は再開しない
+FINISHED_STATUSES = ("complete", "skipped", "abandoned")
+
+
+class RunJournal:
+    """1回分の実行記録"""
+
+    def __init__(self, run_id: str, runs_dir: Path = RUNS_DIR):
+        self.run_id = run_id
+        self.path = runs_dir / f"{run_id}.json"
+        if self.path.exists():
+            with open(self.path, 'r', encoding='utf-8') as f:
+                self.data = json.load(f)
+        else:
+            self.data = {
+                "run_id": run_id,
+                "started_at": datetime.now().isoformat(),
+                "status": "running",
+                "stages": {},
+            }
+
+    @property
+    def status(self) -> str:
+        return self.data["status"]
+
+    @property
+    def resumed(self) -> bool:
+        return bool(self.data["stages"])
+
+    @property
+    def attempts(self) -> int:
+        return self.data.get("attempts", 0)
+
+    def start_attempt(self) -> None:
+        self.data["attempts"] = self.attempts + 1
+        self.data["status"] = "running"
+        self.save()
+
+    def save(self) -> None:
+        """途中で落ちても壊れないよう一時ファイル経由で書き込む"""
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(self.data, f, ensure_ascii=False, indent=2)
+            f.flush()
+            os.fsync(f.fileno())
+        os.replace(tmp, self.path)
+
+    def stage(self, name: str) -> dict[str, Any] | None:
+        """ステージの記録（未着手ならNone）"""
+        return self.data["stages"].get(name)
+
+    def is_done(self, name: str) -> bool:
+        stage = self.stage(name)
+        return bool(stage and stage.get("status") == "done")
+
+    def complete(self, name: str, **outputs: Any) -> None:
+        self.data["stages"][name] = {
+            "status": "done",
+            "finished_at": datetime.now().isoformat(),
+            **outputs,
+        }
+        self.save()
+
+    def discard(self, name: str) -> None:
+        """実行前に打ち切ったステージの記録を消す（次回やり直す）"""
+        if self.data["stages"].pop(name, None) is not None:
+            self.save()
+
+    def finish(self, status: str) -> None:
+        self.data["status"] = status
+        self.data["finished_at"] = datetime.now().isoformat()
+        self.save()
+
+
+def _load_runs(runs_dir: Path) -> list[tuple[Path, dict[str, Any]]]:
+    if not runs_dir.exists():
+        return []
+    runs = []
+    for path in sorted(runs_dir.glob("*.json")):
+        try:
+            with open(path, 'r', encoding='utf-8') as f:
+                runs.append((path, json.load(f)))
+        except (OSError, json.JSONDecodeError):
+            continue
+    return runs
+
+
+def abandon_stale_runs(runs_dir: Path = RUNS_DIR, now: datetime | None = None) -> list[str]:
+    """古すぎる・試行回数を使い切った未完了の実行を打ち切る（打ち切った run_id を返す）"""
+    cutoff = (now or datetime.now()) - timedelta(days=RESUME_MAX_AGE_DAYS)
+    abandoned = []
+    for path, data in _load_runs(runs_dir):
+        if data.get("status") in FINISHED_STATUSES:
+            continue
+        started = datetime.fromisoformat(data.get("started_at", cutoff.isoformat()))
+        if started < cutoff or data.get("attempts", 0) >= RESUME_MAX_ATTEMPTS:
+            journal = RunJournal(data.get("run_id", path.stem), runs_dir)
+            journal.finish("abandoned")
+            abandoned.append(journal.run_id)
+    return abandoned
+
+
+def abandon_ungenerated_runs(runs_dir: Path = RUNS_DIR, exclude: str | None = None) -> list[str]:
+    """記事の生成まで済んでいない未完了の実行を打ち切る（打ち切った run_id を返す）
+
+    再開しても今日の実行と別にもう1本生成・公開することになるだけなので、
+    ネタの選び直しは exclude（今日の実行）に任せる。
+    """
+    abandoned = []
+    for run_id in unfinished_runs(runs_dir, exclude):
+        journal = RunJournal(run_id, runs_dir)
+        if not journal.is_done("generate"):
+            journal.finish("abandoned")
+            abandoned.append(run_id)
+    return abandoned
+
+
+def unfinished_runs(runs_dir: Path = RUNS_DIR, exclude: str | None = None) -> list[str]:
+    """最後まで終わっていない実行（古い順）"""
+    return [
+        data.get("run_id", path.stem)
+        for path, data in _load_runs(runs_dir)
+        if data.get("status") not in FINISHED_STATUSES and data.get("run_id", path.stem) != exclude
+    ]
+
+
+def claimed_titles(runs_dir: Path = RUNS_DIR, exclude: str | None = None) -> set[str]:
+    """未完了の実行がすでに選んだネタのタイトル（小文字）"""
+    titles = set()
+    for run_id in unfinished_runs(runs_dir, exclude):
+        select = RunJournal(run_id, runs_dir).stage("select") or {}
+        if select.get("topic"):
+            titles.add(select["topic"].get("title", "").lower())
+    return titles
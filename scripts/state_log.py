@@ -0,0 +1,317 @@
+"""
+追記型の状態ログ
+
+ネタストック・投稿済みネタ・ツイート記録を「スナップショット + JSONLの
+イベントログ」で保存する。1件の追加は1行の追記で済み、書き込み途中で
+落ちても壊れるのは最後の1行だけ（読み込み時に切り捨てる）。
+
+- data/<name>.state.json : スナップショット {"seq": n, "items": [...]}
+- data/<name>.log.jsonl  : seq > n のイベント
+
+ログが一定件数を超えたら、開くとき・追記時にスナップショットへ畳み込む
+（コンパクション）。
+fsyncはまとめて行い、プロセス終了時にも必ず実行する。
+同じプロセス内ではスレッド間で共有してよい（デーモンとウォッチャーが
+同じログに書いても seq が重複しないよう、読み書きをロックで直列化する）。
+デーモンとcron・CLIの実行など別プロセスからの読み書きは、data/<name>.lock の
+flock で直列化する（他プロセスの書きかけの行を切り捨てたり、同じ seq で書いたりしない）。
+"""
+import atexit
+import contextlib
+import copy
+import json
+import os
+import threading
+import time
+from pathlib import Path
+from typing import Any, Callable
+
+try:
+    import fcntl
+except ImportError:
+    fcntl = None  # Windows ではプロセス間のロックはしない
+
+from config import (
+    DATA_DIR,
+    STATE_LOG_FSYNC_BATCH,
+    STATE_LOG_FSYNC_INTERVAL,
+    STATE_LOG_COMPACT_EVENTS,
+)
+
+
+class StateLog:
+    """1つのストアに対応する追記型ログ"""
+
+    def __init__(self, name: str, key: str | None = None, data_dir: Path = DATA_DIR):
+        self.name = name
+        self.key = key  # add/remove で同一要素を判定するフィールド（Noneなら追記のみ）
+        self.data_dir = data_dir
+        self.snapshot_file = data_dir / f"{name}.state.json"
+        self.log_file = data_dir / f"{name}.log.jsonl"
+        self.legacy_file = data_dir / f"{name}.json"
+        self.lock_file = data_dir / f"{name}.lock"
+
+        self._items: list[dict[str, Any]] = []
+        self._seq = 0
+        self._log_events = 0
+        self._snapshot_mtime: int | None = None
+        self._log_offset = 0
+        self._loaded = False
+
+        self._fh = None
+        self._unsynced = 0
+        self._last_sync = time.monotonic()
+        # 追記の途中でコンパクション・flush を呼ぶので再入可能にする
+        self._lock = threading.RLock()
+        self._lock_fd: int | None = None
+        self._lock_depth = 0
+
+    @contextlib.contextmanager
+    def _locked(self):
+        """スレッド間のロックとプロセス間のflockを取る（再入可能）"""
+        with self._lock:
+            if self._lock_depth == 0 and fcntl is not None:
+                self.data_dir.mkdir(exist_ok=True)
+                self._lock_fd = os.open(self.lock_file, os.O_RDWR | os.O_CREAT, 0o644)
+                fcntl.flock(self._lock_fd, fcntl.LOCK_EX)
+            self._lock_depth += 1
+            try:
+                yield
+            finally:
+                self._lock_depth -= 1
+                if self._lock_depth == 0 and self._lock_fd is not None:
+                    # 閉じればflockも外れる
+                    os.close(self._lock_fd)
+                    self._lock_fd = None
+
+    # --------------------------------------------------------
+    # イベントの適用
+    # --------------------------------------------------------
+    def _index_of(self, value: Any) -> int | None:
+        for i, item in enumerate(self._items):
+            if item.get(self.key) == value:
+                return i
+        return None
+
+    def _apply(self, event: dict[str, Any]) -> None:
+        op = event.get("op")
+        if op == "add":
+            item = event["item"]
+            index = self._index_of(item.get(self.key)) if self.key else None
+            if index is None:
+                self._items.append(item)
+            else:
+                self._items[index] = item
+        elif op == "remove":
+            self._items = [
+                item for item in self._items if item.get(self.key) != event["value"]
+            ]
+        elif op == "reset":
+            self._items = event["items"]
+        self._seq = event["seq"]
+
+    # --------------------------------------------------------
+    # 読み込み（スナップショット + ログ末尾の再生）
+    # --------------------------------------------------------
+    def _load_snapshot(self) -> None:
+        self._items, self._seq = [], 0
+        if self.snapshot_file.exists():
+            with open(self.snapshot_file, 'r', encoding='utf-8') as f:
+                snapshot = json.load(f)
+            self._items, self._seq = snapshot["items"], snapshot["seq"]
+            self._snapshot_mtime = self.snapshot_file.stat().st_mtime_ns
+        elif self.legacy_file.exists():
+            # 旧形式（JSON配列をまるごと書き直す方式）からの移行
+            with open(self.legacy_file, 'r', encoding='utf-8') as f:
+                self._items = json.load(f)
+        self._log_offset = 0
+        self._log_events = 0
+
+    def _replay_tail(self) -> None:
+        if not self.log_file.exists():
+            return
+        with open(self.log_file, 'rb') as f:
+            f.seek(self._log_offset)
+            valid_end = self._log_offset
+            for raw in f:
+                if not raw.endswith(b"\n"):
+                    break  # 書き込み途中で落ちた行
+                try:
+                    event = json.loads(raw)
+                except json.JSONDecodeError:
+                    break
+                valid_end += len(raw)
+                self._log_events += 1
+                if event["seq"] > self._seq:
+                    self._apply(event)
+            torn = f.seek(0, os.SEEK_END) > valid_end
+        if torn:
+            # 壊れた末尾を切り捨て、以降の追記が正しい行になるようにする
+            self._close_handle()
+            with open(self.log_file, 'r+b') as f:
+                f.truncate(valid_end)
+        self._log_offset = valid_end
+
+    def _refresh(self) -> None:
+        """他プロセスの書き込みがあれば取り込む"""
+        snapshot_mtime = (
+            self.snapshot_file.stat().st_mtime_ns if self.snapshot_file.exists() else None
+        )
+        if not self._loaded or snapshot_mtime != self._snapshot_mtime:
+            self._load_snapshot()
+            self._snapshot_mtime = snapshot_mtime
+        self._replay_tail()
+        if not self._loaded:
+            self._loaded = True
+            if self._log_events >= STATE_LOG_COMPACT_EVENTS:
+                self.compact()
+
+    def items(self) -> list[dict[str, Any]]:
+        """現在の要素一覧（コピー）を返す"""
+        with self._locked():
+            self.flush(sync=False)
+            self._refresh()
+            return copy.deepcopy(self._items)
+
+    def reduce(self, func: Callable[[Any, dict[str, Any]], Any], initial: Any) -> Any:
+        """要素をコピーせずに先頭から畳み込む（func は要素を書き換えないこと）"""
+        with self._locked():
+            self.flush(sync=False)
+            self._refresh()
+            result = initial
+            for item in self._items:
+                result = func(result, item)
+            return result
+
+    def version(self) -> int:
+        """現在の seq（他プロセスの書き込みも含め、要素が変わるたびに増える）"""
+        with self._locked():
+            self.flush(sync=False)
+            self._refresh()
+            return self._seq
+
+    # --------------------------------------------------------
+    # 書き込み
+    # --------------------------------------------------------
+    def _handle(self):
+        if self._fh is None:
+            self.data_dir.mkdir(exist_ok=True)
+            self._fh = open(self.log_file, 'ab')
+        return self._fh
+
+    def _close_handle(self) -> None:
+        if self._fh is not None:
+            self.flush(sync=True)
+            self._fh.close()
+            self._fh = None
+
+    def _append(self, event: dict[str, Any]) -> None:
+        with self._locked():
+            self._append_locked(event)
+
+    def _append_locked(self, event: dict[str, Any]) -> None:
+        self._refresh()
+        event["seq"] = self._seq + 1
+        line = json.dumps(event, ensure_ascii=False).encode('utf-8') + b"\n"
+        fh = self._handle()
+        fh.write(line)
+        self._log_offset += len(line)
+        self._log_events += 1
+        # 再生時と同じ結果になるよう、書き出した行そのものを適用する
+        self._apply(json.loads(line))
+
+        self._unsynced += 1
+        if (
+            self._unsynced >= STATE_LOG_FSYNC_BATCH
+            or time.monotonic() - self._last_sync >= STATE_LOG_FSYNC_INTERVAL
+        ):
+            self.flush(sync=True)
+        else:
+            self.flush(sync=False)
+
+        # 常駐プロセスでもログが伸び続けないよう、閾値を超えたら畳み込む
+        if self._log_events >= STATE_LOG_COMPACT_EVENTS:
+            self.compact()
+
+    def add(self, item: dict[str, Any]) -> None:
+        """要素を追加する（keyが同じ要素があれば置き換える）"""
+        self._append({"op": "add", "item": item})
+
+    def remove(self, value: Any) -> None:
+        """keyが一致する要素を削除する"""
+        if self.key is None:
+            raise ValueError(f"{self.name}: keyなしのログでは削除できません")
+        self._append({"op": "remove", "value": value})
+
+    def reset(self, items: list[dict[str, Any]]) -> None:
+        """全要素を置き換える"""
+        self._append({"op": "reset", "items": items})
+
+    def remove_where(self, predicate: Callable[[dict[str, Any]], bool]) -> int:
+        """predicate に当てはまる要素をまとめて削除し、削除した件数を返す"""
+        with self._locked():
+            self.flush(sync=False)
+            self._refresh()
+            kept = [item for item in self._items if not predicate(item)]
+            removed = len(self._items) - len(kept)
+            if removed:
+                self._append_locked({"op": "reset", "items": kept})
+                # 残りを丸ごと持つ reset 行をログに残さないよう、すぐ畳み込む
+                self.compact()
+            return removed
+
+    def flush(self, sync: bool = True) -> None:
+        """バッファを書き出す（sync=Trueならfsyncまで行う）"""
+        with self._lock:
+            if self._fh is None:
+                return
+            self._fh.flush()
+            if sync and self._unsynced:
+                os.fsync(self._fh.fileno())
+                self._unsynced = 0
+                self._last_sync = time.monotonic()
+
+    # --------------------------------------------------------
+    # コンパクション
+    # --------------------------------------------------------
+    def compact(self) -> None:
+        """現在の状態をスナップショットに書き出し、ログを空にする"""
+        with self._locked():
+            self._close_handle()
+            # 他プロセスの追記を取り込んでから畳み込む（取りこぼすとログと一緒に消える）
+            self._refresh()
+            self.data_dir.mkdir(exist_ok=True)
+            tmp = self.snapshot_file.with_suffix(".tmp")
+            with open(tmp, 'w', encoding='utf-8') as f:
+                json.dump({"seq": self._seq, "items": self._items}, f, ensure_ascii=False)
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp, self.snapshot_file)
+            # ここで落ちてもseqで既適用のイベントは読み飛ばされる
+            with open(self.log_file, 'wb') as f:
+                os.fsync(f.fileno())
+            self._snapshot_mtime = self.snapshot_file.stat().st_mtime_ns
+            self._log_offset = 0
+            self._log_events = 0
+
+    def close(self) -> None:
+        with self._lock:
+            self._close_handle()
+
+
+_logs: dict[str, StateLog] = {}
+_logs_lock = threading.Lock()
+
+
+def get_state_log(name: str, key: str | None = None) -> StateLog:
+    """プロセス共有の状態ログを取得する"""
+    with _logs_lock:
+        if name not in _logs:
+            _logs[name] = StateLog(name, key=key)
+        return _logs[name]
+
+
+@atexit.register
+def _close_all() -> None:
+    for state_log in _logs.values():
+        state_log.close()
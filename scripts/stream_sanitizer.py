@@ -0,0 +1,192 @@
+"""
+ストリーミング版サニタイザ
+
+sanitize_text と同じ置換を、ファイルなどの入力をチャンク単位で読みながら行う。
+数MBのセッション記録や記事本文全体でもメモリ使用量は一定
+（チャンク + 重なり幅）で済む。
+
+置換は sanitize_text と同じ順序のパス（除外パス → 企業名 → /Users/...）として
+直列につなぐ。各パスは末尾の overlap 文字を次のチャンクに持ち越すので、
+チャンク境界をまたぐキーワードやパスも、長さが overlap 未満なら必ず置換される。
+
+公開する記事には sanitize_article を使う。履歴用の置換は短い略語を大文字小文字を
+問わず伏せるので、記事の「sse」や「Ss」まで壊してしまう。記事では社名・個人名などの
+長いキーワードは履歴と同じくコードの中も大文字小文字を問わず伏せ、短い略語だけを
+大文字小文字を区別してコードの外で伏せる。
+"""
+import re
+from functools import lru_cache
+from typing import IO, Iterable, Iterator
+
+from config import SENSITIVE_KEYWORDS, EXCLUDED_PATH_PATTERNS
+
+
+DEFAULT_CHUNK_SIZE = 1 << 20  # 1M文字
+DEFAULT_OVERLAP = 4096  # これより長い一致は境界をまたぐと見逃しうる
+SHORT_KEYWORD_MAX_LEN = 3  # 公開する記事でこれ以下の長さのキーワードは略語として扱う
+
+Pass = tuple[re.Pattern, str]
+
+
+@lru_cache(maxsize=4)
+def _compile_passes(keywords: tuple[str, ...], path_patterns: tuple[str, ...]) -> tuple[Pass, ...]:
+    passes = [(re.compile(pattern), "[REDACTED_PATH]/") for pattern in path_patterns]
+    if keywords:
+        # 長いキーワードを先に試す（SS と SSE など）
+        alternation = "|".join(re.escape(k) for k in sorted(keywords, key=len, reverse=True))
+        # 先頭文字の先読みで、候補にならない位置の試行を早めに打ち切る
+        heads = re.escape("".join(sorted({k[0].lower() for k in keywords})))
+        passes.append((
+            re.compile(rf'\b(?=[{heads}])(?:{alternation})\b', re.IGNORECASE),
+            "[企業名]",
+        ))
+    passes.append((re.compile(r'/Users/[^/]+/'), "~/"))
+    return tuple(passes)
+
+
+def sanitize_passes() -> tuple[Pass, ...]:
+    """現在の設定から置換パスを組み立てる（設定が同じならコンパイル済みを再利用）"""
+    return _compile_passes(tuple(SENSITIVE_KEYWORDS), tuple(EXCLUDED_PATH_PATTERNS))
+
+
+def _stream_pass(chunks: Iterable[str], pattern: re.Pattern, repl: str, overlap: int) -> Iterator[str]:
+    """1つの置換パスをストリームに適用する"""
+    carry = ""
+    lead = 0  # carry の先頭のうち出力済みの文字数（\b の判定にだけ使う）
+    for chunk in chunks:
+        buffer = carry + chunk
+        safe = len(buffer) - overlap
+        if safe <= lead:
+            carry = buffer
+            continue
+
+        out = []
+        pos = lead
+        for m in pattern.finditer(buffer, lead):
+            if m.end() > safe:
+                # 次のチャンク次第で一致が変わりうるので、開始位置から持ち越す
+                safe = m.start()
+                break
+            out.append(buffer[pos:m.start()])
+            out.append(repl)
+            pos = m.end()
+        safe = max(safe, pos)
+        out.append(buffer[pos:safe])
+
+        # 直前の1文字を残しておくと、次のバッファでも単語境界を正しく判定できる
+        lead = min(safe, 1)
+        carry = buffer[safe - lead:]
+        yield "".join(out)
+
+    if len(carry) > lead:
+        out = []
+        pos = lead
+        for m in pattern.finditer(carry, lead):
+            out.append(carry[pos:m.start()])
+            out.append(repl)
+            pos = m.end()
+        out.append(carry[pos:])
+        yield "".join(out)
+
+
+def iter_sanitized(
+    chunks: Iterable[str],
+    overlap: int = DEFAULT_OVERLAP,
+) -> Iterator[str]:
+    """テキストのチャンク列をサニタイズしたチャンク列に変換する"""
+    stream: Iterable[str] = chunks
+    for pattern, repl in sanitize_passes():
+        stream = _stream_pass(stream, pattern, repl, overlap)
+    for piece in stream:
+        if piece:
+            yield piece
+
+
+def read_chunks(src: IO[str], chunk_size: int = DEFAULT_CHUNK_SIZE) -> Iterator[str]:
+    while True:
+        chunk = src.read(chunk_size)
+        if not chunk:
+            return
+        yield chunk
+
+
+def sanitize_stream(
+    src: IO[str],
+    dst: IO[str],
+    chunk_size: int = DEFAULT_CHUNK_SIZE,
+    overlap: int = DEFAULT_OVERLAP,
+) -> int:
+    """src を読みながらサニタイズして dst に書き出す（書き出した文字数を返す）"""
+    written = 0
+    for piece in iter_sanitized(read_chunks(src, chunk_size), overlap):
+        dst.write(piece)
+        written += len(piece)
+    return written
+
+
+def sanitize_file(src_path, dst_path, chunk_size: int = DEFAULT_CHUNK_SIZE) -> int:
+    """ファイルをサニタイズして別のファイルに書き出す"""
+    with open(src_path, 'r', encoding='utf-8', errors='replace') as src, \
+            open(dst_path, 'w', encoding='utf-8') as dst:
+        return sanitize_stream(src, dst, chunk_size)
+
+
+# ------------------------------------------------------------
+# 公開する記事向け
+# ------------------------------------------------------------
+# フェンス（閉じていなければ末尾まで）とインラインコード
+_CODE_RE = re.compile(
+    r'^(?P<fence>`{3,}|~{3,}).*?(?:^(?P=fence)[ \t]*$|\Z)'
+    r'|(?P<tick>`+)[^`\n](?:[^\n]*?[^`\n])?(?P=tick)',
+    re.MULTILINE | re.DOTALL,
+)
+
+
+@lru_cache(maxsize=4)
+def _compile_publish_passes(path_patterns: tuple[str, ...]) -> tuple[Pass, ...]:
+    passes = [(re.compile(pattern), "[REDACTED_PATH]/") for pattern in path_patterns]
+    passes.append((re.compile(r'/Users/[^/]+/'), "~/"))
+    return tuple(passes)
+
+
+@lru_cache(maxsize=8)
+def _compile_publish_keywords(keywords: tuple[str, ...], ignore_case: bool) -> re.Pattern | None:
+    if not keywords:
+        return None
+    alternation = "|".join(re.escape(k) for k in sorted(keywords, key=len, reverse=True))
+    # \b だと「Giveryの」のように日本語が続くと一致しないので、英数字の前後だけを見る
+    return re.compile(
+        rf'(?<![A-Za-z0-9])(?:{alternation})(?![A-Za-z0-9])',
+        re.IGNORECASE if ignore_case else 0,
+    )
+
+
+def sanitize_article(text: str) -> str:
+    """公開する記事のテキストから社名・ローカルパスを伏せる
+
+    パスと長いキーワード（社名・個人名）はコードの中も含め、大文字小文字を問わず
+    置き換える。短い略語（SHORT_KEYWORD_MAX_LEN 文字以下）は一般の技術用語と
+    衝突するので、大文字小文字を区別してコードの外だけを置き換える。
+    どちらも英数字の単語単位で一致させる。
+    """
+    for pattern, repl in _compile_publish_passes(tuple(EXCLUDED_PATH_PATTERNS)):
+        text = pattern.sub(repl, text)
+    names = _compile_publish_keywords(
+        tuple(k for k in SENSITIVE_KEYWORDS if len(k) > SHORT_KEYWORD_MAX_LEN), True
+    )
+    if names is not None:
+        text = names.sub("[企業名]", text)
+    keywords = _compile_publish_keywords(
+        tuple(k for k in SENSITIVE_KEYWORDS if len(k) <= SHORT_KEYWORD_MAX_LEN), False
+    )
+    if keywords is None:
+        return text
+
+    out = []
+    pos = 0
+    for m in _CODE_RE.finditer(text):
+        out.append(keywords.sub("[企業名]", text[pos:m.start()]))
+        out.append(m.group(0))
+        pos = m.end()
+    out.append(keywords.sub("[企業名]", text[pos:]))
+    return "".join(out)
@@ -0,0 +1,509 @@
+"""
+外部APIのローカル代替サーバー
+
+Anthropic Messages API（Message Batches を含む）と X API v2、note投稿の最小限の代替をローカルで立てる。
+遅延・エラー・レート制限を設定でき、ネットワークなしで
+パイプラインの負荷試験や障害時の動作確認に使う。
+"""
+import json
+import random
+import shlex
+import sys
+import threading
+import time
+import urllib.error
+import urllib.request
+import uuid
+from datetime import datetime, timedelta, timezone
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Any
+
+
+# 代替サーバーが返す記事本文（article_lint の検査を通る形）
+STUB_ARTICLE = "\n".join([
+    "## 結論から言うと",
+    "ローカルの代替サーバーで生成した本文やで。" * 20,
+    "",
+    "## やってみたこと",
+    "試してみたら意外と..." + "手順を順番に確認していった。" * 30,
+    "",
+    "```bash",
+    "claude --help",
+    "```",
+    "",
+    "## わかったこと",
+    "正直に言うとな、" + "負荷試験の結果を見て改善点を洗い出した。" * 25,
+    "",
+    "## 次に試したいこと",
+    "次は並列実行の上限を変えて測ってみる。",
+    "",
+    "<article_meta>",
+    '{"summary": "代替サーバーで負荷試験して改善点を洗い出したで", "topics": ["claudecode", "loadtest"],'
+    ' "tweet_hook": "負荷試験、やってみたら意外な結果に…", "emoji": "🧪"}',
+    "</article_meta>",
+])
+
+
+# ステータスごとのエラー種別（Anthropic APIと同じ名前）
+ERROR_TYPES = {
+    429: "rate_limit_error",
+    529: "overloaded_error",
+}
+
+
+class StubBehavior:
+    """遅延・エラー・レート制限の設定"""
+
+    def __init__(
+        self,
+        latency: float = 0.0,
+        jitter: float = 0.0,
+        error_rate: float = 0.0,
+        error_status: int = 500,
+        rate_limit: float | None = None,
+        seed: int | None = None,
+        plan: list[tuple[float, int | None]] | None = None,
+    ):
+        self.latency = latency
+        self.jitter = jitter
+        self.error_rate = error_rate
+        self.error_status = error_status
+        self.rate_limit = rate_limit  # 1秒あたりの許容リクエスト数
+        # リクエストごとの（遅延秒, エラーのステータス or None）を先頭から順に使う
+        # 使い切ったら latency / error_rate の設定に戻る
+        self.plan = list(plan or [])
+        self.random = random.Random(seed)
+        self.lock = threading.Lock()
+        self.tokens = rate_limit or 0.0
+        self.last_refill = time.monotonic()
+
+    def delay(self) -> None:
+        with self.lock:
+            extra = self.random.uniform(0, self.jitter) if self.jitter else 0.0
+        if self.latency or extra:
+            time.sleep(self.latency + extra)
+
+    def rate_limited(self) -> bool:
+        """トークンバケットでレート制限を判定する"""
+        if not self.rate_limit:
+            return False
+        with self.lock:
+            now = time.monotonic()
+            self.tokens = min(
+                self.rate_limit,
+                self.tokens + (now - self.last_refill) * self.rate_limit,
+            )
+            self.last_refill = now
+            if self.tokens < 1:
+                return True
+            self.tokens -= 1
+            return False
+
+    def should_fail(self) -> bool:
+        with self.lock:
+            return self.random.random() < self.error_rate
+
+    def next_planned(self) -> tuple[float, int | None] | None:
+        with self.lock:
+            return self.plan.pop(0) if self.plan else None
+
+
+class StubServer:
+    """バックグラウンドスレッドで動くHTTPサーバー"""
+
+    handler_class: type[BaseHTTPRequestHandler]
+
+    def __init__(self, behavior: StubBehavior | None = None):
+        self.behavior = behavior or StubBehavior()
+        self.requests: list[dict[str, Any]] = []
+        self.server: ThreadingHTTPServer | None = None
+
+    @property
+    def url(self) -> str:
+        host, port = self.server.server_address[:2]
+        return f"http://{host}:{port}"
+
+    def start(self) -> "StubServer":
+        stub = self
+
+        class Handler(self.handler_class):
+            pass
+
+        Handler.stub = stub
+        self.server = ThreadingHTTPServer(("127.0.0.1", 0), Handler)
+        self.server.daemon_threads = True
+        threading.Thread(target=self.server.serve_forever, daemon=True).start()
+        return self
+
+    def stop(self) -> None:
+        if self.server is not None:
+            self.server.shutdown()
+            self.server.server_close()
+
+    def __enter__(self) -> "StubServer":
+        return self.start()
+
+    def __exit__(self, *exc) -> None:
+        self.stop()
+
+
+class _StubHandler(BaseHTTPRequestHandler):
+    """共通処理（ログ抑制・JSON応答・障害注入）"""
+
+    stub: StubServer
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format: str, *args: Any) -> None:
+        pass
+
+    def read_json(self) -> dict[str, Any]:
+        length = int(self.headers.get("Content-Length") or 0)
+        body = self.rfile.read(length) if length else b""
+        return json.loads(body) if body else {}
+
+    def send_json(self, status: int, payload: dict[str, Any], headers: dict | None = None) -> None:
+        body = json.dumps(payload, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(body)))
+        for key, value in (headers or {}).items():
+            self.send_header(key, value)
+        self.end_headers()
+        self.wfile.write(body)
+
+    def inject_fault(self) -> bool:
+        """レート制限・エラーを注入した場合はTrue（応答済み）"""
+        behavior = self.stub.behavior
+        planned = behavior.next_planned()
+        if planned is not None:
+            latency, status = planned
+            time.sleep(latency)
+            if status is not None:
+                self.send_error_payload(status, ERROR_TYPES.get(status, "api_error"))
+                return True
+            return False
+        if behavior.rate_limited():
+            self.send_error_payload(429, "rate_limit_error", {"retry-after": "1"})
+            return True
+        behavior.delay()
+        if behavior.should_fail():
+            self.send_error_payload(
+                behavior.error_status, ERROR_TYPES.get(behavior.error_status, "api_error")
+            )
+            return True
+        return False
+
+    def send_error_payload(self, status: int, kind: str, headers: dict | None = None) -> None:
+        self.send_json(status, {"type": "error", "error": {"type": kind, "message": kind}}, headers)
+
+    def record(self, body: dict[str, Any]) -> None:
+        self.stub.requests.append({
+            "method": self.command,
+            "path": self.path,
+            "body": body,
+            "at": time.time(),
+        })
+
+
+BATCHES_PATH = "/v1/messages/batches"
+
+
+class _AnthropicHandler(_StubHandler):
+    def do_POST(self) -> None:
+        body = self.read_json()
+        self.record(body)
+        path = self.path.split("?")[0]
+        if path == BATCHES_PATH:
+            if not self.inject_fault():
+                self.send_json(200, self.stub.create_batch(body.get("requests", [])))
+            return
+        if path != "/v1/messages":
+            self.send_error_payload(404, "not_found_error")
+            return
+        if self.inject_fault():
+            return
+
+        message = self.stub.message(body.get("model", "stub"))
+        if body.get("stream"):
+            self.send_stream(message, message["content"][0]["text"], self.stub.next_stream_error())
+        else:
+            self.send_json(200, message)
+
+    def do_GET(self) -> None:
+        self.record({})
+        path = self.path.split("?")[0]
+        if not path.startswith(BATCHES_PATH + "/"):
+            self.send_error_payload(404, "not_found_error")
+            return
+        batch_id, _, rest = path[len(BATCHES_PATH) + 1:].partition("/")
+        if batch_id not in self.stub.batches or rest not in ("", "results"):
+            self.send_error_payload(404, "not_found_error")
+            return
+        if self.inject_fault():
+            return
+        if rest == "":
+            self.send_json(200, self.stub.poll_batch(batch_id))
+            return
+
+        results = self.stub.batch_results(batch_id)
+        if results is None:
+            self.send_error_payload(404, "not_found_error")
+            return
+        body = "".join(json.dumps(r, ensure_ascii=False) + "\n" for r in results).encode("utf-8")
+        self.send_response(200)
+        self.send_header("Content-Type", "application/binary")
+        self.send_header("Content-Length", str(len(body)))
+        self.end_headers()
+        self.wfile.write(body)
+
+    def send_stream(self, message: dict[str, Any], text: str, error: str | None = None) -> None:
+        """SSEで本文を少しずつ返す（error を渡すと、最初の断片のあとに error イベントを送って終える）"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+
+        def event(kind: str, data: dict[str, Any]) -> None:
+            payload = json.dumps({"type": kind, **data}, ensure_ascii=False)
+            self.wfile.write(f"event: {kind}\ndata: {payload}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        start = dict(message, content=[], stop_reason=None)
+        start["usage"] = {"input_tokens": message["usage"]["input_tokens"], "output_tokens": 1}
+        try:
+            event("message_start", {"message": start})
+            event("content_block_start", {"index": 0, "content_block": {"type": "text", "text": ""}})
+            for i in range(0, len(text), 200):
+                event("content_block_delta", {
+                    "index": 0,
+                    "delta": {"type": "text_delta", "text": text[i:i + 200]},
+                })
+                if error is not None:
+                    # 本物のAPIと同じく、HTTP 200 のストリームの途中でエラーが届く
+                    event("error", {"error": {"type": error, "message": error}})
+                    return
+            event("content_block_stop", {"index": 0})
+            event("message_delta", {
+                "delta": {"stop_reason": "end_turn", "stop_sequence": None},
+                "usage": {"output_tokens": message["usage"]["output_tokens"]},
+            })
+            event("message_stop", {})
+        except (BrokenPipeError, ConnectionResetError):
+            pass  # クライアント側で打ち切られた
+
+
+def _timestamp(at: datetime | None) -> str | None:
+    return at.isoformat().replace("+00:00", "Z") if at else None
+
+
+class AnthropicStub(StubServer):
+    """Anthropic Messages API（/v1/messages、stream対応）と Message Batches の代替
+
+    バッチは batch_polls 回の状態確認までは処理中を返し、その後に完了する。
+    各リクエストは batch_error_rate の確率で errored になる。
+    stream_errors は先頭から順に、ストリームの途中で返すエラーの種類（Noneなら最後まで返す）。
+    """
+
+    handler_class = _AnthropicHandler
+
+    def __init__(
+        self,
+        behavior: StubBehavior | None = None,
+        article_text: str = STUB_ARTICLE,
+        batch_polls: int = 2,
+        batch_error_rate: float = 0.0,
+        stream_errors: list[str | None] | None = None,
+    ):
+        super().__init__(behavior)
+        self.article_text = article_text
+        self.batch_polls = batch_polls
+        self.batch_error_rate = batch_error_rate
+        self.stream_errors = list(stream_errors or [])
+        self.lock = threading.Lock()
+        self.batches: dict[str, dict[str, Any]] = {}
+
+    def next_stream_error(self) -> str | None:
+        with self.lock:
+            return self.stream_errors.pop(0) if self.stream_errors else None
+
+    def message(self, model: str) -> dict[str, Any]:
+        text = self.article_text
+        return {
+            "id": f"msg_stub_{len(self.requests)}",
+            "type": "message",
+            "role": "assistant",
+            "model": model,
+            "content": [{"type": "text", "text": text}],
+            "stop_reason": "end_turn",
+            "stop_sequence": None,
+            "usage": {"input_tokens": 1000, "output_tokens": len(text) // 2},
+        }
+
+    def create_batch(self, requests: list[dict[str, Any]]) -> dict[str, Any]:
+        with self.lock:
+            # 起動し直しても前回のバッチの状態ファイルと重ならないようにする
+            batch_id = f"msgbatch_stub_{uuid.uuid4().hex[:16]}"
+            results = []
+            for request in requests:
+                model = request.get("params", {}).get("model", "stub")
+                with self.behavior.lock:
+                    failed = self.behavior.random.random() < self.batch_error_rate
+                if failed:
+                    result = {"type": "errored", "error": {
+                        "type": "error", "error": {"type": "overloaded_error", "message": "overloaded_error"},
+                    }}
+                else:
+                    result = {"type": "succeeded", "message": self.message(model)}
+                results.append({"custom_id": request.get("custom_id"), "result": result})
+            self.batches[batch_id] = {
+                "created_at": datetime.now(timezone.utc),
+                "ended_at": None,
+                "polls": 0,
+                "results": results,
+            }
+        return self.describe_batch(batch_id)
+
+    def poll_batch(self, batch_id: str) -> dict[str, Any]:
+        with self.lock:
+            batch = self.batches[batch_id]
+            batch["polls"] += 1
+            if batch["ended_at"] is None and batch["polls"] > self.batch_polls:
+                batch["ended_at"] = datetime.now(timezone.utc)
+        return self.describe_batch(batch_id)
+
+    def describe_batch(self, batch_id: str) -> dict[str, Any]:
+        batch = self.batches[batch_id]
+        ended = batch["ended_at"] is not None
+        counts = {"processing": 0, "succeeded": 0, "errored": 0, "canceled": 0, "expired": 0}
+        for r in batch["results"]:
+            counts[r["result"]["type"] if ended else "processing"] += 1
+        return {
+            "id": batch_id,
+            "type": "message_batch",
+            "processing_status": "ended" if ended else "in_progress",
+            "request_counts": counts,
+            "created_at": _timestamp(batch["created_at"]),
+            "ended_at": _timestamp(batch["ended_at"]),
+            "expires_at": _timestamp(batch["created_at"] + timedelta(hours=24)),
+            "cancel_initiated_at": None,
+            "archived_at": None,
+            "results_url": f"{self.url}{BATCHES_PATH}/{batch_id}/results" if ended else None,
+        }
+
+    def batch_results(self, batch_id: str) -> list[dict[str, Any]] | None:
+        batch = self.batches[batch_id]
+        return batch["results"] if batch["ended_at"] is not None else None
+
+
+class _XHandler(_StubHandler):
+    def do_POST(self) -> None:
+        body = self.read_json()
+        self.record(body)
+        if self.path != "/2/tweets":
+            self.send_error_payload(404, "not_found")
+            return
+        if self.inject_fault():
+            return
+        with self.stub.lock:
+            self.stub.next_id += 1
+            tweet_id = str(self.stub.next_id)
+            self.stub.tweets[tweet_id] = body.get("text", "")
+        self.send_json(201, {"data": {"id": tweet_id, "text": body.get("text", "")}})
+
+    def do_GET(self) -> None:
+        self.record({})
+        path = self.path.split("?")[0]
+        tweet_id = path.rsplit("/", 1)[-1]
+        if not path.startswith("/2/tweets/") or tweet_id not in self.stub.tweets:
+            self.send_error_payload(404, "not_found")
+            return
+        if self.inject_fault():
+            return
+        rng = random.Random(int(tweet_id))
+        self.send_json(200, {"data": {
+            "id": tweet_id,
+            "text": self.stub.tweets[tweet_id],
+            "public_metrics": {
+                "like_count": rng.randint(0, 50),
+                "retweet_count": rng.randint(0, 10),
+                "reply_count": rng.randint(0, 5),
+                "impression_count": rng.randint(100, 5000),
+            },
+        }})
+
+
+class XStub(StubServer):
+    """X API v2（ツイート投稿・取得）の代替"""
+
+    handler_class = _XHandler
+
+    def __init__(self, behavior: StubBehavior | None = None):
+        super().__init__(behavior)
+        self.lock = threading.Lock()
+        self.next_id = 1_000_000
+        self.tweets: dict[str, str] = {}
+
+
+class _NoteHandler(_StubHandler):
+    def do_POST(self) -> None:
+        body = self.read_json()
+        self.record(body)
+        if self.path != "/posts":
+            self.send_error_payload(404, "not_found")
+            return
+        if self.inject_fault():
+            return
+        with self.stub.lock:
+            self.stub.posts.append(body)
+            note_id = f"n{len(self.stub.posts):012d}"
+        self.send_json(201, {"url": f"https://note.com/stub/n/{note_id}"})
+
+
+class NoteStub(StubServer):
+    """note投稿（note-post.ts）の代替
+
+    command を NOTE_POST_COMMAND に設定すると、このサーバーに投稿して
+    note-post.ts と同じ形式（"URL: ..."）で結果を出力する。
+    """
+
+    handler_class = _NoteHandler
+
+    def __init__(self, behavior: StubBehavior | None = None):
+        super().__init__(behavior)
+        self.lock = threading.Lock()
+        self.posts: list[dict[str, Any]] = []
+
+    @property
+    def command(self) -> str:
+        return " ".join(shlex.quote(arg) for arg in [
+            sys.executable, __file__, "note-post", self.url, "{path}", "--publish",
+        ])
+
+
+def note_post(url: str, path: str) -> int:
+    """NoteStub に記事を投稿する（note-post.ts の代わりに実行されるコマンド）"""
+    with open(path, 'r', encoding='utf-8') as f:
+        markdown = f.read()
+    request = urllib.request.Request(
+        f"{url}/posts",
+        data=json.dumps({"path": path, "body": markdown}, ensure_ascii=False).encode("utf-8"),
+        headers={"Content-Type": "application/json"},
+    )
+    try:
+        with urllib.request.urlopen(request, timeout=30) as response:
+            payload = json.load(response)
+    except urllib.error.HTTPError as e:
+        # ログイン失敗などと同じく、投稿前の失敗は終了コード1
+        print(f"Failed to login: {e.code}", file=sys.stderr)
+        return 1
+    print("✅ Success!")
+    print("URL:", payload["url"])
+    return 0
+
+
+if __name__ == "__main__":
+    if len(sys.argv) >= 4 and sys.argv[1] == "note-post":
+        sys.exit(note_post(sys.argv[2], sys.argv[3]))
+    print("Usage: stub_servers.py note-post <stub-url> <markdown-file> [--publish]")
+    sys.exit(1)
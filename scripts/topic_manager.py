@@ -3,62 +3,62 @@
 
 10日分のネタストックを管理し、投稿済みネタを追跡する。
 """
-import json
+import heapq
+import threading
+import time
 from datetime import datetime
-from pathlib import Path
 from typing import Any
 
-from config import DATA_DIR, TOPIC_STOCK_MIN
-from analyze_history import analyze
+from config import TOPIC_STOCK_MIN
+from analyze_history import analyze, load_shared_analysis
+from engagement_index import engagement_index_version, load_engagement_index
+from history_watcher import get_live_analysis
+from state_log import get_state_log
+
+
+def _topics_log():
+    return get_state_log("topics", key="title")
+
+
+def _posted_log():
+    return get_state_log("posted_topics")
+
+
+# ストック全体を反応スコアで重み付けした順に並べたもの。
+# ストック（seq）か反応スコアの索引が変わったときだけ並べ直す。
+_ranking: dict[str, Any] = {"key": None, "entries": [], "titles": set()}
+_ranking_lock = threading.Lock()
 
 
 def load_topics() -> list[dict[str, Any]]:
     """ネタストックを読み込む"""
-    topics_file = DATA_DIR / "topics.json"
-    if not topics_file.exists():
-        return []
-
-    with open(topics_file, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return _topics_log().items()
 
 
 def save_topics(topics: list[dict[str, Any]]) -> None:
-    """ネタストックを保存する"""
-    DATA_DIR.mkdir(exist_ok=True)
-    topics_file = DATA_DIR / "topics.json"
-
-    with open(topics_file, 'w', encoding='utf-8') as f:
-        json.dump(topics, f, ensure_ascii=False, indent=2)
+    """ネタストックを丸ごと置き換える"""
+    _topics_log().reset(topics)
 
 
 def load_posted_topics() -> list[dict[str, Any]]:
     """投稿済みネタを読み込む"""
-    posted_file = DATA_DIR / "posted_topics.json"
-    if not posted_file.exists():
-        return []
-
-    with open(posted_file, 'r', encoding='utf-8') as f:
-        return json.load(f)
+    return _posted_log().items()
 
 
 def save_posted_topic(topic: dict[str, Any]) -> None:
     """投稿済みネタを追加する"""
-    DATA_DIR.mkdir(exist_ok=True)
-    posted_file = DATA_DIR / "posted_topics.json"
-
-    posted = load_posted_topics()
     topic["posted_at"] = datetime.now().isoformat()
-    posted.append(topic)
+    _posted_log().add(topic)
 
-    with open(posted_file, 'w', encoding='utf-8') as f:
-        json.dump(posted, f, ensure_ascii=False, indent=2)
+
+def _posted_titles() -> set[str]:
+    """投稿済みタイトル（小文字）の集合"""
+    return {p.get("title", "").lower() for p in load_posted_topics()}
 
 
 def is_already_posted(title: str) -> bool:
     """すでに投稿済みか確認する"""
-    posted = load_posted_topics()
-    posted_titles = {p.get("title", "").lower() for p in posted}
-    return title.lower() in posted_titles
+    return title.lower() in _posted_titles()
 
 
 def add_manual_topic(
@@ -78,52 +78,101 @@ def add_manual_topic(
         "added_at": datetime.now().isoformat(),
     }
 
-    topics = load_topics()
-    topics.append(topic)
-    save_topics(topics)
+    _topics_log().add(topic)
 
     return topic
 
 
-def refresh_topics() -> list[dict[str, Any]]:
+def refresh_topics(analysis: dict[str, Any] | None = None) -> list[dict[str, Any]]:
     """ネタストックを更新する（履歴から新規抽出）"""
     current_topics = load_topics()
     current_titles = {t.get("title", "").lower() for t in current_topics}
 
-    # 履歴から新規ネタを抽出
-    analysis = analyze()
+    # 履歴から新規ネタを抽出（ライブ取り込み中・共有結果があればそれを使う）
+    if analysis is None:
+        analysis = get_live_analysis() or load_shared_analysis() or analyze()
     new_candidates = analysis.get("candidates", [])
 
+    posted_titles = _posted_titles()
     added = 0
     for candidate in new_candidates:
         title = candidate.get("title", "")
         # 重複チェック
-        if title.lower() not in current_titles and not is_already_posted(title):
+        if title.lower() not in current_titles and title.lower() not in posted_titles:
             candidate["added_at"] = datetime.now().isoformat()
+            _topics_log().add(candidate)
             current_topics.append(candidate)
             current_titles.add(title.lower())
             added += 1
 
-    save_topics(current_topics)
     print(f"✅ {added}件の新規ネタを追加")
 
     return current_topics
 
 
-def get_next_topic() -> dict[str, Any] | None:
-    """次に投稿するネタを取得する"""
+def _ranked_stock() -> tuple[list[tuple[float, int, str]], set[str]]:
+    """ストックを反応スコアで重み付けした優先度順に並べた (-優先度, 追加順, タイトル) とタイトルの集合
+
+    スコアの減衰は並べた時点で固定し、次に索引が保存されたとき（反応の計測・投稿）に反映する。
+    """
+    seq = _topics_log().version()
+    with _ranking_lock:
+        if _ranking["key"] != (seq, engagement_index_version()):
+            index = load_engagement_index()
+            now = time.time()
+            stock = load_topics()
+            # 同じ優先度なら追加順（古いもの）を優先する
+            entries = sorted(
+                (-index.weighted_priority(topic, now), i, topic.get("title", ""))
+                for i, topic in enumerate(stock)
+            )
+            # 索引は読み込んだ版で覚える（初回はここで作られるので、読む前の版とは違う）
+            _ranking["key"] = (seq, index.version)
+            _ranking["entries"] = entries
+            _ranking["titles"] = {title for _, _, title in entries}
+        return _ranking["entries"], _ranking["titles"]
+
+
+def rank_topics(topics: list[dict[str, Any]], limit: int) -> list[dict[str, Any]]:
+    """反応スコアで重み付けした優先度の高い順に limit 件を返す（topics はストックの一部）"""
+    entries, ranked_titles = _ranked_stock()
+    wanted = {}
+    unranked = []
+    for t in topics:
+        if t.get("title", "") in ranked_titles:
+            wanted[t.get("title", "")] = t
+        else:
+            unranked.append(t)
+
+    picked = []
+    for neg_priority, i, title in entries:
+        if len(picked) >= limit:
+            break
+        if title in wanted:
+            picked.append((neg_priority, i, wanted[title]))
+
+    # 並べた後に別プロセスが足したネタなど、並びにないものはその場で重み付けして混ぜる
+    if unranked:
+        index = load_engagement_index()
+        picked += [
+            (-index.weighted_priority(t), len(entries) + j, t)
+            for j, t in enumerate(unranked)
+        ]
+    return [t for _, _, t in heapq.nsmallest(limit, picked, key=lambda p: p[:2])]
+
+
+def get_next_topic(exclude: set[str] | None = None) -> dict[str, Any] | None:
+    """次に投稿するネタを取得する（exclude は除くタイトル（小文字））"""
     topics = load_topics()
+    posted_titles = _posted_titles() | (exclude or set())
 
     # 未投稿で優先度が高い順
-    available = [t for t in topics if not is_already_posted(t.get("title", ""))]
+    available = [t for t in topics if t.get("title", "").lower() not in posted_titles]
 
     if not available:
         return None
 
-    # 優先度でソート
-    available.sort(key=lambda x: -x.get("priority", 0))
-
-    return available[0]
+    return rank_topics(available, 1)[0]
 
 
 def mark_as_posted(title: str) -> None:
@@ -133,26 +182,30 @@ def mark_as_posted(title: str) -> None:
     for topic in topics:
         if topic.get("title") == title:
             save_posted_topic(topic)
+            # 後で反応をこのネタのタグ・種類に結びつける
+            index = load_engagement_index()
+            index.record_topic(topic)
+            index.save()
             break
 
     # ストックから削除
-    topics = [t for t in topics if t.get("title") != title]
-    save_topics(topics)
+    _topics_log().remove(title)
 
 
 def get_stock_status() -> dict[str, Any]:
     """ネタストックの状態を取得する"""
     topics = load_topics()
     posted = load_posted_topics()
+    posted_titles = {p.get("title", "").lower() for p in posted}
 
-    available = [t for t in topics if not is_already_posted(t.get("title", ""))]
+    available = [t for t in topics if t.get("title", "").lower() not in posted_titles]
 
     return {
         "total_stock": len(topics),
         "available": len(available),
         "posted_count": len(posted),
         "needs_refresh": len(available) < TOPIC_STOCK_MIN,
-        "topics": available[:5],  # 上位5件
+        "topics": rank_topics(available, 5),  # 上位5件
     }
 
 
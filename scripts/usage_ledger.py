@@ -0,0 +1,280 @@
+"""
+モデル呼び出しの記録（トークン・所要時間）と予算
+
+記事生成のたびにモデル・トークン数（キャッシュ分を含む）・所要時間・
+終了理由を状態ログ usage_ledger に1行ずつ追記する。
+打ち切り・失敗した呼び出しも、そこまでに分かった分を記録する。
+
+- 集計: モデル別の所要時間 p50/p95、タグ別の1記事あたりトークン数
+- 予算: DAILY_TOKEN_BUDGET / MONTHLY_TOKEN_BUDGET の残りから
+  あと何回呼べるかを見積もり、best-of-k と --backfill の本数を減らす
+
+USAGE_LEDGER_KEEP_DAYS より古い記録は、記録のついでに1日1回捨てる。
+予算の見積もりは記録をコピーせずに合計する（StateLog.reduce）。
+
+どの記事の呼び出しかは usage_scope で伝える（ワーカースレッドにも
+contextvars ごと引き継がれる）。
+"""
+import contextvars
+import statistics
+import time
+from collections import defaultdict
+from contextlib import contextmanager
+from datetime import datetime
+from typing import Any, Iterator
+
+from config import (
+    DAILY_TOKEN_BUDGET,
+    MONTHLY_TOKEN_BUDGET,
+    TOKENS_PER_CALL_DEFAULT,
+    USAGE_LEDGER_KEEP_DAYS,
+    USAGE_REPORT_DAYS,
+)
+from hedging import percentile
+from state_log import get_state_log
+
+TOKEN_FIELDS = (
+    "input_tokens",
+    "output_tokens",
+    "cache_creation_input_tokens",
+    "cache_read_input_tokens",
+)
+
+_last_prune = 0.0
+
+
+def _ledger():
+    return get_state_log("usage_ledger")
+
+
+_topic: contextvars.ContextVar[dict[str, Any] | None] = contextvars.ContextVar("usage_topic", default=None)
+
+
+@contextmanager
+def usage_scope(topic: dict[str, Any]) -> Iterator[None]:
+    """この中で行う呼び出しを topic の記事の分として記録する"""
+    token = _topic.set(topic)
+    try:
+        yield
+    finally:
+        _topic.reset(token)
+
+
+def total_tokens(record: dict[str, Any]) -> int:
+    return sum(record.get(field) or 0 for field in TOKEN_FIELDS)
+
+
+def record_call(
+    model: str,
+    usage: Any,
+    latency: float | None,
+    stop_reason: str | None,
+    error: str | None = None,
+    mode: str = "stream",
+    topic: dict[str, Any] | None = None,
+) -> dict[str, Any]:
+    """1回分の呼び出しを記録する（usage は SDK の Usage、不明ならNone）"""
+    global _last_prune
+    topic = topic if topic is not None else _topic.get()
+    record = {
+        "ts": time.time(),
+        "model": model,
+        "mode": mode,
+        "article": (topic or {}).get("title", ""),
+        "tags": (topic or {}).get("tags", []),
+        **{field: getattr(usage, field, None) or 0 for field in TOKEN_FIELDS},
+        "latency": round(latency, 3) if latency is not None else None,
+        "stop_reason": stop_reason,
+        "error": error,
+    }
+    _ledger().add(record)
+    if record["ts"] - _last_prune >= 86400:
+        _last_prune = record["ts"]
+        prune_ledger(record["ts"])
+    return record
+
+
+def prune_ledger(now: float | None = None) -> int:
+    """USAGE_LEDGER_KEEP_DAYS より古い記録を捨て、捨てた件数を返す"""
+    cutoff = (now or time.time()) - USAGE_LEDGER_KEEP_DAYS * 86400
+    return _ledger().remove_where(lambda r: r["ts"] < cutoff)
+
+
+class _TrackedCall:
+    def __init__(self):
+        self.stream = None
+
+    def watch(self, stream: Any) -> None:
+        self.stream = stream
+
+    def snapshot(self) -> Any:
+        """受信済みのメッセージ（usage・stop_reason を含む）。まだ何も届いていなければNone"""
+        if self.stream is None:
+            return None
+        try:
+            return self.stream.current_message_snapshot
+        except Exception:
+            return None
+
+
+@contextmanager
+def track_call(model: str) -> Iterator[_TrackedCall]:
+    """ストリーミング呼び出しの所要時間とトークン数を、成否にかかわらず記録する"""
+    call = _TrackedCall()
+    start = time.perf_counter()
+    error = None
+    try:
+        yield call
+    except BaseException as e:
+        error = type(e).__name__
+        raise
+    finally:
+        message = call.snapshot()
+        record_call(
+            model,
+            getattr(message, "usage", None),
+            time.perf_counter() - start,
+            getattr(message, "stop_reason", None),
+            error,
+        )
+
+
+# ------------------------------------------------------------
+# 集計
+# ------------------------------------------------------------
+def load_calls(days: float | None = USAGE_REPORT_DAYS, since: float | None = None) -> list[dict[str, Any]]:
+    """直近 days 日（または since 以降）の記録"""
+    if since is None:
+        since = time.time() - days * 86400 if days else 0.0
+    return [r for r in _ledger().items() if r["ts"] >= since]
+
+
+def tokens_used(since: float) -> int:
+    return _ledger().reduce(
+        lambda used, r: used + total_tokens(r) if r["ts"] >= since else used, 0
+    )
+
+
+def latency_percentiles(days: float = USAGE_REPORT_DAYS) -> dict[str, dict[str, float]]:
+    """モデル別の所要時間（成功したストリーミング呼び出しのみ）"""
+    samples: dict[str, list[float]] = defaultdict(list)
+    for r in load_calls(days):
+        if r["error"] is None and r["latency"] is not None:
+            samples[r["model"]].append(r["latency"])
+    return {
+        model: {"count": len(v), "p50": percentile(v, 50), "p95": percentile(v, 95)}
+        for model, v in samples.items()
+    }
+
+
+def tokens_by_tag(days: float = USAGE_REPORT_DAYS) -> dict[str, dict[str, float]]:
+    """タグ別の1記事あたりトークン数（下書き・再生成・ヘッジの分も記事に含める）"""
+    articles: dict[str, dict[str, Any]] = {}
+    for r in load_calls(days):
+        if not r["article"]:
+            continue
+        article = articles.setdefault(r["article"], {"tags": r["tags"], "calls": 0, **dict.fromkeys(TOKEN_FIELDS, 0)})
+        article["calls"] += 1
+        for field in TOKEN_FIELDS:
+            article[field] += r[field]
+
+    by_tag: dict[str, list[dict[str, Any]]] = defaultdict(list)
+    for article in articles.values():
+        for tag in article["tags"] or ["(なし)"]:
+            by_tag[tag].append(article)
+    return {
+        tag: {
+            "articles": len(items),
+            "calls": statistics.mean(a["calls"] for a in items),
+            "tokens": statistics.mean(total_tokens(a) for a in items),
+            **{field: statistics.mean(a[field] for a in items) for field in TOKEN_FIELDS},
+        }
+        for tag, items in sorted(by_tag.items())
+    }
+
+
+def usage_report(days: float = USAGE_REPORT_DAYS) -> dict[str, Any]:
+    calls = load_calls(days)
+    totals = {field: sum(r[field] for r in calls) for field in TOKEN_FIELDS}
+    prompt = totals["input_tokens"] + totals["cache_creation_input_tokens"] + totals["cache_read_input_tokens"]
+    return {
+        "days": days,
+        "calls": len(calls),
+        "errors": sum(1 for r in calls if r["error"]),
+        "tokens": totals,
+        "cache_hit_rate": totals["cache_read_input_tokens"] / prompt if prompt else 0.0,
+        "latency": latency_percentiles(days),
+        "by_tag": tokens_by_tag(days),
+        "budget": budget_status(),
+    }
+
+
+def print_usage_report(days: float = USAGE_REPORT_DAYS) -> None:
+    report = usage_report(days)
+    tokens = report["tokens"]
+    print(f"\n📒 直近{days:g}日のモデル呼び出し: {report['calls']}回（失敗・打ち切り {report['errors']}回）")
+    print(
+        f"  入力 {tokens['input_tokens']:,} / 出力 {tokens['output_tokens']:,}"
+        f" / キャッシュ書込 {tokens['cache_creation_input_tokens']:,}"
+        f" / キャッシュ読込 {tokens['cache_read_input_tokens']:,}"
+        f"（ヒット率 {report['cache_hit_rate']:.0%}）"
+    )
+    for model, stats in report["latency"].items():
+        print(f"  ⏱️ {model}: p50 {stats['p50']:.1f}秒 / p95 {stats['p95']:.1f}秒（{stats['count']}回）")
+    if report["by_tag"]:
+        print("\n🏷️ タグ別（1記事あたり）:")
+        for tag, stats in report["by_tag"].items():
+            print(f"  - {tag}: {stats['tokens']:,.0f}トークン / {stats['calls']:.1f}回（{stats['articles']}記事）")
+    budget = report["budget"]
+    for label, key in (("今日", "daily"), ("今月", "monthly")):
+        if budget[key]["limit"]:
+            print(f"\n💰 {label}: {budget[key]['used']:,} / {budget[key]['limit']:,}トークン")
+
+
+# ------------------------------------------------------------
+# 予算
+# ------------------------------------------------------------
+def budget_status(now: datetime | None = None) -> dict[str, dict[str, int]]:
+    now = now or datetime.now()
+    day_start = now.replace(hour=0, minute=0, second=0, microsecond=0)
+    month_start = day_start.replace(day=1)
+    return {
+        "daily": {"limit": DAILY_TOKEN_BUDGET, "used": tokens_used(day_start.timestamp())},
+        "monthly": {"limit": MONTHLY_TOKEN_BUDGET, "used": tokens_used(month_start.timestamp())},
+    }
+
+
+def remaining_tokens() -> int | None:
+    """今日・今月の予算の残りの小さい方（上限なしならNone）"""
+    remaining = [
+        max(0, b["limit"] - b["used"]) for b in budget_status().values() if b["limit"]
+    ]
+    return min(remaining) if remaining else None
+
+
+def tokens_per_call() -> float:
+    """1回あたりの見込みトークン数（直近の成功した呼び出しの中央値）"""
+    since = time.time() - USAGE_REPORT_DAYS * 86400
+
+    def collect(samples: list[int], r: dict[str, Any]) -> list[int]:
+        if r["ts"] >= since and r["error"] is None:
+            samples.append(total_tokens(r))
+        return samples
+
+    samples = _ledger().reduce(collect, [])
+    return statistics.median(samples) if samples else TOKENS_PER_CALL_DEFAULT
+
+
+def affordable_calls(requested: int, label: str, minimum: int = 0) -> int:
+    """予算の残りで requested 回のうち何回呼べるか（minimum 回は必ず残す）"""
+    remaining = remaining_tokens()
+    if remaining is None:
+        return requested
+    estimate = tokens_per_call()
+    allowed = max(minimum, min(requested, int(remaining // estimate)))
+    if allowed < requested:
+        print(
+            f"💰 予算の残り {remaining:,}トークン（1回あたり約{estimate:,.0f}）のため"
+            f" {label} を {requested} → {allowed} に減らします"
+        )
+    return allowed
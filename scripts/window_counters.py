@@ -0,0 +1,291 @@
+"""
+日別バケットの滑動窓カウンタ
+
+スラッシュコマンド・検出パターン・キーワードの出現数を日ごとのバケットに持ち、
+1・7・30・90日の各窓の合計を同じバケットから差分で保つ。
+
+- 追加: その日のバケットと、その日を含む窓の合計に足す
+- 日付が進んだとき: 窓から外れた日のバケットを合計から引く（件数によらず日数ぶんだけ）
+
+状態は data/window_counters.json に保存し、次回は前回より新しい履歴だけを足す。
+他のマシンの履歴は遅れて同期されるので、最新の時刻から HISTORY_SYNC_LAG_HOURS だけ
+遡って読み直し、まだ足していない行だけを足す（IngestedRows）。
+短い窓と長い窓の1日あたり件数の比をトレンドとして、ネタ候補の優先度に使う。
+"""
+import hashlib
+import json
+import math
+import os
+import re
+from collections import Counter
+from datetime import datetime
+from pathlib import Path
+from typing import Any, Iterable
+
+from config import (
+    WINDOW_COUNTERS_FILE,
+    TREND_WINDOWS,
+    TREND_SHORT_DAYS,
+    TREND_LONG_DAYS,
+    TREND_MIN_COUNT,
+    TREND_RISING_MIN,
+    TREND_WEIGHT,
+    KEYWORDS_PER_DAY,
+    HISTORY_SYNC_LAG_HOURS,
+)
+from history_cache import redaction_hash
+
+# 英単語・カタカナ語・漢字の連続をキーワードとみなす
+WORD_RE = re.compile(r'[A-Za-z][A-Za-z0-9_\-]{2,}|[ァ-ヴー]{2,}|[一-龥]{2,}')
+STOP_WORDS = {"the", "and", "for", "this", "that", "with", "users", "redacted_path", "claude", "code"}
+
+MS_PER_DAY = 86_400_000
+
+
+def extract_words(text: str) -> list[str]:
+    return [w for w in WORD_RE.findall(text.lower()) if w not in STOP_WORDS]
+
+
+def day_number(timestamp_ms: float) -> int:
+    """タイムスタンプ（ミリ秒）が属するローカル日付の通し番号"""
+    return datetime.fromtimestamp(timestamp_ms / 1000).date().toordinal()
+
+
+class IngestedRows:
+    """取り込み済みの行の記録（差分更新で遅れて同期された行を取りこぼさないため）
+
+    最新の時刻から lag 時間以内の行だけ指紋を覚えておく。次回はその範囲まで遡って読み、
+    覚えていない行を新しい行として扱う。それより古い行は取り込み済みとみなす。
+    """
+
+    def __init__(self, last_ts: float = 0.0, seen: dict[str, float] | None = None,
+                 lag_hours: float = HISTORY_SYNC_LAG_HOURS):
+        self.last_ts = last_ts
+        self.seen = seen or {}  # 指紋 -> timestamp
+        self.lag_ms = lag_hours * 3_600_000
+
+    @property
+    def since(self) -> float:
+        """これより古い行は読まなくてよい（最初はすべて読む）"""
+        return self.last_ts - self.lag_ms if self.last_ts else 0.0
+
+    @staticmethod
+    def fingerprint(ts: float, display: str) -> str:
+        return hashlib.blake2b(f"{ts}\0{display}".encode("utf-8"), digest_size=8).hexdigest()
+
+    def is_new(self, ts: float, display: str, since: float) -> bool:
+        return ts > since and self.fingerprint(ts, display) not in self.seen
+
+    def mark(self, ts: float, display: str) -> None:
+        self.seen[self.fingerprint(ts, display)] = ts
+        self.last_ts = max(self.last_ts, ts)
+
+    def prune(self) -> None:
+        """遡る範囲から外れた指紋を捨てる"""
+        since = self.since
+        self.seen = {fp: ts for fp, ts in self.seen.items() if ts > since}
+
+    def to_dict(self) -> dict[str, Any]:
+        return {"last_ts": self.last_ts, "seen": self.seen}
+
+    @classmethod
+    def from_dict(cls, state: dict[str, Any]) -> "IngestedRows":
+        return cls(state["last_ts"], state["seen"])
+
+
+class WindowCounters:
+    """日別バケットと、窓ごとの合計"""
+
+    def __init__(self, windows: Iterable[int] = TREND_WINDOWS, path: Path = WINDOW_COUNTERS_FILE):
+        self.windows = tuple(sorted(windows))
+        self.span = self.windows[-1]
+        self.path = path
+        self.today = 0  # 最新の日（通し番号）
+        self.rows = IngestedRows()
+        self.buckets: dict[int, Counter] = {}
+        self.totals: dict[int, Counter] = {w: Counter() for w in self.windows}
+
+    @staticmethod
+    def key(kind: str, name: str) -> str:
+        return f"{kind}:{name}"
+
+    # --------------------------------------------------------
+    # 保存・読み込み
+    # --------------------------------------------------------
+    def _config(self) -> dict[str, Any]:
+        return {"windows": list(self.windows), "redaction": redaction_hash(), "sync_lag": HISTORY_SYNC_LAG_HOURS}
+
+    @classmethod
+    def load(cls, path: Path = WINDOW_COUNTERS_FILE) -> "WindowCounters":
+        """保存済みの状態を開く（窓や伏せ字の設定が変わっていれば作り直す）"""
+        counters = cls(path=path)
+        if not path.exists():
+            return counters
+        with open(path, 'r', encoding='utf-8') as f:
+            state = json.load(f)
+        if state.get("config") != counters._config():
+            return counters
+
+        counters.today = state["today"]
+        counters.rows = IngestedRows.from_dict(state["rows"])
+        counters.buckets = {int(d): Counter(b) for d, b in state["buckets"].items()}
+        # 合計はバケットから求め直す（保存しておくより小さく、食い違いも起きない）
+        for day, bucket in counters.buckets.items():
+            for w in counters.windows:
+                if day > counters.today - w:
+                    counters.totals[w].update(bucket)
+        return counters
+
+    def save(self) -> None:
+        self.path.parent.mkdir(parents=True, exist_ok=True)
+        state = {
+            "config": self._config(),
+            "today": self.today,
+            "rows": self.rows.to_dict(),
+            "buckets": {str(d): dict(b) for d, b in self.buckets.items()},
+        }
+        tmp = self.path.with_suffix(".tmp")
+        with open(tmp, 'w', encoding='utf-8') as f:
+            json.dump(state, f, ensure_ascii=False)
+        os.replace(tmp, self.path)
+
+    # --------------------------------------------------------
+    # 更新
+    # --------------------------------------------------------
+    def _subtract(self, total: Counter, bucket: Counter) -> None:
+        for key, n in bucket.items():
+            left = total[key] - n
+            if left > 0:
+                total[key] = left
+            else:
+                del total[key]
+
+    def _seal(self, day: int) -> None:
+        """書き込みの終わった日のバケットから、少ないキーワードを落とす"""
+        bucket = self.buckets.get(day)
+        if not bucket:
+            return
+        keywords = [(n, k) for k, n in bucket.items() if k.startswith("keyword:")]
+        if len(keywords) <= KEYWORDS_PER_DAY:
+            return
+        dropped = Counter({k: n for n, k in sorted(keywords, reverse=True)[KEYWORDS_PER_DAY:]})
+        for key in dropped:
+            del bucket[key]
+        for w in self.windows:
+            if day > self.today - w:
+                self._subtract(self.totals[w], dropped)
+
+    def advance(self, day: int) -> None:
+        """最新の日を day まで進め、窓から外れた日を各窓の合計から引く"""
+        old = self.today
+        if day <= old:
+            return
+        if old:
+            self._seal(old)
+        for w in self.windows:
+            # 窓 w は (today - w, today] の日を含む。外れるのは (old - w, day - w] の日
+            for d in range(old - w + 1, min(day - w, old) + 1):
+                bucket = self.buckets.get(d)
+                if bucket:
+                    self._subtract(self.totals[w], bucket)
+        for d in range(old - self.span + 1, min(day - self.span, old) + 1):
+            self.buckets.pop(d, None)
+        self.today = day
+
+    def add(self, timestamp_ms: float, keys: Iterable[str]) -> None:
+        """1件分のキーを、その日のバケットと該当する窓に足す"""
+        day = day_number(timestamp_ms)
+        self.advance(day)
+        if day <= self.today - self.span:
+            return  # どの窓にも入らない古い記録
+        keys = list(keys)
+        self.buckets.setdefault(day, Counter()).update(keys)
+        for w in reversed(self.windows):
+            if day <= self.today - w:
+                break
+            self.totals[w].update(keys)
+
+    def update(self, rows: Iterable[tuple[float, str]]) -> int:
+        """まだ足していない (timestamp, display) を集計に足す（足した件数を返す）"""
+        # 循環importを避けるためここで読み込む
+        from analyze_history import extract_entry_features
+
+        since = self.rows.since
+        added = 0
+        for ts, display in rows:
+            if not self.rows.is_new(ts, display, since):
+                continue
+            commands, patterns = extract_entry_features(display)
+            keys = [self.key("command", c) for c in commands]
+            keys += [self.key("pattern", p) for p in patterns]
+            keys += [self.key("keyword", w) for w in set(extract_words(display))]
+            self.add(ts, keys)
+            self.rows.mark(ts, display)
+            added += 1
+        self.rows.prune()
+        return added
+
+    # --------------------------------------------------------
+    # 集計
+    # --------------------------------------------------------
+    def count(self, key: str, window: int) -> int:
+        return self.totals[window][key]
+
+    def trend(self, key: str, short: int = TREND_SHORT_DAYS, long: int = TREND_LONG_DAYS) -> float:
+        """短い窓と長い窓の1日あたり件数の比（log2、増えていれば正）"""
+        prior = 1 / long  # 件数の少ないキーで比が暴れないように
+        short_rate = self.totals[short][key] / short
+        long_rate = self.totals[long][key] / long
+        return math.log2((short_rate + prior) / (long_rate + prior))
+
+    def trend_priority(self, key: str, base: float) -> int:
+        """基準の優先度をトレンドで上下させる（1〜10）"""
+        return max(1, min(10, round(base + TREND_WEIGHT * self.trend(key))))
+
+    def describe(self, key: str) -> str:
+        counts = " / ".join(f"{w}日 {self.count(key, w)}回" for w in self.windows)
+        return f"{counts}（トレンド {self.trend(key):+.2f}）"
+
+    def ranked(self, kind: str, limit: int) -> list[str]:
+        """長い窓で TREND_MIN_COUNT 件以上あるキーをトレンドの高い順に"""
+        prefix = f"{kind}:"
+        keys = [
+            key for key, n in self.totals[TREND_LONG_DAYS].items()
+            if key.startswith(prefix) and n >= TREND_MIN_COUNT
+        ]
+        keys.sort(key=lambda k: (-self.trend(k), -self.count(k, TREND_LONG_DAYS), k))
+        return keys[:limit]
+
+    def keyword_candidates(self, limit: int = 3) -> list[dict[str, Any]]:
+        """直近で急に増えたキーワードのネタ候補"""
+        candidates = []
+        for key in self.ranked("keyword", limit):
+            if self.trend(key) < TREND_RISING_MIN or self.count(key, TREND_SHORT_DAYS) < TREND_MIN_COUNT:
+                break
+            word = key.split(":", 1)[1]
+            candidates.append({
+                "type": "keyword_trend",
+                "title": f"最近よく使うようになった「{word}」の話",
+                "source": f"キーワード: {self.describe(key)}",
+                "priority": self.trend_priority(key, 5),
+                "tags": ["claudecode", "workflow", "tips"],
+            })
+        return candidates
+
+
+def update_window_counters(rows_since) -> WindowCounters:
+    """前回以降の履歴を足して保存したカウンタを返す
+
+    rows_since(days) は直近 days 日の (timestamp, display) を返す関数。
+    初回は最長の窓、以降は前回の続き（同期の遅れの分を含む）の日数だけ読む。
+    """
+    counters = WindowCounters.load()
+    now_ms = datetime.now().timestamp() * 1000
+    days = counters.span
+    if counters.rows.since:
+        days = min(days, (now_ms - counters.rows.since) / MS_PER_DAY + 1)
+    counters.update(rows_since(days))
+    # 履歴がなかった日の分も窓を進めておく
+    counters.advance(day_number(now_ms))
+    counters.save()
+    return counters
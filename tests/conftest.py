@@ -0,0 +1,57 @@
+"""
+テスト共通の設定
+
+scripts/ のモジュールは config の import 時に環境変数からパスを決めるので、
+読み込む前に HOME・記事リポジトリ・データの置き場所を一時ディレクトリへ向ける。
+その3つはテストごとに tmp_path の下へ付け替えるので、前のテストの状態は残らない。
+"""
+import os
+import shutil
+import sys
+import tempfile
+from pathlib import Path
+
+import pytest
+
+ROOT = Path(__file__).resolve().parent.parent
+SANDBOX = Path(tempfile.mkdtemp(prefix="zenn-test-"))
+SANDBOX_DIRS = ("home", "base", "data")
+
+os.environ.update({
+    "HOME": str(SANDBOX / "home"),
+    "ZENN_BASE_DIR": str(SANDBOX / "base"),
+    "ZENN_DATA_DIR": str(SANDBOX / "data"),
+    "ANTHROPIC_API_KEY": "stub",
+})
+
+sys.path.insert(0, str(ROOT / "scripts"))
+sys.path.append(str(ROOT))  # run_daily
+
+
+@pytest.fixture(autouse=True)
+def sandbox(tmp_path):
+    """HOME・記事リポジトリ・データをこのテスト専用のディレクトリにする"""
+    for name in SANDBOX_DIRS:
+        (tmp_path / name).mkdir()
+        link = SANDBOX / name
+        if link.is_symlink():
+            link.unlink()
+        link.symlink_to(tmp_path / name, target_is_directory=True)
+    (tmp_path / "base" / "articles").mkdir()
+    yield tmp_path
+
+    # 読み込み済みの状態をメモリに持つものは、次のテストで読み直させる
+    state_log = sys.modules.get("state_log")
+    if state_log is not None:
+        state_log._close_all()
+        state_log._logs.clear()
+    hedging = sys.modules.get("hedging")
+    if hedging is not None:
+        hedging._history = None
+    topic_manager = sys.modules.get("topic_manager")
+    if topic_manager is not None:
+        topic_manager._ranking["key"] = None
+
+
+def pytest_sessionfinish(session, exitstatus):
+    shutil.rmtree(SANDBOX, ignore_errors=True)
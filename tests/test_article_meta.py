@@ -0,0 +1,58 @@
+"""article_meta（本文とメタ情報の振り分け・解釈）のテスト"""
+from article_meta import MetaSplitter, merge_topics, parse_article_meta
+
+
+def split(chunks: list[str]) -> tuple[str, str]:
+    splitter = MetaSplitter()
+    body = "".join(splitter.feed(chunk) for chunk in chunks) + splitter.finish()
+    return body, splitter.meta
+
+
+def test_splitter_without_meta_returns_everything_as_body():
+    assert split(["本文です。", "<arti", "cle> は別のタグ"]) == ("本文です。<article> は別のタグ", "")
+
+
+def test_splitter_finds_tag_split_across_chunks():
+    body, meta = split(["本文の最後<art", "icle_me", 'ta>{"summary": "要約"}', "</article_meta>"])
+    assert body == "本文の最後"
+    assert meta == '{"summary": "要約"}</article_meta>'
+
+
+def test_splitter_holds_back_only_possible_tag_prefix():
+    splitter = MetaSplitter()
+    assert splitter.feed("本文<") == "本文"
+    assert splitter.feed("br>続き") == "<br>続き"
+
+
+def test_parse_json_meta():
+    meta = parse_article_meta(
+        '{"summary": "履歴を\\n分析した", "topics": ["Claude Code", "Python", "python"],'
+        ' "tweet_hook": "「深夜の開発記録」", "emoji": "🌙"}</article_meta>'
+    )
+    assert meta == {
+        "summary": "履歴を 分析した",
+        "topics": ["claudecode", "python"],
+        "tweet_hook": "深夜の開発記録",
+        "emoji": "🌙",
+    }
+
+
+def test_parse_broken_json_falls_back_to_lines():
+    meta = parse_article_meta('{\n"summary": "壊れたJSON",\ntags: claude, mcp\nhook：告知文\n')
+    assert meta["summary"] == "壊れたJSON"
+    assert meta["topics"] == ["claude", "mcp"]
+    assert meta["tweet_hook"] == "告知文"
+    assert meta["emoji"] == ""
+
+
+def test_parse_limits_and_rejects_invalid_values():
+    meta = parse_article_meta(
+        '{"summary": "' + "長" * 200 + '", "topics": "a,b,c,d,e,f", "emoji": "abc"}'
+    )
+    assert len(meta["summary"]) == 100
+    assert meta["topics"] == ["a", "b", "c", "d", "e"]
+    assert meta["emoji"] == ""
+
+
+def test_merge_topics_prefers_suggested():
+    assert merge_topics(["mcp"], ["claudecode", "MCP", "tips"]) == ["mcp", "claudecode", "tips"]
@@ -0,0 +1,50 @@
+"""article_score（best-of-k のローカル採点）のテスト"""
+from article_score import count_headings, score_article, select_best
+from config import CHARACTER
+
+
+def make_article(chars: int = 2000, headings: int = 4) -> str:
+    sections = [f"## 見出し{i}\n" for i in range(headings)]
+    body = "".join(sections)
+    return body + "あ" * (chars - len(body))
+
+
+def test_count_headings_ignores_code_blocks():
+    content = "## 一\n```\n## コード内\n```\n## 二\n### 小見出し\n"
+    assert count_headings(content) == 2
+
+
+def test_score_in_range_article_gets_full_marks():
+    score = score_article(make_article())
+    assert score["length"] == 1.0
+    assert score["headings"] == 1.0
+    assert score["penalty"] == 0.0
+    assert score["total"] == 7.0
+
+
+def test_score_drops_outside_target_range():
+    short = score_article(make_article(chars=750))
+    few_headings = score_article(make_article(headings=1))
+    assert short["length"] == 0.5
+    assert few_headings["headings"] < 1.0
+    assert short["total"] < score_article(make_article())["total"]
+
+
+def test_violations_are_penalized_by_rule():
+    violations = [{"rule": "bold"}, {"rule": "banned_phrase"}, {"rule": "unknown"}]
+    assert score_article(make_article(), violations)["penalty"] == 4.5
+
+
+def test_catchphrase_overuse_is_penalized():
+    phrase = CHARACTER["catchphrases"][0]
+    once = score_article(make_article() + phrase)
+    repeated = score_article(make_article() + phrase * 6)
+    assert once["catchphrase"] == 0.5
+    assert repeated["catchphrase"] < 0
+    assert repeated["total"] < once["total"]
+
+
+def test_select_best_prefers_highest_then_earliest():
+    drafts = [{"score": {"total": t}} for t in (3.0, 5.0, 5.0, 1.0)]
+    assert select_best(drafts) == 1
+    assert select_best([{"score": {"total": 2.0}}]) == 0
@@ -0,0 +1,89 @@
+"""backfill（Message Batches での下書きのまとめ生成）のテスト
+
+stub_servers の AnthropicStub をバッチAPIの相手にする。
+"""
+import anthropic
+import pytest
+
+import backfill
+from backfill import (
+    collect_results,
+    load_batches,
+    publish_backfill_draft,
+    run_backfill,
+    select_backfill_topics,
+    submit_batch,
+    wait_for_batch,
+)
+from stub_servers import AnthropicStub
+from topic_manager import add_manual_topic
+from usage_ledger import load_calls
+
+
+@pytest.fixture
+def stub():
+    with AnthropicStub(batch_polls=1) as stub:
+        yield stub
+
+
+@pytest.fixture
+def client(stub, monkeypatch) -> anthropic.Anthropic:
+    client = anthropic.Anthropic(api_key="stub", base_url=stub.url, max_retries=0)
+    monkeypatch.setattr(backfill, "get_client", lambda: client)
+    return client
+
+
+def batch_calls() -> int:
+    return sum(1 for r in load_calls(days=None) if r["mode"] == "batch")
+
+
+def test_interrupted_batch_is_resumed_and_saved_once(stub, client):
+    for i in range(2):
+        add_manual_topic(f"Backfill resume topic {i}", priority=10)
+
+    # 1回目: 送信したところで待ちきれずに止まる
+    batch = submit_batch(client, select_backfill_topics(2, load_batches()))
+    assert not wait_for_batch(client, batch, poll=0.01, max_wait=0)
+    assert [b.batch_id for b in load_batches() if not b.finished] == [batch.batch_id]
+
+    # 2回目: 新しく送らずに同じバッチの続きを受け取る
+    calls_before = batch_calls()
+    summary = run_backfill(2, poll=0.01)
+    assert summary == {"batches": [batch.batch_id], "saved": 2, "failed": 0, "pending": 0}
+    assert len(stub.batches) == 1
+    assert batch_calls() == calls_before + 2
+
+    resumed = next(b for b in load_batches() if b.batch_id == batch.batch_id)
+    paths = [item["path"] for item in resumed.items.values()]
+    for path in paths:
+        with open(path, encoding="utf-8") as f:
+            assert "published: false" in f.read()
+
+    # 受け取り直しても、保存済みの結果は保存し直さず、トークンも数え直さない
+    resumed.data["status"] = "in_progress"
+    collect_results(client, resumed)
+    assert [item["path"] for item in resumed.items.values()] == paths
+    assert batch_calls() == calls_before + 2
+
+    # 下書き済みのネタは次のバッチで選ばれない
+    titles = {t["title"] for t in select_backfill_topics(10, load_batches())}
+    assert not titles & {"Backfill resume topic 0", "Backfill resume topic 1"}
+
+
+def test_errored_requests_are_left_for_the_next_batch(stub, client):
+    stub.batch_error_rate = 1.0
+    topic = add_manual_topic("Backfill errored topic", priority=10)
+    summary = run_backfill(1, poll=0.01)
+    assert summary["failed"] == 1 and summary["saved"] == 0
+    assert topic["title"] in {t["title"] for t in select_backfill_topics(10, load_batches())}
+
+
+def test_saved_draft_is_published_only_once(stub, client):
+    topic = add_manual_topic("Backfill publish topic", priority=10)
+    assert run_backfill(1, poll=0.01)["saved"] == 1
+
+    article, path = publish_backfill_draft(topic)
+    assert article["title"] == topic["title"]
+    with open(path, encoding="utf-8") as f:
+        assert "published: true" in f.read()
+    assert publish_backfill_draft(topic) is None
@@ -0,0 +1,50 @@
+"""Daemon の制御ソケットと --status 問い合わせのテスト"""
+import os
+import socket
+import threading
+
+import pytest
+
+from daemon import Daemon, query_daemon_status
+
+
+def serve_once(path, payload: bytes) -> threading.Thread:
+    """1回だけ payload を返すソケットを用意する"""
+    server = socket.socket(socket.AF_UNIX, socket.SOCK_STREAM)
+    server.bind(str(path))
+    server.listen()
+
+    def reply() -> None:
+        with server:
+            conn, _ = server.accept()
+            with conn:
+                conn.recv(1024)
+                conn.sendall(payload)
+
+    thread = threading.Thread(target=reply, daemon=True)
+    thread.start()
+    return thread
+
+
+@pytest.mark.parametrize("payload", [b'{"ok": true, "status": {"pid"', b"\xff\xfe", b"[]"])
+def test_broken_reply_falls_back(tmp_path, payload):
+    path = tmp_path / "daemon.sock"
+    thread = serve_once(path, payload)
+    assert query_daemon_status(path) is None
+    thread.join(timeout=5)
+
+
+def test_second_daemon_keeps_the_live_socket(tmp_path):
+    path = tmp_path / "daemon.sock"
+    first = Daemon([], status_provider=dict, socket_path=path, state_file=tmp_path / "state.json")
+    first.refresh_snapshot()
+    server = first.serve_control_socket()
+    try:
+        second = Daemon([], status_provider=dict, socket_path=path, state_file=tmp_path / "state.json")
+        with pytest.raises(RuntimeError):
+            second.serve_control_socket()
+        assert query_daemon_status(path)["pid"] == first.snapshot["pid"]
+    finally:
+        first.stop_event.set()
+        server.close()
+        os.close(first.lock_fd)
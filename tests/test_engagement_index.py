@@ -0,0 +1,86 @@
+"""反応スコアの索引・ネタの並べ替え・反応の計測範囲のテスト"""
+import time
+from datetime import datetime, timedelta
+
+import post_to_x
+import topic_manager
+from config import ENGAGEMENT_INDEX_FILE, ENGAGEMENT_TRACK_DAYS
+from engagement_index import EngagementIndex, load_engagement_index
+from post_to_x import analyze_tweet_performance
+from state_log import get_state_log
+from topic_manager import add_manual_topic, get_next_topic, load_topics, rank_topics
+
+DAY = 86400
+
+
+def test_legacy_seen_entries_expire_after_the_track_window():
+    now = time.time()
+    index = EngagementIndex(ENGAGEMENT_INDEX_FILE)
+    index.data["seen"] = {"1": 5, "2": 7}
+    index.prune(now)
+    assert index.data["seen"]["1"] == {"total": 5, "title": None, "since": now}
+
+    # 期限内に計測されたツイートは前回値を引き継いでネタと結びつく
+    index.record_topic({"title": "A", "type": "manual", "tags": ["x"]}, now)
+    assert index.observe({"tweet_id": "1", "article_title": "A", "likes": 8}, now) == 3
+    index.save()
+
+    later = now + (ENGAGEMENT_TRACK_DAYS - 1) * DAY
+    index = load_engagement_index()
+    index.observe({"tweet_id": "1", "article_title": "A", "likes": 9}, later)
+    index.prune(later + 2 * DAY)
+    assert set(index.data["seen"]) == {"1"}
+
+
+def test_ranking_is_reused_until_stock_or_index_changes(monkeypatch):
+    add_manual_topic("low", tags=["a"], priority=1)
+    add_manual_topic("high", tags=["b"], priority=5)
+    assert [t["title"] for t in rank_topics(load_topics(), 5)] == ["high", "low"]
+
+    scored = []
+    original = EngagementIndex.weighted_priority
+
+    def counting(self, topic, now=None):
+        scored.append(topic["title"])
+        return original(self, topic, now)
+
+    monkeypatch.setattr(EngagementIndex, "weighted_priority", counting)
+    assert get_next_topic()["title"] == "high"
+    assert get_next_topic(exclude={"high"})["title"] == "low"
+    assert scored == []
+
+    # 反応が入れば並べ直す
+    index = load_engagement_index()
+    index.record_topic({"title": "low", "type": "manual", "tags": ["a"]})
+    index.observe({"tweet_id": "9", "article_title": "low", "likes": 10000})
+    index.save()
+    assert get_next_topic()["title"] == "low"
+    assert sorted(scored) == ["high", "low"]
+
+    # ストックが変われば並べ直す
+    add_manual_topic("top", priority=50)
+    assert get_next_topic()["title"] == "top"
+
+
+def test_topics_missing_from_the_ranking_are_still_ranked():
+    add_manual_topic("old", priority=1)
+    rank_topics(load_topics(), 1)
+    fresh = {"title": "fresh", "priority": 9, "tags": []}
+    seq, version = topic_manager._ranking["key"]
+    topic_manager._ranking["key"] = (topic_manager._topics_log().version(), version)
+    assert [t["title"] for t in rank_topics(load_topics() + [fresh], 2)] == ["fresh", "old"]
+
+
+def test_only_tweets_inside_the_engagement_window_are_measured(monkeypatch):
+    records = get_state_log("tweet_records")
+    old = (datetime.now() - timedelta(days=ENGAGEMENT_TRACK_DAYS + 1)).isoformat()
+    records.add({"article_title": "old", "tweet_id": "1", "posted_at": old})
+    records.add({"article_title": "new", "tweet_id": "2", "posted_at": datetime.now().isoformat()})
+
+    fetched = []
+    monkeypatch.setattr(
+        post_to_x, "get_tweet_performance",
+        lambda tweet_id: fetched.append(tweet_id) or {"tweet_id": tweet_id, "likes": 1},
+    )
+    assert [p["tweet_id"] for p in analyze_tweet_performance()] == ["2"]
+    assert fetched == ["2"]
@@ -0,0 +1,38 @@
+"""call_with_policy（過負荷時の再試行・フォールバック）のテスト"""
+import anthropic
+import pytest
+
+import hedging
+from hedging import call_with_policy
+from stub_servers import AnthropicStub
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(hedging, "OVERLOAD_BACKOFF", 0)
+
+
+def streaming_attempt(stub: AnthropicStub):
+    client = anthropic.Anthropic(api_key="stub", base_url=stub.url, max_retries=0)
+
+    def attempt(model: str, cancel) -> str:
+        with client.messages.stream(
+            model=model, max_tokens=100, messages=[{"role": "user", "content": "hi"}]
+        ) as stream:
+            return "".join(stream.text_stream)
+
+    return attempt
+
+
+def test_overload_mid_stream_falls_back():
+    with AnthropicStub(stream_errors=["overloaded_error", "overloaded_error"]) as stub:
+        text = call_with_policy(streaming_attempt(stub), model="primary", fallback="secondary")
+    assert text == stub.article_text
+    assert [r["body"]["model"] for r in stub.requests] == ["primary", "primary", "secondary"]
+
+
+def test_other_mid_stream_errors_are_not_retried():
+    with AnthropicStub(stream_errors=["api_error"]) as stub:
+        with pytest.raises(anthropic.APIStatusError):
+            call_with_policy(streaming_attempt(stub), model="primary", fallback="secondary")
+    assert len(stub.requests) == 1
@@ -0,0 +1,43 @@
+"""HistoryCache（サニタイズ済み履歴の日別シャード）のテスト"""
+import json
+import threading
+import time
+
+from history_cache import HistoryCache
+
+
+def write_history(path, count: int, start: int = 0) -> None:
+    now = time.time() * 1000
+    with open(path, "a", encoding="utf-8") as f:
+        for i in range(start, start + count):
+            f.write(json.dumps({"display": f"prompt {i}", "timestamp": now - i * 60_000, "project": "/p"}) + "\n")
+
+
+def test_concurrent_updates_keep_each_row_once(tmp_path):
+    source = tmp_path / "history.jsonl"
+    write_history(source, 500)
+    caches = [HistoryCache(source=source, root=tmp_path / "cache") for _ in range(4)]
+
+    threads = [threading.Thread(target=cache.update) for cache in caches]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    displays = [display for _, _, display in caches[0].iter_rows(0)]
+    assert sorted(displays) == sorted(f"prompt {i}" for i in range(500))
+
+
+def test_rows_appended_after_the_manifest_are_not_read(tmp_path):
+    source = tmp_path / "history.jsonl"
+    write_history(source, 3)
+    cache = HistoryCache(source=source, root=tmp_path / "cache")
+    cache.update()
+
+    # 更新の途中（マニフェストに記録する前）の追記を再現する
+    day, _ = next(iter(cache._load_manifest()["shards"].items()))
+    with open(cache.dir / f"{day}.jsonl", "a", encoding="utf-8") as f:
+        f.write('[0, "/p", "half')
+    assert len(list(cache.iter_rows(0))) == 3
+    assert cache.update() == 0
+    assert len(list(cache.iter_rows(0))) == 3
@@ -0,0 +1,38 @@
+"""HistoryWatcher.get_analysis（ライブ取り込みの分析）のテスト"""
+import json
+import threading
+import time
+
+from config import CLAUDE_HISTORY
+from history_cache import HistoryCache
+from history_watcher import HistoryWatcher
+from window_counters import WindowCounters
+
+
+def test_concurrent_analyses_keep_shards_and_counters_consistent():
+    CLAUDE_HISTORY.parent.mkdir(parents=True)
+    now = time.time() * 1000
+    with open(CLAUDE_HISTORY, "w", encoding="utf-8") as f:
+        for i in range(300):
+            f.write(json.dumps({"display": f"/review 変更点 {i} を確認", "timestamp": now - i * 60_000, "project": "/p"}) + "\n")
+
+    watcher = HistoryWatcher()
+    watcher._initial_load()
+    errors = []
+
+    def analyze() -> None:
+        try:
+            watcher.get_analysis()
+        except Exception as e:
+            errors.append(e)
+
+    threads = [threading.Thread(target=analyze) for _ in range(4)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+
+    assert not errors
+    assert len(list(HistoryCache().iter_rows(0))) == 300
+    counters = WindowCounters.load()
+    assert counters.count(WindowCounters.key("command", "review"), max(counters.windows)) == 300
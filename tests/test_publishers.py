@@ -0,0 +1,137 @@
+"""publish_one（冪等キーによる二重送信の防止）のテスト"""
+from pathlib import Path
+
+import pytest
+
+import publishers
+from deadline import DeadlineExceeded
+from publishers import Publication, Publisher, PublishError, find_publish_record, publish_one
+
+
+class FakePublisher(Publisher):
+    """publish の結果を順に差し替えられる公開先"""
+
+    name = "fake"
+    label = "Fake"
+    stage = "fake"
+    retries = 1
+
+    def __init__(self, errors: list[Exception] | None = None, recovered: dict | None = None):
+        self.errors = list(errors or [])
+        self.recovered = recovered
+        self.calls = 0
+
+    def publish(self, item: Publication) -> dict:
+        self.calls += 1
+        if self.errors:
+            raise self.errors.pop(0)
+        return {"url": f"https://example.com/{item.slug}", "id": str(self.calls)}
+
+    def recover(self, item: Publication) -> dict | None:
+        return self.recovered
+
+
+class ResendSafePublisher(FakePublisher):
+    name = "fake-safe"
+    resend_safe = True
+
+
+@pytest.fixture(autouse=True)
+def no_backoff(monkeypatch):
+    monkeypatch.setattr(publishers, "PUBLISH_BACKOFF", 0)
+
+
+@pytest.fixture
+def item(request) -> Publication:
+    slug = request.node.name.replace("_", "-")
+    return Publication(title="テスト記事", path=Path(f"{slug}.md"), slug=slug, url=f"https://zenn.dev/x/{slug}")
+
+
+def record_status(publisher: Publisher, item: Publication) -> str | None:
+    record = find_publish_record(publisher.idempotency_key(item))
+    return record["status"] if record else None
+
+
+def test_published_key_is_never_sent_again(item):
+    publisher = FakePublisher()
+    first = publish_one(publisher, item)
+    second = publish_one(publisher, item)
+    assert first["status"] == second["status"] == "published"
+    assert second["reused"] and second["url"] == first["url"]
+    assert publisher.calls == 1
+
+
+def test_retryable_error_is_retried_in_the_same_run(item):
+    publisher = FakePublisher(errors=[PublishError("429", retryable=True)])
+    outcome = publish_one(publisher, item)
+    assert outcome["status"] == "published"
+    assert outcome["attempts"] == 2
+    assert record_status(publisher, item) == "published"
+
+
+def test_failure_that_proves_nothing_was_sent_can_be_resent(item):
+    publisher = FakePublisher(errors=[PublishError("login failed", not_sent=True)])
+    assert publish_one(publisher, item)["status"] == "failed"
+    assert record_status(publisher, item) is None
+    assert publish_one(publisher, item)["status"] == "published"
+    assert publisher.calls == 2
+
+
+def test_ambiguous_failure_is_kept_unknown_and_not_resent(item):
+    publisher = FakePublisher(errors=[PublishError("502 after send")])
+    assert publish_one(publisher, item)["status"] == "unknown"
+    assert record_status(publisher, item) == "unknown"
+    assert publish_one(publisher, item)["status"] == "unknown"
+    assert publisher.calls == 1
+
+
+def test_ambiguous_failure_is_recovered_when_confirmed(item):
+    recovered = {"url": "https://example.com/found", "id": "42"}
+    publisher = FakePublisher(errors=[TimeoutError("read timeout")], recovered=recovered)
+    outcome = publish_one(publisher, item)
+    assert outcome["status"] == "published"
+    assert outcome["id"] == "42"
+    assert record_status(publisher, item) == "published"
+
+
+def test_interrupted_send_is_not_resent_without_confirmation(item):
+    publisher = FakePublisher()
+    publishers._save_record({"key": publisher.idempotency_key(item), "target": "fake", "status": "sending"})
+    assert publish_one(publisher, item)["status"] == "unknown"
+    assert publisher.calls == 0
+
+
+def test_resend_safe_target_retries_interrupted_send(item):
+    publisher = ResendSafePublisher()
+    publishers._save_record({"key": publisher.idempotency_key(item), "target": "fake-safe", "status": "sending"})
+    assert publish_one(publisher, item)["status"] == "published"
+    assert publisher.calls == 1
+
+
+def test_deadline_before_send_defers_to_next_run(item):
+    publisher = FakePublisher(errors=[DeadlineExceeded("期限切れ")])
+    assert publish_one(publisher, item)["status"] == "deferred"
+    assert record_status(publisher, item) is None
+
+
+def test_x_without_credentials_fails_as_not_sent(item):
+    publisher = publishers.XPublisher()
+    outcome = publish_one(publisher, item)
+    assert outcome["status"] == "failed"
+    assert record_status(publisher, item) is None
+
+
+def test_x_is_skipped_when_zenn_is_not_a_target(item, monkeypatch):
+    monkeypatch.setattr(publishers, "PUBLISH_TARGETS", ["note", "x"])
+    outcome = publishers.publish_all(item, [publishers.XPublisher()])["x"]
+    assert outcome["status"] == "skipped"
+    assert record_status(publishers.XPublisher(), item) is None
+
+
+def test_articles_sharing_a_slug_get_different_keys(item):
+    publisher = FakePublisher()
+    other = item._replace(title="同じ日の別の記事")
+    assert publisher.idempotency_key(item) != publisher.idempotency_key(other)
+    assert publish_one(publisher, item)["status"] == "published"
+    assert not publish_one(publisher, other).get("reused")
+    assert publisher.calls == 2
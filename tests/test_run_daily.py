@@ -0,0 +1,58 @@
+"""run_daily の公開結果の扱い（ジャーナルへの記録）のテスト"""
+import pytest
+
+import publishers
+import run_daily
+from config import ARTICLES_DIR
+from run_journal import RunJournal
+
+RUN_ID = "2026-10-19"
+
+
+@pytest.fixture
+def generated_run():
+    """記事の生成まで済んだ実行（公開から再開する）"""
+    path = ARTICLES_DIR / "skipped-target.md"
+    path.write_text("---\ntitle: \"t\"\n---\n本文\n", encoding="utf-8")
+    journal = RunJournal(RUN_ID)
+    journal.complete("select", topic={"title": "Skipped target topic"})
+    journal.complete("generate", article_title="Skipped target topic", article_path=str(path))
+    journal.finish("failed")
+
+
+@pytest.fixture
+def x_only(monkeypatch):
+    monkeypatch.setattr(publishers, "PUBLISH_TARGETS", ["x"])
+    monkeypatch.setattr(run_daily, "enabled_publishers", lambda: [publishers.XPublisher()])
+    monkeypatch.setattr(run_daily, "analyze_tweet_performance", lambda: [])
+
+
+def test_skipped_target_is_reported_and_final(generated_run, x_only):
+    result = run_daily._run_daily_pipeline(RUN_ID, None)
+    assert result["success"]
+    assert result["publish"]["x"]["status"] == "skipped"
+    assert any(e.startswith("X未送信") for e in result["errors"])
+
+    # 設定が原因の skipped は記録され、再開しても送り直さない
+    journal = RunJournal(RUN_ID)
+    assert journal.stage("tweet")["publish"]["final"]
+    assert journal.status == "complete"
+
+
+class FailingZenn(publishers.ZennPublisher):
+    def publish(self, item):
+        raise publishers.PublishError("push rejected")
+
+
+def test_skip_after_a_failed_dependency_is_retried(generated_run, monkeypatch):
+    monkeypatch.setattr(publishers, "PUBLISH_TARGETS", ["zenn", "x"])
+    monkeypatch.setattr(run_daily, "enabled_publishers", lambda: [FailingZenn(), publishers.XPublisher()])
+
+    result = run_daily._run_daily_pipeline(RUN_ID, None)
+    assert not result["success"]
+    assert result["publish"]["x"]["status"] == "skipped"
+
+    # Zenn の失敗で送らなかった X は、再開時に Zenn と一緒に送る
+    journal = RunJournal(RUN_ID)
+    assert journal.stage("tweet") is None
+    assert journal.status == "failed"
@@ -0,0 +1,19 @@
+"""run_journal（日次パイプラインの実行ジャーナル）のテスト"""
+from run_journal import RunJournal, abandon_ungenerated_runs, claimed_titles, unfinished_runs
+
+
+def test_earlier_runs_without_an_article_are_abandoned(tmp_path):
+    failed = RunJournal("2026-10-17", tmp_path)
+    failed.complete("select", topic={"title": "Stuck topic"})
+    failed.finish("failed")
+    deferred = RunJournal("2026-10-18", tmp_path)
+    deferred.complete("select", topic={"title": "Deferred topic"})
+    deferred.complete("generate", article_path="a.md", article_title="Deferred topic")
+    deferred.finish("deferred")
+    today = RunJournal("2026-10-19", tmp_path)
+    today.finish("failed")
+
+    assert abandon_ungenerated_runs(tmp_path, exclude="2026-10-19") == ["2026-10-17"]
+    assert unfinished_runs(tmp_path, exclude="2026-10-19") == ["2026-10-18"]
+    # 打ち切った実行のネタは今日の実行が選び直せる
+    assert claimed_titles(tmp_path, exclude="2026-10-19") == {"deferred topic"}
@@ -0,0 +1,44 @@
+"""StateLog（追記型の状態ログ）のテスト"""
+import multiprocessing
+
+import pytest
+
+import state_log
+from state_log import StateLog
+
+
+def append_items(data_dir, worker: int, count: int) -> None:
+    log = StateLog("shared", key="id", data_dir=data_dir)
+    for i in range(count):
+        log.add({"id": f"{worker}-{i}"})
+    log.close()
+
+
+@pytest.mark.skipif(state_log.fcntl is None, reason="flock が使えない環境")
+def test_concurrent_processes_do_not_lose_events(tmp_path, monkeypatch):
+    # 追記の途中でコンパクションも起きるようにする
+    monkeypatch.setattr(state_log, "STATE_LOG_COMPACT_EVENTS", 50)
+    ctx = multiprocessing.get_context("fork")
+    workers = [ctx.Process(target=append_items, args=(tmp_path, w, 100)) for w in range(4)]
+    for p in workers:
+        p.start()
+    for p in workers:
+        p.join()
+    assert all(p.exitcode == 0 for p in workers)
+
+    items = StateLog("shared", key="id", data_dir=tmp_path).items()
+    assert len(items) == 400
+    assert {item["id"] for item in items} == {f"{w}-{i}" for w in range(4) for i in range(100)}
+
+
+def test_torn_tail_is_dropped_on_read(tmp_path):
+    log = StateLog("torn", key="id", data_dir=tmp_path)
+    log.add({"id": "a"})
+    log.close()
+    with open(tmp_path / "torn.log.jsonl", "ab") as f:
+        f.write(b'{"op": "add", "item": {"id": "b"}')
+
+    log = StateLog("torn", key="id", data_dir=tmp_path)
+    assert [item["id"] for item in log.items()] == ["a"]
+    log.add({"id": "c"})
+    assert [item["id"] for item in StateLog("torn", key="id", data_dir=tmp_path).items()] == ["a", "c"]
@@ -0,0 +1,48 @@
+"""stream_sanitizer（チャンク単位のサニタイズと公開する記事の伏せ字）のテスト"""
+import io
+
+import pytest
+
+from analyze_history import sanitize_text
+from stream_sanitizer import iter_sanitized, sanitize_article, sanitize_stream
+
+# キーワード（長い社名・短い略語）と /Users/... のパスを含む入力
+STREAM_TEXT = "前置き Givery の件。/Users/alice/work/x と SS、最後に IMF\n"
+
+
+@pytest.mark.parametrize("split", range(len(STREAM_TEXT) + 1))
+def test_split_at_any_offset_matches_sanitize_text(split):
+    chunks = [STREAM_TEXT[:split], STREAM_TEXT[split:]]
+    assert "".join(iter_sanitized(chunks, overlap=16)) == sanitize_text(STREAM_TEXT)
+
+
+@pytest.mark.parametrize("chunk_size", range(1, 14))
+def test_small_chunks_match_sanitize_text(chunk_size):
+    dst = io.StringIO()
+    sanitize_stream(io.StringIO(STREAM_TEXT * 3), dst, chunk_size=chunk_size, overlap=16)
+    assert dst.getvalue() == sanitize_text(STREAM_TEXT * 3)
+
+
+def test_short_keywords_are_scrubbed_case_sensitively():
+    text = "IMFとAFの件。TK社とxGNも。"
+    assert sanitize_article(text) == "[企業名]と[企業名]の件。[企業名]社と[企業名]も。"
+
+
+def test_short_keywords_do_not_match_inside_words_or_other_cases():
+    text = "HGRやSSH、小文字の ss と sb はそのまま"
+    assert sanitize_article(text) == text
+
+
+def test_code_is_left_untouched():
+    text = "Giveryの案件\n```\nIMF = 1\n```\n`SS` はコード"
+    assert sanitize_article(text) == "[企業名]の案件\n```\nIMF = 1\n```\n`SS` はコード"
+
+
+@pytest.mark.parametrize("name", ["GIVERY", "givery", "Givery", "MICHEY", "michey", "Coelaqanth"])
+def test_long_names_are_scrubbed_in_any_case(name):
+    assert sanitize_article(f"{name}の案件") == "[企業名]の案件"
+
+
+def test_long_names_are_scrubbed_inside_code():
+    text = "```\ncd ~/Givery/coelaqanth\n```\n`michey` も"
+    assert sanitize_article(text) == "```\ncd ~/[企業名]/[企業名]\n```\n`[企業名]` も"
@@ -0,0 +1,60 @@
+"""usage_ledger（モデル呼び出しの記録と予算）のテスト"""
+import time
+from types import SimpleNamespace
+
+import state_log
+import usage_ledger
+from config import USAGE_LEDGER_KEEP_DAYS
+from usage_ledger import load_calls, prune_ledger, record_call, tokens_per_call, tokens_used
+
+DAY = 86400
+
+
+def add_call(ts: float, tokens: int, error: str | None = None) -> None:
+    usage_ledger._ledger().add({
+        "ts": ts, "model": "m", "mode": "stream", "article": "", "tags": [],
+        "input_tokens": tokens, "output_tokens": 0,
+        "cache_creation_input_tokens": 0, "cache_read_input_tokens": 0,
+        "latency": 1.0, "stop_reason": "end_turn", "error": error,
+    })
+
+
+def test_expired_calls_are_pruned_once_a_day(monkeypatch):
+    now = time.time()
+    add_call(now - (USAGE_LEDGER_KEEP_DAYS + 1) * DAY, 100)
+    add_call(now - DAY, 200)
+    monkeypatch.setattr(usage_ledger, "_last_prune", 0.0)
+
+    record_call("m", SimpleNamespace(input_tokens=300), 1.0, "end_turn")
+    assert [r["input_tokens"] for r in load_calls(days=None)] == [200, 300]
+
+    # 同じ日のうちは見直さない
+    add_call(now - (USAGE_LEDGER_KEEP_DAYS + 1) * DAY, 400)
+    record_call("m", None, 1.0, "end_turn")
+    assert len(load_calls(days=None)) == 4
+    assert prune_ledger() == 1
+
+
+def test_budget_totals_do_not_copy_the_ledger(monkeypatch):
+    now = time.time()
+    add_call(now - 3 * DAY, 1000)
+    add_call(now - 60, 10)
+    add_call(now - 30, 20)
+    add_call(now - 10, 99999, error="APIError")
+
+    def no_copy(self):
+        raise AssertionError("items() で全件コピーしている")
+
+    monkeypatch.setattr(state_log.StateLog, "items", no_copy)
+    assert tokens_used(now - DAY) == 10 + 20 + 99999
+    assert tokens_per_call() == 20
+
+
+def test_remove_where_keeps_items_added_by_other_instances(tmp_path):
+    a = state_log.StateLog("ledger", data_dir=tmp_path)
+    b = state_log.StateLog("ledger", data_dir=tmp_path)
+    a.add({"ts": 0})
+    b.add({"ts": 1})
+    assert a.remove_where(lambda r: r["ts"] == 0) == 1
+    a.add({"ts": 2})
+    assert [r["ts"] for r in b.items()] == [1, 2]
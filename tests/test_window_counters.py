@@ -0,0 +1,74 @@
+"""window_counters（日別バケットの滑動窓）のテスト"""
+from datetime import datetime, timedelta
+
+from window_counters import IngestedRows, WindowCounters, day_number
+
+START = datetime(2026, 1, 1, 12)
+KEY = "command:review"
+
+
+def ts(days: float = 0, hours: float = 0) -> float:
+    return (START + timedelta(days=days, hours=hours)).timestamp() * 1000
+
+
+def counts(counters: WindowCounters) -> dict[int, int]:
+    return {w: counters.count(KEY, w) for w in counters.windows}
+
+
+def make_counters(tmp_path) -> WindowCounters:
+    return WindowCounters(windows=(1, 7, 30), path=tmp_path / "window_counters.json")
+
+
+def test_counts_leave_each_window_as_days_pass(tmp_path):
+    counters = make_counters(tmp_path)
+    counters.add(ts(), [KEY])
+    assert counts(counters) == {1: 1, 7: 1, 30: 1}
+
+    counters.advance(day_number(ts(1)))
+    assert counts(counters) == {1: 0, 7: 1, 30: 1}
+    counters.advance(day_number(ts(7)))
+    assert counts(counters) == {1: 0, 7: 0, 30: 1}
+    counters.advance(day_number(ts(30)))
+    assert counts(counters) == {1: 0, 7: 0, 30: 0}
+    assert counters.buckets == {}
+
+
+def test_long_gap_expires_everything_at_once(tmp_path):
+    counters = make_counters(tmp_path)
+    for day in range(10):
+        counters.add(ts(day), [KEY])
+    counters.add(ts(100), ["command:other"])
+    assert counts(counters) == {1: 0, 7: 0, 30: 0}
+    assert list(counters.buckets) == [day_number(ts(100))]
+
+
+def test_records_older_than_every_window_are_ignored(tmp_path):
+    counters = make_counters(tmp_path)
+    counters.add(ts(40), [KEY])
+    counters.add(ts(5), [KEY])
+    counters.add(ts(35), [KEY])
+    assert counts(counters) == {1: 1, 7: 2, 30: 2}
+
+
+def test_totals_are_rebuilt_on_load(tmp_path):
+    path = tmp_path / "window_counters.json"
+    counters = WindowCounters(path=path)  # load() は設定の窓で開く
+    for day in (0, 20, 27):
+        counters.add(ts(day), [KEY])
+    counters.save()
+    loaded = WindowCounters.load(path)
+    assert loaded.today == counters.today
+    assert counts(loaded) == counts(counters) == {1: 1, 7: 1, 30: 3, 90: 3}
+
+
+def test_update_counts_late_synced_rows_once(tmp_path):
+    counters = make_counters(tmp_path)
+    counters.rows = IngestedRows(lag_hours=48)
+    local = [(ts(10, h), "/review ローカル") for h in range(5)]
+    assert counters.update(local) == 5
+
+    late = (ts(9, 12), "/review 別のマシン")
+    too_late = (ts(7), "/review 同期が遅すぎた")
+    assert counters.update(sorted(local + [late, too_late])) == 1
+    assert counters.update(sorted(local + [late])) == 0
+    assert counters.count(KEY, 30) == 6